@@ -0,0 +1,131 @@
+"""
+Consultas de aniversariantes (/clientes/aniversariantes/hoje, /mes e /periodo).
+
+Filtrar por EXTRACT(MONTH/DAY FROM data_nascimento) nao usa nenhum indice e
+cada execucao do job diario de aniversario varria a tabela de clientes do
+salao. A migracao 0010 cria a funcao IMMUTABLE sgsx.mes_dia(data) (mes * 100 +
+dia, ex.: 15/03 -> 315) e a 0011 o indice idx_clientes_aniversario em
+(salao_id, mes_dia, filial_id), com INCLUDE das colunas devolvidas pela API,
+para que as consultas sejam index-only.
+
+Periodos que atravessam a virada do ano (ex.: 20/12 a 10/01) viram dois
+intervalos de mes_dia unidos com UNION ALL. Nascidos em 29/02 aparecem em 28/02
+nos anos nao bissextos.
+
+Execute: python migrations/aniversariantes.py --salao <uuid>
+         python migrations/aniversariantes.py --salao <uuid> --de 2024-12-20 --ate 2025-01-10
+"""
+import argparse
+import calendar
+from datetime import date, timedelta
+
+from conexao import conectar
+from schema import Indice
+
+DDL = [
+    ("funcao mes_dia", """
+        CREATE OR REPLACE FUNCTION sgsx.mes_dia(data DATE)
+        RETURNS SMALLINT AS $$
+            SELECT (EXTRACT(MONTH FROM data) * 100 + EXTRACT(DAY FROM data))::smallint
+        $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """),
+]
+
+INDICES = [
+    Indice('idx_clientes_aniversario', 'clientes',
+           '(salao_id, sgsx.mes_dia(data_nascimento), filial_id) '
+           'INCLUDE (id, nome, data_nascimento, telefone, whatsapp, ativo) '
+           'WHERE data_nascimento IS NOT NULL'),
+]
+
+# A idade e a que o cliente completa no aniversario dentro do periodo (ano do intervalo)
+CONSULTA_INTERVALO = """
+    SELECT id, nome, data_nascimento,
+           (%(ano_{ordem})s - EXTRACT(YEAR FROM data_nascimento))::int AS idade,
+           telefone AS celular, whatsapp, {ordem} AS ordem
+    FROM sgsx.clientes
+    WHERE salao_id = %(salao)s AND data_nascimento IS NOT NULL AND ativo IS TRUE
+    AND sgsx.mes_dia(data_nascimento) BETWEEN %(inicio_{ordem})s AND %(fim_{ordem})s
+    {filtro_filial}
+"""
+
+
+def mes_dia(d):
+    return d.month * 100 + d.day
+
+
+def intervalos_mes_dia(de, ate):
+    """
+    Converte o periodo [de, ate] em intervalos (inicio, fim) de mes_dia, na
+    ordem do calendario. Periodos de um ano ou mais devolvem o ano inteiro.
+    """
+    if ate < de:
+        raise ValueError("Data final anterior a inicial")
+    if (ate - de).days >= 365:
+        return [(101, 1231)]
+
+    def fim_ajustado(d):
+        # 28/02 de ano nao bissexto tambem cobre os nascidos em 29/02
+        if d.month == 2 and d.day == 28 and not calendar.isleap(d.year):
+            return 229
+        return mes_dia(d)
+
+    if de.year == ate.year:
+        return [(mes_dia(de), fim_ajustado(ate))]
+    return [(mes_dia(de), 1231), (101, fim_ajustado(ate))]
+
+
+def _listar(cur, salao_id, de, ate, filial_id=None):
+    """Um SELECT por intervalo de mes_dia, unidos com UNION ALL e ordenados pelo calendario do periodo."""
+    intervalos = intervalos_mes_dia(de, ate)
+    parametros = {'salao': salao_id, 'filial': filial_id}
+    filtro_filial = "AND filial_id = %(filial)s" if filial_id else ""
+    partes = []
+    for ordem, (inicio, fim) in enumerate(intervalos):
+        parametros[f'inicio_{ordem}'] = inicio
+        parametros[f'fim_{ordem}'] = fim
+        # Na virada do ano o primeiro intervalo e do ano inicial e o segundo do final
+        parametros[f'ano_{ordem}'] = de.year if ordem == 0 and len(intervalos) > 1 else ate.year
+        partes.append(CONSULTA_INTERVALO.format(ordem=ordem, filtro_filial=filtro_filial))
+    cur.execute(f"""
+        SELECT id, nome, data_nascimento, idade, celular, whatsapp
+        FROM ({" UNION ALL ".join(partes)}) a
+        ORDER BY ordem, sgsx.mes_dia(data_nascimento), nome
+    """, parametros)
+    colunas = [c.name for c in cur.description]
+    return [dict(zip(colunas, row)) for row in cur.fetchall()]
+
+
+def listar_hoje(cur, salao_id, filial_id=None, hoje=None):
+    hoje = hoje or date.today()
+    return _listar(cur, salao_id, hoje, hoje, filial_id)
+
+
+def listar_por_mes(cur, salao_id, mes=None, filial_id=None, ano=None):
+    hoje = date.today()
+    mes, ano = mes or hoje.month, ano or hoje.year
+    return _listar(cur, salao_id, date(ano, mes, 1), date(ano, mes, calendar.monthrange(ano, mes)[1]), filial_id)
+
+
+def listar_por_periodo(cur, salao_id, de, ate, filial_id=None):
+    return _listar(cur, salao_id, de, ate, filial_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aniversariantes de um salao")
+    parser.add_argument('--salao', required=True)
+    parser.add_argument('--filial')
+    parser.add_argument('--de', type=date.fromisoformat, help="inicio do periodo (padrao: hoje)")
+    parser.add_argument('--ate', type=date.fromisoformat, help="fim do periodo (padrao: de + 7 dias)")
+    args = parser.parse_args()
+
+    de = args.de or date.today()
+    ate = args.ate or de + timedelta(days=7)
+
+    conn = conectar()
+    try:
+        with conn.cursor() as cur:
+            for a in listar_por_periodo(cur, args.salao, de, ate, args.filial):
+                print(f"  {a['data_nascimento']:%d/%m}  {a['nome']:<40} {a['idade']:>3} anos  {a['whatsapp'] or ''}")
+    finally:
+        conn.close()
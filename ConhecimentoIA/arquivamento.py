@@ -0,0 +1,277 @@
+"""
+Arquivamento de comandas fechadas (pagas e canceladas) antigas.
+
+sgsx.comandas, comanda_itens e comanda_pagamentos guardavam todo o historico
+nas mesmas tabelas que as telas de comandas abertas consultam. A migracao 0015
+cria as tabelas de arquivo (mesmas colunas, sem FKs nem triggers):
+
+- sgsx.comandas_arquivo, sgsx.comanda_itens_arquivo, sgsx.comanda_pagamentos_arquivo;
+- as views sgsx.comandas_todas, comanda_itens_todos e comanda_pagamentos_todos
+  (quente UNION ALL arquivo), usadas por relatorios que leem o historico
+  inteiro (backfill de comissoes, reconciliacao dos contadores).
+
+Cada lote move, em uma transacao e um unico comando, as comandas fechadas
+ha mais de `idade` dias com seus itens e pagamentos. O lote usa FOR UPDATE
+SKIP LOCKED e as linhas movidas saem da tabela quente, entao o processo pode
+ser interrompido e retomado a qualquer momento. Com --exportar cada lote
+tambem vai para CSV gzip (um arquivo por tabela e lote) para guarda fria.
+
+Os rollups (comissoes_diarias, comandas_totais_diarios) nao mudam: o lote
+marca a transacao com sgsx.arquivando = on e os triggers de DELETE ignoram
+essas remocoes. Comandas citadas por mensagens do WhatsApp ficam na tabela
+quente (a FK ON DELETE SET NULL apagaria o vinculo).
+
+Colunas novas em comandas/comanda_itens/comanda_pagamentos devem ser
+adicionadas tambem na tabela _arquivo correspondente, na mesma migracao.
+
+Execute: python migrations/arquivamento.py --status
+         python migrations/arquivamento.py --idade 365 --lote 1000
+         python migrations/arquivamento.py --idade 730 --exportar /backup/comandas --vacuum
+"""
+import argparse
+import gzip
+import os
+import time
+from datetime import datetime, timedelta
+
+from conexao import conectar
+from schema import Indice
+
+IDADE_PADRAO = int(os.getenv('ARQUIVAMENTO_IDADE_DIAS', '365'))
+TAMANHO_LOTE = 1000
+
+TABELAS = ['comandas', 'comanda_itens', 'comanda_pagamentos']
+
+VIEWS = {'comandas': 'comandas_todas', 'comanda_itens': 'comanda_itens_todos',
+         'comanda_pagamentos': 'comanda_pagamentos_todos'}
+
+INDICES = [
+    # Mesmas consultas da tabela quente: lista do salao por periodo e itens da comanda
+    Indice('idx_comandas_arquivo_salao_data', 'comandas_arquivo', '(salao_id, data_abertura DESC)'),
+    Indice('idx_comandas_arquivo_pagas_fechamento', 'comandas_arquivo',
+           "(salao_id, data_fechamento) WHERE status = 'paga'"),
+    Indice('idx_comanda_itens_arquivo_comanda', 'comanda_itens_arquivo', '(comanda_id)'),
+    Indice('idx_comanda_itens_arquivo_colaborador', 'comanda_itens_arquivo',
+           '(colaborador_id, comanda_id) INCLUDE (valor_total, comissao_percentual, comissao_valor)'),
+    Indice('idx_comanda_pagamentos_arquivo_comanda', 'comanda_pagamentos_arquivo', '(comanda_id)'),
+    # Busca da FK ON DELETE SET NULL a cada comanda removida (e o filtro do lote)
+    Indice('idx_whatsapp_mensagens_comanda', 'whatsapp_mensagens',
+           '(comanda_id) WHERE comanda_id IS NOT NULL'),
+]
+
+DDL = [
+    (f"tabela {tabela}_arquivo", f"""
+        CREATE TABLE IF NOT EXISTS sgsx.{tabela}_arquivo (LIKE sgsx.{tabela}, PRIMARY KEY (id))
+    """)
+    for tabela in TABELAS
+] + [
+    (f"comentario {tabela}_arquivo",
+     f"COMMENT ON TABLE sgsx.{tabela}_arquivo IS "
+     f"'Historico arquivado de sgsx.{tabela} (comandas fechadas antigas, ver arquivamento.py)'")
+    for tabela in TABELAS
+] + [
+    (f"view {view}", f"""
+        CREATE OR REPLACE VIEW sgsx.{view} AS
+        SELECT * FROM sgsx.{tabela} UNION ALL SELECT * FROM sgsx.{tabela}_arquivo
+    """)
+    for tabela, view in VIEWS.items()
+] + [
+    ("funcao arquivando", """
+        CREATE OR REPLACE FUNCTION sgsx.arquivando()
+        RETURNS BOOLEAN AS $$
+            SELECT COALESCE(current_setting('sgsx.arquivando', true), '') = 'on'
+        $$ LANGUAGE sql STABLE
+    """),
+    # Remocoes do arquivamento nao sao estornos: os rollups continuam contando essas comandas
+    ("trigger contadores comandas delete", """
+        DROP TRIGGER trigger_contadores_comandas_delete ON sgsx.comandas;
+        CREATE TRIGGER trigger_contadores_comandas_delete
+            AFTER DELETE ON sgsx.comandas REFERENCING OLD TABLE AS antigas
+            FOR EACH STATEMENT WHEN (NOT sgsx.arquivando())
+            EXECUTE FUNCTION sgsx.contadores_comandas_comando()
+    """),
+    ("trigger comissoes comanda_itens", """
+        DROP TRIGGER trigger_comissoes_item ON sgsx.comanda_itens;
+        CREATE TRIGGER trigger_comissoes_item
+        AFTER INSERT OR UPDATE OF colaborador_id, valor_total, comissao_valor OR DELETE ON sgsx.comanda_itens
+        FOR EACH ROW WHEN (NOT sgsx.arquivando())
+        EXECUTE FUNCTION sgsx.comissoes_item()
+    """),
+] + [(f"indice {ix.nome}", ix.sql()) for ix in INDICES]
+
+# Um lote: seleciona, remove da tabela quente e grava no arquivo em um comando.
+# data_abertura < limite e redundante (fechamento >= abertura) e usa idx_comandas_data.
+MOVER_LOTE = """
+    WITH alvo AS (
+        SELECT c.id FROM sgsx.comandas c
+        WHERE c.data_abertura < %(limite)s
+        AND COALESCE(c.data_fechamento, c.data_abertura) < %(limite)s
+        AND c.status IN ('paga', 'cancelada')
+        AND NOT EXISTS (SELECT 1 FROM sgsx.whatsapp_mensagens m WHERE m.comanda_id = c.id)
+        ORDER BY c.data_abertura, c.id
+        LIMIT %(lote)s
+        FOR UPDATE OF c SKIP LOCKED
+    ), itens AS (
+        DELETE FROM sgsx.comanda_itens i USING alvo WHERE i.comanda_id = alvo.id RETURNING i.*
+    ), pagamentos AS (
+        DELETE FROM sgsx.comanda_pagamentos p USING alvo WHERE p.comanda_id = alvo.id RETURNING p.*
+    ), comandas AS (
+        DELETE FROM sgsx.comandas c USING alvo WHERE c.id = alvo.id RETURNING c.*
+    ), arquivo_comandas AS (
+        INSERT INTO sgsx.comandas_arquivo SELECT * FROM comandas RETURNING id
+    ), arquivo_itens AS (
+        INSERT INTO sgsx.comanda_itens_arquivo SELECT * FROM itens RETURNING 1
+    ), arquivo_pagamentos AS (
+        INSERT INTO sgsx.comanda_pagamentos_arquivo SELECT * FROM pagamentos RETURNING 1
+    )
+    SELECT (SELECT array_agg(id)::text[] FROM arquivo_comandas),
+           (SELECT COUNT(*) FROM arquivo_itens),
+           (SELECT COUNT(*) FROM arquivo_pagamentos),
+           (SELECT COALESCE(SUM(pg_column_size(c.*)), 0) FROM comandas c)
+           + (SELECT COALESCE(SUM(pg_column_size(i.*)), 0) FROM itens i)
+           + (SELECT COALESCE(SUM(pg_column_size(p.*)), 0) FROM pagamentos p)
+"""
+
+
+def _tamanhos(cur):
+    """{tabela: (bytes com indices e toast, tuplas mortas)} das tabelas quentes e de arquivo."""
+    cur.execute("""
+        SELECT relname, pg_total_relation_size(relid), n_dead_tup
+        FROM pg_stat_user_tables
+        WHERE schemaname = 'sgsx' AND relname = ANY(%s)
+    """, (TABELAS + [f"{t}_arquivo" for t in TABELAS],))
+    return {nome: (tamanho, mortas) for nome, tamanho, mortas in cur.fetchall()}
+
+
+def _mb(n):
+    return f"{n / 1024 / 1024:.1f} MB"
+
+
+def status(conn):
+    """Linhas e tamanho das tabelas quentes x arquivo."""
+    with conn.cursor() as cur:
+        tamanhos = _tamanhos(cur)
+        print(f"\n{'Tabela':<22}{'Quente':>12}{'Tamanho':>12}{'Arquivo':>12}{'Tamanho':>12}")
+        for tabela in TABELAS:
+            cur.execute(f"SELECT (SELECT COUNT(*) FROM sgsx.{tabela}), (SELECT COUNT(*) FROM sgsx.{tabela}_arquivo)")
+            quente, arquivo = cur.fetchone()
+            print(f"{tabela:<22}{quente:>12}{_mb(tamanhos[tabela][0]):>12}"
+                  f"{arquivo:>12}{_mb(tamanhos[f'{tabela}_arquivo'][0]):>12}")
+        cur.execute("""
+            SELECT MIN(COALESCE(data_fechamento, data_abertura)) FROM sgsx.comandas
+            WHERE status IN ('paga', 'cancelada')
+        """)
+        print(f"\n  Comanda fechada mais antiga na tabela quente: {cur.fetchone()[0] or '-'}")
+    conn.rollback()
+
+
+def _exportar(cur, diretorio, rodada, lote, comandas):
+    """Grava as linhas do lote (ja no arquivo) em CSV gzip; devolve [(temporario, final)]."""
+    arquivos = []
+    for tabela in TABELAS:
+        coluna = 'id' if tabela == 'comandas' else 'comanda_id'
+        final = os.path.join(diretorio, tabela, f"{rodada}_{lote:05d}.csv.gz")
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        with gzip.open(final + '.tmp', 'wb') as f:
+            cur.copy_expert(cur.mogrify(
+                f"COPY (SELECT * FROM sgsx.{tabela}_arquivo WHERE {coluna} = ANY(%s::uuid[])) "
+                f"TO STDOUT WITH (FORMAT csv, HEADER)", (comandas,)
+            ).decode(), f)
+        arquivos.append((final + '.tmp', final))
+    return arquivos
+
+
+def arquivar(conn, idade=IDADE_PADRAO, tamanho_lote=TAMANHO_LOTE, max_lotes=None, exportar=None,
+             pausa=0.0, vacuum=False):
+    """
+    Move as comandas fechadas ha mais de `idade` dias para o arquivo, um lote
+    por transacao, ate acabar (ou `max_lotes`). Devolve {tabela: linhas movidas}.
+    """
+    limite = datetime.now() - timedelta(days=idade)
+    rodada = datetime.now().strftime('%Y%m%d_%H%M%S')
+    movidas = {tabela: 0 for tabela in TABELAS}
+    liberados = 0
+
+    conn.autocommit = False
+    cur = conn.cursor()
+    antes = _tamanhos(cur)
+    conn.commit()
+    print(f"\nArquivando comandas fechadas antes de {limite:%Y-%m-%d %H:%M} (lotes de {tamanho_lote})...")
+
+    inicio = time.perf_counter()
+    lote = 0
+    try:
+        while max_lotes is None or lote < max_lotes:
+            lote += 1
+            cur.execute("SET LOCAL sgsx.arquivando = 'on'")
+            cur.execute(MOVER_LOTE, {'limite': limite, 'lote': tamanho_lote})
+            comandas, itens, pagamentos, tamanho = cur.fetchone()
+            if not comandas:
+                conn.rollback()
+                break
+            arquivos = _exportar(cur, exportar, rodada, lote, comandas) if exportar else []
+            conn.commit()
+            for temporario, final in arquivos:
+                os.replace(temporario, final)
+
+            movidas['comandas'] += len(comandas)
+            movidas['comanda_itens'] += itens
+            movidas['comanda_pagamentos'] += pagamentos
+            liberados += tamanho
+            decorrido = time.perf_counter() - inicio
+            print(f"  Lote {lote}: {len(comandas)} comandas, {itens} itens, {pagamentos} pagamentos "
+                  f"({sum(movidas.values()) / decorrido:.0f} linhas/s)")
+            if pausa:
+                time.sleep(pausa)
+    except KeyboardInterrupt:
+        conn.rollback()
+        print(f"\n  Interrompido no lote {lote}: lotes anteriores ja gravados, rode de novo para continuar.")
+    finally:
+        cur.close()
+
+    duracao = time.perf_counter() - inicio
+    total = sum(movidas.values())
+    print(f"\n  {total} linhas movidas em {duracao:.1f}s ({total / duracao if duracao else 0:.0f} linhas/s)")
+    for tabela, linhas in movidas.items():
+        print(f"    {tabela}: {linhas}")
+
+    if vacuum and total:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            for tabela in TABELAS:
+                cur.execute(f"VACUUM (ANALYZE) sgsx.{tabela}")
+                cur.execute(f"ANALYZE sgsx.{tabela}_arquivo")
+        conn.autocommit = False
+
+    with conn.cursor() as cur:
+        depois = _tamanhos(cur)
+    conn.rollback()
+    print(f"\n{'Tabela':<28}{'Antes':>12}{'Depois':>12}{'Tuplas mortas':>16}")
+    for nome in depois:
+        print(f"{nome:<28}{_mb(antes[nome][0]):>12}{_mb(depois[nome][0]):>12}{depois[nome][1]:>16}")
+    print(f"\n  ~{_mb(liberados)} de linhas removidas das tabelas quentes"
+          + (" (espaco livre para reuso apos o VACUUM; o arquivo em disco so encolhe com VACUUM FULL/pg_repack)"
+             if vacuum else " (rode com --vacuum, ou espere o autovacuum, para reutilizar o espaco)"))
+    return movidas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arquivamento de comandas fechadas do SGSx")
+    parser.add_argument('--status', action='store_true', help="linhas e tamanho das tabelas quentes x arquivo")
+    parser.add_argument('--idade', type=int, default=IDADE_PADRAO,
+                        help="arquiva comandas fechadas ha mais de N dias (padrao ARQUIVAMENTO_IDADE_DIAS ou 365)")
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help="comandas por lote/transacao")
+    parser.add_argument('--max-lotes', type=int, help="para depois de N lotes (continua na proxima execucao)")
+    parser.add_argument('--pausa', type=float, default=0.0, help="segundos de pausa entre lotes")
+    parser.add_argument('--exportar', metavar='DIRETORIO', help="grava cada lote tambem em CSV gzip")
+    parser.add_argument('--vacuum', action='store_true', help="VACUUM nas tabelas quentes ao final")
+    args = parser.parse_args()
+
+    conn = conectar()
+    try:
+        if args.status:
+            status(conn)
+        else:
+            arquivar(conn, args.idade, args.lote, args.max_lotes, args.exportar, args.pausa, args.vacuum)
+    finally:
+        conn.close()
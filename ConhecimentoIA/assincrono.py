@@ -0,0 +1,255 @@
+"""
+Backend assincrono (asyncpg) para o bootstrap e os jobs em lote.
+
+O caminho padrao (psycopg2) e sincrono: um comando espera o anterior e um
+salao espera o outro. Aqui as mesmas operacoes rodam sobre um pool asyncpg
+limitado (`concorrencia` conexoes):
+
+- trabalho por salao (provisionamento, reaplicacao do catalogo padrao, carga
+  do gerador) roda em paralelo, uma transacao por salao, repetida em erros
+  transitorios como no conexao.Pool;
+- os INSERT ... ON CONFLICT dos dados padrao usam executemany, que o asyncpg
+  envia em pipeline (um round trip por lote, sem esperar cada linha);
+- o COPY do gerador usa copy_records_to_table (protocolo binario).
+
+Selecione com `--backend async` no seed.py (carga do --gerar) e no
+provisionamento.py. Migracoes e dados iniciais continuam no psycopg2: sao uma
+sequencia ordenada em uma transacao, sem trabalho independente para
+sobrepor. O asyncpg e opcional: sem ele so o backend sincrono fica
+disponivel. A conexao usa as mesmas variaveis de ambiente do conexao.py
+(keepalives TCP ficam com o padrao do sistema, o asyncpg nao os expoe).
+
+Execute: python migrations/assincrono.py --benchmark 500 --concorrencia 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+import dados_padrao
+import gerador
+import provisionamento
+from conexao import ESPERA_INICIAL, SQLSTATES_TRANSITORIOS, TENTATIVAS, conectar, parametros_conexao
+
+CONCORRENCIA = int(os.getenv('DATABASE_POOL_MAXIMO', '4'))
+
+
+def _transitorio(erro):
+    """Equivalente a conexao.erro_transitorio() para as excecoes do asyncpg."""
+    # Conexao que cai dentro da transacao chega como InterfaceError no __aexit__,
+    # com a causa real em __context__
+    while erro is not None:
+        if isinstance(erro, (OSError, asyncio.TimeoutError, asyncpg.exceptions.ConnectionDoesNotExistError)):
+            return True
+        codigo = getattr(erro, 'sqlstate', None) or ''
+        if codigo in SQLSTATES_TRANSITORIOS or codigo.startswith('08'):
+            return True
+        erro = erro.__cause__ or erro.__context__
+    return False
+
+
+async def criar_pool(concorrencia=CONCORRENCIA):
+    """Pool asyncpg com no maximo `concorrencia` conexoes, com os parametros do conexao.py."""
+    if asyncpg is None:
+        raise RuntimeError("Backend async requer o pacote asyncpg (pip install asyncpg)")
+    p = parametros_conexao()
+    configuracoes = {'application_name': p['application_name']}
+    if not os.getenv('DATABASE_PGBOUNCER'):
+        for nome in ('statement_timeout', 'lock_timeout'):
+            valor = os.getenv(f'DATABASE_{nome.upper()}')
+            if valor:
+                configuracoes[nome] = valor
+    return await asyncpg.create_pool(
+        host=p['host'], port=int(p['port']), user=p['user'], password=p['password'] or None,
+        database=p['database'], timeout=p['connect_timeout'], server_settings=configuracoes,
+        min_size=1, max_size=concorrencia,
+        # Atras do pgbouncer em modo transaction nao ha prepared statements de sessao
+        statement_cache_size=0 if os.getenv('DATABASE_PGBOUNCER') else 100,
+    )
+
+
+async def executar(pool, funcao, tentativas=TENTATIVAS):
+    """Executa `await funcao(conn)` em uma transacao, repetindo em erros transitorios."""
+    espera = ESPERA_INICIAL
+    for tentativa in range(1, tentativas + 1):
+        try:
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    return await funcao(conn)
+        except Exception as e:
+            if tentativa == tentativas or not _transitorio(e):
+                raise
+            print(f"  Erro transitorio ({type(e).__name__}); tentativa {tentativa + 1}/{tentativas} em {espera:.1f}s")
+            await asyncio.sleep(espera)
+            espera *= 2
+
+
+async def por_salao(pool, itens, funcao):
+    """`funcao(conn, item)` para cada item, em paralelo (limitado pelo pool); devolve na ordem."""
+    return await asyncio.gather(*(executar(pool, lambda conn, item=item: funcao(conn, item)) for item in itens))
+
+
+async def aplicar_dados_padrao(conn, dados, saloes=None):
+    """Versao asyncpg de dados_padrao.aplicar(): o mesmo INSERT ... ON CONFLICT, em pipeline."""
+    colunas = len(dados.colunas) + (1 if dados.por_salao else 0)
+    sql = dados.sql().replace('VALUES %s', f"VALUES ({', '.join(f'${i}' for i in range(1, colunas + 1))})")
+    if dados.por_salao:
+        linhas = [(salao_id,) + tuple(linha) for salao_id in saloes for linha in dados.linhas]
+    else:
+        linhas = [tuple(linha) for linha in dados.linhas]
+    await conn.executemany(sql, linhas)
+
+
+async def provisionar(pool, modelo_id, saloes, tamanho_lote=1):
+    """Saloes a partir do modelo (sgsx.provisionar_saloes), lotes em paralelo. Devolve [(id, nome)]."""
+    lotes = [saloes[i:i + tamanho_lote] for i in range(0, len(saloes), tamanho_lote)]
+
+    async def lote(conn, itens):
+        return await conn.fetch("SELECT id, nome FROM sgsx.provisionar_saloes($1, $2::jsonb)",
+                                uuid.UUID(modelo_id), json.dumps(itens))
+
+    resultado = await por_salao(pool, lotes, lote)
+    return [(str(row['id']), row['nome']) for linhas in resultado for row in linhas]
+
+
+async def reaplicar_catalogo(pool, saloes):
+    """Reaplica o catalogo padrao (dados_padrao.CATALOGO_SALAO) a cada salao, em paralelo."""
+    async def catalogo(conn, salao_id):
+        for dados in dados_padrao.CATALOGO_SALAO:
+            await aplicar_dados_padrao(conn, dados, [salao_id])
+    await por_salao(pool, saloes, catalogo)
+
+
+async def gerar(pool, saloes, servicos, tipos_recebimento, semente=gerador.SEMENTE, referencia=None,
+                clientes=500, comandas=2000, mensagens=2000, dias=365, primeiro=None):
+    """
+    Versao asyncpg de gerador.gerar(): as linhas de cada salao sao geradas em
+    sequencia numa thread (mesma semente, mesmos dados) e a carga dos saloes
+    ja gerados corre em paralelo, uma transacao por salao.
+    """
+    rng = random.Random(semente)
+    referencia = referencia or date.today()
+    async with pool.acquire() as conn:
+        await conn.execute("""
+            SELECT sgsx.criar_particao_whatsapp(mes::date)
+            FROM generate_series(date_trunc('month', $1::date), date_trunc('month', $2::date), interval '1 month') mes
+        """, referencia - timedelta(days=dias), referencia)
+        if primeiro is None:
+            primeiro = await conn.fetchval("SELECT COUNT(*) FROM sgsx.saloes WHERE nome LIKE 'Salao Sintetico %'") + 1
+
+    async def carregar(conn, linhas):
+        for tabela, colunas in gerador.COLUNAS.items():
+            if linhas[tabela]:
+                await conn.copy_records_to_table(tabela, schema_name='sgsx', columns=colunas, records=linhas[tabela])
+        await conn.execute("SELECT sgsx.sincronizar_numeracao_comandas($1)", uuid.UUID(linhas['saloes'][0][0]))
+
+    loop = asyncio.get_running_loop()
+    totais = {tabela: 0 for tabela in gerador.COLUNAS}
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=1) as geracao:
+        cargas = []
+        for n in range(primeiro, primeiro + saloes):
+            linhas = await loop.run_in_executor(geracao, gerador.gerar_salao, rng, n, referencia, servicos,
+                                                tipos_recebimento, clientes, comandas, mensagens, dias)
+            for tabela in totais:
+                totais[tabela] += len(linhas[tabela])
+            cargas.append(asyncio.ensure_future(executar(pool, lambda conn, linhas=linhas: carregar(conn, linhas))))
+            print(f"  Salao {n - primeiro + 1}/{saloes}: {len(linhas['clientes'])} clientes, "
+                  f"{len(linhas['comandas'])} comandas, {len(linhas['whatsapp_mensagens'])} mensagens")
+            # Limita a memoria: no maximo um salao gerado esperando por conexao livre
+            while sum(not c.done() for c in cargas) > pool.get_max_size():
+                await asyncio.wait(cargas, return_when=asyncio.FIRST_COMPLETED)
+        await asyncio.gather(*cargas)
+
+    async with pool.acquire() as conn:
+        await conn.execute("ANALYZE " + ', '.join(f"sgsx.{tabela}" for tabela in gerador.COLUNAS))
+
+    duracao = time.perf_counter() - inicio
+    linhas = sum(totais.values())
+    print(f"\n  {linhas} linhas em {duracao:.1f}s ({linhas / duracao:.0f} linhas/s)")
+    return totais
+
+
+def _remover_saloes(ids):
+    """Remove os saloes criados pelo benchmark (e o catalogo copiado)."""
+    conn = conectar(autocommit=True, verbose=False)
+    try:
+        with conn.cursor() as cur:
+            for tabela in ('servicos', 'tipos_recebimento', 'filiais', 'perfis', 'saloes'):
+                coluna = 'id' if tabela == 'saloes' else 'salao_id'
+                cur.execute(f"DELETE FROM sgsx.{tabela} WHERE {coluna} = ANY(%s::uuid[])", (ids,))
+    finally:
+        conn.close()
+
+
+def benchmark(quantidade=500, concorrencia=CONCORRENCIA):
+    """
+    Saloes/s do caminho sincrono (psycopg2, um salao por transacao, em
+    sequencia) x backend async, no provisionamento a partir do modelo e na
+    reaplicacao do catalogo padrao. Os saloes criados sao removidos ao final.
+    """
+    resultado = []
+    criados = []
+    conn = conectar(verbose=False)
+    try:
+        with conn.cursor() as cur:
+            modelo_id = provisionamento.salao_modelo(cur)
+        conn.commit()
+
+        saloes = [{'nome': f"Benchmark sync {n}"} for n in range(quantidade)]
+        inicio = time.perf_counter()
+        ids = [salao_id for salao_id, _ in provisionamento.provisionar(conn, modelo_id, saloes, tamanho_lote=1)]
+        resultado.append(('provisionamento sync', time.perf_counter() - inicio))
+        criados += ids
+
+        inicio = time.perf_counter()
+        with conn.cursor() as cur:
+            for salao_id in ids:
+                dados_padrao.aplicar_catalogo(cur, [salao_id])
+                conn.commit()
+        resultado.append(('catalogo sync', time.perf_counter() - inicio))
+
+        async def assincrono():
+            pool = await criar_pool(concorrencia)
+            try:
+                saloes = [{'nome': f"Benchmark async {n}"} for n in range(quantidade)]
+                inicio = time.perf_counter()
+                ids = [salao_id for salao_id, _ in await provisionar(pool, modelo_id, saloes)]
+                resultado.append((f"provisionamento async x{concorrencia}", time.perf_counter() - inicio))
+                criados.extend(ids)
+
+                inicio = time.perf_counter()
+                await reaplicar_catalogo(pool, ids)
+                resultado.append((f"catalogo async x{concorrencia}", time.perf_counter() - inicio))
+            finally:
+                await pool.close()
+
+        asyncio.run(assincrono())
+    finally:
+        conn.close()
+        _remover_saloes(criados)
+
+    print(f"\n{'Operacao':<30}{'Saloes':>8}{'Tempo (s)':>12}{'Saloes/s':>12}")
+    for nome, segundos in resultado:
+        print(f"{nome:<30}{quantidade:>8}{segundos:>12.2f}{quantidade / segundos:>12.0f}")
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backend assincrono (asyncpg) do SGSx")
+    parser.add_argument('--benchmark', type=int, default=500, metavar='SALOES',
+                        help="saloes provisionados por backend na comparacao sync x async")
+    parser.add_argument('--concorrencia', type=int, default=CONCORRENCIA, help="conexoes do pool async")
+    args = parser.parse_args()
+
+    benchmark(args.benchmark, args.concorrencia)
@@ -0,0 +1,240 @@
+"""
+Updates sem mudanca e fillfactor das tabelas mais atualizadas.
+
+O trigger sgsx.update_updated_at() (BEFORE UPDATE em 12 tabelas) regravava
+updated_at em todo UPDATE, inclusive nos que nao mudam nada, como o polling de
+status das sessoes do WhatsApp gravando o mesmo status: cada um vira uma nova
+versao da linha, WAL e trabalho para o autovacuum. A migracao 0023 troca a
+funcao: se a linha nova e igual a antiga o trigger devolve NULL e o UPDATE nao
+grava nada (nem dispara os triggers AFTER de linha). Colunas geradas ainda
+estao nulas em NEW nesse ponto; as tabelas que as tem passam os nomes como
+argumentos do trigger para ficarem fora da comparacao. A migracao 0027 cria
+sgsx.ajustar_triggers_updated_at(), que recria esses triggers com as colunas
+geradas lidas do catalogo (comandas.saldo, clientes.telefone_digitos e
+whatsapp_digitos, whatsapp_mensagens.conteudo_tsv): chame-a na migracao que
+criar uma coluna gerada numa tabela com updated_at.
+
+A migracao tambem reduz o fillfactor de comandas, sessoes_whatsapp e produtos:
+sobra espaco na pagina para a nova versao da linha e o UPDATE que nao mexe em
+colunas indexadas fica HOT (sem entrada nova nos indices). O fillfactor vale
+para paginas novas; as existentes so mudam ao reescrever a tabela (VACUUM
+FULL, em janela de manutencao). Com comandas particionadas o fillfactor vai
+para cada particao.
+
+Para "tocar" uma linha sem mudar nada grave updated_at explicitamente.
+
+Execute: python migrations/atualizacoes.py --status
+         python migrations/atualizacoes.py --benchmark 50000 --repetidas 0.8
+"""
+import argparse
+import random
+import time
+
+from psycopg2.extras import execute_batch
+
+import schema
+from conexao import conectar
+
+FILLFACTOR = {'comandas': 85, 'sessoes_whatsapp': 70, 'produtos': 90}
+
+# Colunas geradas por tabela, ignoradas na comparacao OLD x NEW, como na migracao 0023;
+# a partir da 0027 os argumentos vem do catalogo (sgsx.ajustar_triggers_updated_at)
+COLUNAS_GERADAS = {'comandas': ['saldo']}
+
+LOTE = 100
+
+FUNCAO_UPDATED_AT = """
+    CREATE OR REPLACE FUNCTION sgsx.update_updated_at()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_NARGS = 0 THEN
+            IF NEW *= OLD THEN
+                RETURN NULL;
+            END IF;
+        ELSIF to_jsonb(NEW) - TG_ARGV = to_jsonb(OLD) - TG_ARGV THEN
+            RETURN NULL;
+        END IF;
+        NEW.updated_at = NOW();
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+
+def _fillfactor(tabela, valor):
+    # Tabela particionada nao aceita parametros de armazenamento: vai nas particoes
+    return (f"fillfactor {tabela}", f"""
+        DO $$ DECLARE alvo regclass; BEGIN
+            FOR alvo IN
+                SELECT oid FROM pg_class WHERE oid = 'sgsx.{tabela}'::regclass AND relkind = 'r'
+                UNION ALL
+                SELECT inhrelid FROM pg_inherits WHERE inhparent = 'sgsx.{tabela}'::regclass
+            LOOP
+                EXECUTE format('ALTER TABLE %s SET (fillfactor = {valor})', alvo);
+            END LOOP;
+        END $$
+    """)
+
+
+DDL = [
+    ("funcao update_updated_at sem updates vazios", FUNCAO_UPDATED_AT),
+] + [
+    (f"trigger updated_at {tabela}", f"""
+        DROP TRIGGER IF EXISTS trigger_updated_at_{tabela} ON sgsx.{tabela};
+        CREATE TRIGGER trigger_updated_at_{tabela}
+        BEFORE UPDATE ON sgsx.{tabela}
+        FOR EACH ROW EXECUTE FUNCTION sgsx.update_updated_at({', '.join(f"'{c}'" for c in colunas)})
+    """) for tabela, colunas in COLUNAS_GERADAS.items()
+] + [_fillfactor(tabela, valor) for tabela, valor in FILLFACTOR.items()]
+
+DDL_COLUNAS_GERADAS = [
+    # Recria so os triggers cujos argumentos nao batem com as colunas geradas atuais
+    ("funcao ajustar_triggers_updated_at", """
+        CREATE OR REPLACE FUNCTION sgsx.ajustar_triggers_updated_at()
+        RETURNS INTEGER AS $$
+        DECLARE
+            t RECORD;
+            ajustados INTEGER := 0;
+        BEGIN
+            FOR t IN
+                SELECT tg.tgname, pg_get_triggerdef(tg.oid) AS atual, format(
+                    'CREATE TRIGGER %I BEFORE UPDATE ON %s FOR EACH ROW EXECUTE FUNCTION sgsx.update_updated_at(%s)',
+                    tg.tgname, tg.tgrelid::regclass,
+                    (SELECT string_agg(quote_literal(a.attname), ', ' ORDER BY a.attnum) FROM pg_attribute a
+                     WHERE a.attrelid = tg.tgrelid AND a.attgenerated <> '' AND NOT a.attisdropped)
+                ) AS esperado, tg.tgrelid::regclass AS tabela
+                FROM pg_trigger tg
+                JOIN pg_class c ON c.oid = tg.tgrelid
+                WHERE c.relnamespace = 'sgsx'::regnamespace AND tg.tgparentid = 0
+                AND tg.tgfoid = 'sgsx.update_updated_at()'::regprocedure
+            LOOP
+                CONTINUE WHEN t.atual = t.esperado;
+                EXECUTE format('DROP TRIGGER %I ON %s', t.tgname, t.tabela);
+                EXECUTE t.esperado;
+                ajustados := ajustados + 1;
+            END LOOP;
+            RETURN ajustados;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+    ("triggers updated_at com colunas geradas", "SELECT sgsx.ajustar_triggers_updated_at()"),
+]
+
+
+def status(cur):
+    """Updates, updates HOT e linhas mortas das tabelas de FILLFACTOR (pg_stat_user_tables)."""
+    cur.execute("""
+        SELECT s.relname, s.n_tup_upd, s.n_tup_hot_upd, s.n_dead_tup, c.reloptions
+        FROM pg_stat_user_tables s JOIN pg_class c ON c.oid = s.relid
+        WHERE s.schemaname = 'sgsx' AND (s.relname = ANY(%s) OR s.relname ~ %s)
+        ORDER BY s.relname
+    """, (list(FILLFACTOR), '^(' + '|'.join(FILLFACTOR) + ')_h[0-9]+$'))
+    linhas = cur.fetchall()
+    print(f"\n{'Tabela':<22}{'Updates':>10}{'HOT':>10}{'% HOT':>8}{'Mortas':>9}  Opcoes")
+    for nome, updates, hot, mortas, opcoes in linhas:
+        percentual = 100 * hot / updates if updates else 0
+        print(f"{nome:<22}{updates:>10}{hot:>10}{percentual:>8.1f}{mortas:>9}  {','.join(opcoes or [])}")
+    return linhas
+
+
+def _rodada(conn, tabela, funcao, fillfactor, linhas, atualizacoes, repetidas, rng):
+    """Copia de sessoes_whatsapp com o trigger e o fillfactor dados; devolve as metricas do polling."""
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {tabela}")
+        cur.execute(f"CREATE TABLE {tabela} (LIKE sgsx.sessoes_whatsapp INCLUDING ALL) "
+                    f"WITH (fillfactor = {fillfactor}, autovacuum_enabled = false)")
+        cur.execute(f"CREATE TRIGGER trigger_updated_at BEFORE UPDATE ON {tabela} "
+                    f"FOR EACH ROW EXECUTE FUNCTION {funcao}()")
+        cur.execute(f"""
+            INSERT INTO {tabela} (salao_id, nome, numero, status, ultima_conexao)
+            SELECT gen_random_uuid(), 'Sessao ' || n, '5511' || (900000000 + n), 'conectada', NOW()
+            FROM generate_series(1, %s) n
+            RETURNING id
+        """, (linhas,))
+        ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+
+        # Polling: a maioria regrava o mesmo status; o resto registra uma nova conexao
+        parametros = [(rng.random() >= repetidas, rng.choice(ids)) for _ in range(atualizacoes)]
+        cur.execute("SELECT pg_current_wal_lsn()")
+        lsn = cur.fetchone()[0]
+        inicio = time.perf_counter()
+        # Um commit por lote, como as chamadas de polling: paginas podem ser podadas entre os lotes
+        for feitos in range(0, atualizacoes, LOTE):
+            execute_batch(cur, f"""
+                UPDATE {tabela} SET status = 'conectada',
+                    ultima_conexao = CASE WHEN %s THEN clock_timestamp() ELSE ultima_conexao END
+                WHERE id = %s
+            """, parametros[feitos:feitos + LOTE], page_size=LOTE)
+            conn.commit()
+        segundos = time.perf_counter() - inicio
+        cur.execute("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s), pg_relation_size(%s), pg_indexes_size(%s)",
+                    (lsn, tabela, tabela))
+        wal, heap, indices = cur.fetchone()
+        cur.execute("SELECT pg_stat_force_next_flush()")
+        conn.commit()
+        cur.execute("SELECT n_tup_upd, n_tup_hot_upd, n_dead_tup FROM pg_stat_user_tables WHERE relid = %s::regclass",
+                    (tabela,))
+        updates, hot, mortas = cur.fetchone()
+        conn.commit()
+        cur.execute(f"DROP TABLE {tabela}")
+        conn.commit()
+    return segundos, int(wal), heap, indices, updates, hot, mortas
+
+
+def benchmark(atualizacoes=50000, repetidas=0.8, linhas=200, semente=42):
+    """
+    Polling de status em copias de sessoes_whatsapp (tabelas temporarias no
+    schema sgsx, sem autovacuum): funcao antiga e fillfactor 100 x funcao
+    atual e FILLFACTOR. `repetidas` e a fracao de updates que nao mudam nada.
+    Mede WAL gerado, tamanho da tabela e dos indices, updates gravados e HOT.
+    """
+    conn = conectar(verbose=False)
+    resultado = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute(schema.FUNCAO_UPDATED_AT.replace('sgsx.update_updated_at()',
+                                                         'sgsx.benchmark_updated_at_antigo()'))
+            conn.commit()
+        try:
+            for rotulo, funcao, fillfactor in (
+                ('antes', 'sgsx.benchmark_updated_at_antigo', 100),
+                ('depois', 'sgsx.update_updated_at', FILLFACTOR['sessoes_whatsapp']),
+            ):
+                medidas = _rodada(conn, f"sgsx.benchmark_sessoes_{rotulo}", funcao, fillfactor,
+                                  linhas, atualizacoes, repetidas, random.Random(semente))
+                resultado.append((rotulo, fillfactor) + medidas)
+        finally:
+            with conn.cursor() as cur:
+                cur.execute("DROP FUNCTION IF EXISTS sgsx.benchmark_updated_at_antigo()")
+                conn.commit()
+    finally:
+        conn.close()
+
+    print(f"\n{atualizacoes} updates em {linhas} sessoes, {repetidas:.0%} sem mudanca")
+    print(f"{'Rodada':<8}{'FF':>4}{'Tempo (s)':>11}{'WAL (MB)':>10}{'Tabela (KB)':>13}{'Indices (KB)':>14}"
+          f"{'Gravados':>10}{'HOT':>8}{'Mortas':>8}")
+    for rotulo, fillfactor, segundos, wal, heap, indices, updates, hot, mortas in resultado:
+        print(f"{rotulo:<8}{fillfactor:>4}{segundos:>11.2f}{wal / 1024 / 1024:>10.2f}{heap / 1024:>13.0f}"
+              f"{indices / 1024:>14.0f}{updates:>10}{hot:>8}{mortas:>8}")
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Updates sem mudanca e fillfactor no SGSx")
+    parser.add_argument('--status', action='store_true', help="updates e updates HOT das tabelas com fillfactor")
+    parser.add_argument('--benchmark', type=int, metavar='UPDATES',
+                        help="polling de status em uma copia de sessoes_whatsapp, antes x depois")
+    parser.add_argument('--repetidas', type=float, default=0.8, help="fracao de updates sem mudanca no --benchmark")
+    parser.add_argument('--linhas', type=int, default=200, help="sessoes na copia do --benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.repetidas, args.linhas)
+    if args.status or not args.benchmark:
+        conn = conectar()
+        try:
+            with conn.cursor() as cur:
+                status(cur)
+        finally:
+            conn.close()
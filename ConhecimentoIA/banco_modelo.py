@@ -0,0 +1,238 @@
+"""
+Bancos de teste e staging clonados de um banco modelo (CREATE DATABASE ... TEMPLATE).
+
+Subir um banco novo com seed() roda todas as migracoes (schema, ENUMs,
+tabelas, indices, triggers) e o hash bcrypt dos usuarios padrao: segundos por
+banco, pagos de novo por cada suite ou worker de teste. Aqui o seed roda uma
+vez, num banco modelo; os bancos de teste sao copias dele feitas pelo proprio
+PostgreSQL, arquivo por arquivo, sem executar nada.
+
+O modelo se chama <DATABASE_NAME>_modelo_<assinatura>: a assinatura e o hash
+dos checksums das migracoes, do codigo dos dados iniciais (seed.py e
+dados_padrao.py) e do layout das comandas. Mudou o schema, muda o nome: o
+proximo garantir_modelo() constroi o novo e remove os modelos antigos. A
+construcao usa um banco temporario renomeado ao final (ninguem clona um
+modelo pela metade) e um advisory lock (workers em paralelo constroem uma vez
+so). O modelo fica com IS_TEMPLATE e ALLOW_CONNECTIONS false: CREATE
+DATABASE ... TEMPLATE falha se houver alguem conectado nele.
+
+O usuario do banco precisa de CREATEDB. Os comandos de banco rodam a partir do
+banco de manutencao (DATABASE_MANUTENCAO, padrao postgres).
+
+Execute: python migrations/banco_modelo.py --modelo
+         python migrations/banco_modelo.py --criar sgsx_teste_1
+         python migrations/banco_modelo.py --remover sgsx_teste_1
+         python migrations/banco_modelo.py --benchmark 10
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import statistics
+import time
+import uuid
+
+from psycopg2.extensions import quote_ident
+
+import migracoes
+import particoes_comandas
+import seed
+from conexao import conectar, parametros_conexao
+
+BANCO_MANUTENCAO = os.getenv('DATABASE_MANUTENCAO', 'postgres')
+
+# Estrategias do CREATE DATABASE (PostgreSQL 15+): wal_log copia bloco a bloco
+# pelo WAL; file_copy copia os arquivos e forca dois checkpoints
+ESTRATEGIAS = ['wal_log', 'file_copy']
+
+# Chave do advisory lock da construcao do modelo
+TRAVA_MODELO = 7_320_025
+
+
+def _base():
+    return parametros_conexao()['database']
+
+
+def assinatura(particoes=particoes_comandas.PARTICOES):
+    """Hash do que define o conteudo do modelo: migracoes, dados iniciais e layout das comandas."""
+    h = hashlib.sha256()
+    for m in migracoes.MIGRACOES:
+        h.update(f"{m.versao}:{m.checksum}\n".encode())
+    for modulo in ('seed.py', 'dados_padrao.py'):
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), modulo), 'rb') as f:
+            h.update(f.read())
+    h.update(f"particoes_comandas={particoes}".encode())
+    return h.hexdigest()
+
+
+def nome_modelo(particoes=particoes_comandas.PARTICOES):
+    return f"{_base()}_modelo_{assinatura(particoes)[:12]}"
+
+
+def _manutencao():
+    return conectar(autocommit=True, verbose=False, aplicacao='sgsx:banco_modelo', banco=BANCO_MANUTENCAO)
+
+
+def _remover(cur, nome):
+    cur.execute(f"DROP DATABASE IF EXISTS {quote_ident(nome, cur)} WITH (FORCE)")
+
+
+def garantir_modelo(particoes=particoes_comandas.PARTICOES, reconstruir=False):
+    """
+    Devolve o nome do modelo da assinatura atual, construindo-o (seed completo)
+    se ainda nao existir ou se reconstruir=True. Remove modelos de assinaturas
+    antigas do mesmo DATABASE_NAME.
+    """
+    nome = nome_modelo(particoes)
+    conn = _manutencao()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (TRAVA_MODELO,))
+            try:
+                cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (nome,))
+                if cur.fetchone() and not reconstruir:
+                    return nome
+
+                print(f"  Construindo o modelo {nome}...")
+                inicio = time.perf_counter()
+                temporario = f"{nome}_construindo"
+                _remover(cur, temporario)
+                cur.execute(f"CREATE DATABASE {quote_ident(temporario, cur)}")
+                try:
+                    seed.seed(particionar_comandas=particoes, banco=temporario)
+                    # Clones nascem com estatisticas e linhas congeladas (sem VACUUM de wraparound)
+                    modelo = conectar(autocommit=True, verbose=False, banco=temporario)
+                    try:
+                        with modelo.cursor() as cur_modelo:
+                            cur_modelo.execute("VACUUM (FREEZE, ANALYZE)")
+                    finally:
+                        modelo.close()
+                except Exception:
+                    _remover(cur, temporario)
+                    raise
+
+                cur.execute("""
+                    SELECT datname FROM pg_database WHERE datname LIKE %s AND datname <> %s AND datistemplate
+                """, (f"{_base()}\\_modelo\\_%", temporario))
+                antigos = [row[0] for row in cur.fetchall()]
+                for antigo in antigos:
+                    cur.execute(f"ALTER DATABASE {quote_ident(antigo, cur)} IS_TEMPLATE false")
+                    _remover(cur, antigo)
+                cur.execute(f"ALTER DATABASE {quote_ident(temporario, cur)} RENAME TO {quote_ident(nome, cur)}")
+                cur.execute(f"ALTER DATABASE {quote_ident(nome, cur)} IS_TEMPLATE true ALLOW_CONNECTIONS false")
+                cur.execute(f"COMMENT ON DATABASE {quote_ident(nome, cur)} IS %s",
+                            (f"Modelo SGSx, assinatura {assinatura(particoes)}",))
+                print(f"  Modelo {nome} pronto em {time.perf_counter() - inicio:.1f}s"
+                      + (f" ({len(antigos)} modelo(s) antigo(s) removido(s))" if antigos else ""))
+                return nome
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (TRAVA_MODELO,))
+    finally:
+        conn.close()
+
+
+def criar_banco(nome=None, particoes=particoes_comandas.PARTICOES, estrategia=None):
+    """
+    Cria um banco a partir do modelo (construido se preciso) e devolve o nome.
+    Sem `nome`: <DATABASE_NAME>_teste_<aleatorio>. `estrategia`: wal_log ou
+    file_copy (padrao do servidor: wal_log).
+    """
+    modelo = garantir_modelo(particoes)
+    nome = nome or f"{_base()}_teste_{uuid.uuid4().hex[:8]}"
+    conn = _manutencao()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE DATABASE {quote_ident(nome, cur)} TEMPLATE {quote_ident(modelo, cur)}"
+                        + (f" STRATEGY {estrategia}" if estrategia else ""))
+    finally:
+        conn.close()
+    return nome
+
+
+def remover_banco(nome):
+    """Remove o banco, desconectando quem estiver nele."""
+    conn = _manutencao()
+    try:
+        with conn.cursor() as cur:
+            _remover(cur, nome)
+    finally:
+        conn.close()
+
+
+@contextlib.contextmanager
+def banco_de_teste(particoes=particoes_comandas.PARTICOES, estrategia=None):
+    """Banco clonado do modelo para um teste ou worker; removido na saida."""
+    nome = criar_banco(particoes=particoes, estrategia=estrategia)
+    try:
+        yield nome
+    finally:
+        remover_banco(nome)
+
+
+def benchmark(bancos=10, particoes=particoes_comandas.PARTICOES):
+    """
+    Tempo para ter um banco pronto: seed() em um banco vazio x clone do modelo
+    com cada estrategia (`bancos` clones por estrategia, removidos ao final).
+    """
+    garantir_modelo(particoes)
+
+    nome = f"{_base()}_benchmark_seed"
+    conn = _manutencao()
+    try:
+        with conn.cursor() as cur:
+            _remover(cur, nome)
+            inicio = time.perf_counter()
+            cur.execute(f"CREATE DATABASE {quote_ident(nome, cur)}")
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    seed.seed(particionar_comandas=particoes, banco=nome)
+                tempo_seed = time.perf_counter() - inicio
+            finally:
+                _remover(cur, nome)
+    finally:
+        conn.close()
+
+    resultado = {}
+    for estrategia in ESTRATEGIAS:
+        tempos = []
+        for _ in range(bancos):
+            inicio = time.perf_counter()
+            clone = criar_banco(particoes=particoes, estrategia=estrategia)
+            tempos.append(time.perf_counter() - inicio)
+            remover_banco(clone)
+        resultado[estrategia] = tempos
+
+    print(f"\n{'Preparo do banco':<22}{'p50 (s)':>9}{'max (s)':>9}{'x seed':>8}")
+    print(f"{'seed() completo':<22}{tempo_seed:>9.3f}{tempo_seed:>9.3f}{1:>8.1f}")
+    for estrategia, tempos in resultado.items():
+        mediana = statistics.median(tempos)
+        print(f"{'clone ' + estrategia:<22}{mediana:>9.3f}{max(tempos):>9.3f}{tempo_seed / mediana:>8.1f}")
+    return tempo_seed, resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bancos de teste clonados do modelo do SGSx")
+    parser.add_argument('--modelo', action='store_true', help="constroi o modelo se a assinatura mudou")
+    parser.add_argument('--reconstruir', action='store_true', help="reconstroi o modelo mesmo sem mudanca")
+    parser.add_argument('--criar', nargs='?', const='', metavar='NOME', help="cria um banco a partir do modelo")
+    parser.add_argument('--estrategia', choices=ESTRATEGIAS, help="STRATEGY do CREATE DATABASE no --criar")
+    parser.add_argument('--remover', metavar='NOME', help="remove um banco de teste")
+    parser.add_argument('--benchmark', type=int, metavar='BANCOS', help="seed() x clones do modelo")
+    parser.add_argument('--particoes-comandas', type=int, default=particoes_comandas.PARTICOES, metavar='N',
+                        help="layout das comandas no modelo (padrao SGSX_PARTICOES_COMANDAS)")
+    args = parser.parse_args()
+
+    if args.modelo or args.reconstruir:
+        print(f"Modelo: {garantir_modelo(args.particoes_comandas, args.reconstruir)}")
+    if args.criar is not None:
+        inicio = time.perf_counter()
+        criado = criar_banco(args.criar or None, args.particoes_comandas, args.estrategia)
+        print(f"Banco {criado} criado em {time.perf_counter() - inicio:.3f}s")
+    if args.remover:
+        remover_banco(args.remover)
+        print(f"Banco {args.remover} removido")
+    if args.benchmark:
+        benchmark(args.benchmark, args.particoes_comandas)
+    if not (args.modelo or args.reconstruir or args.criar is not None or args.remover or args.benchmark):
+        parser.error("informe --modelo, --criar, --remover ou --benchmark")
@@ -0,0 +1,188 @@
+"""
+Benchmark das consultas quentes da API em relatorio JSON comparavel.
+
+Sorteia (com semente) alguns saloes do banco, geralmente populado com
+`seed.py --gerar`, e mede cada consulta no formato usado pela API:
+lista de comandas (com e sem status), comandas abertas da filial, relatorio de
+comissoes do mes, dashboard e historico de mensagens de uma conversa. Cada
+consulta roda `repeticoes` vezes por salao, depois de uma execucao de
+aquecimento, e o relatorio traz p50/p95/p99/max em milissegundos, o volume de
+linhas por tabela e a versao do PostgreSQL.
+
+Com --comparar o relatorio atual e confrontado com um anterior (ex.: antes e
+depois de um indice), consulta a consulta.
+
+Execute: python migrations/benchmark.py --saida benchmark.json
+         python migrations/benchmark.py --saloes 20 --repeticoes 50 --saida depois.json --comparar antes.json
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date, datetime
+
+import comissoes
+import contadores
+from conexao import conectar
+from gerador import COLUNAS, SEMENTE
+
+# Parametros por salao usados pelas consultas
+PARAMETROS = """
+    SELECT s.id AS salao,
+           (SELECT id FROM sgsx.filiais WHERE salao_id = s.id ORDER BY nome LIMIT 1) AS filial,
+           (SELECT remote_jid FROM sgsx.whatsapp_mensagens WHERE salao_id = s.id
+            ORDER BY "timestamp" DESC LIMIT 1) AS remote_jid
+    FROM sgsx.saloes s
+    WHERE s.id = ANY(%s::uuid[])
+"""
+
+# (nome, sql); as consultas em Python (dashboard, comissoes) ficam em CONSULTAS_FUNCOES
+CONSULTAS_SQL = [
+    ("comandas_lista", """
+        SELECT * FROM sgsx.comandas
+        WHERE salao_id = %(salao)s
+        ORDER BY data_abertura DESC
+        LIMIT 20
+    """),
+    ("comandas_lista_status", """
+        SELECT * FROM sgsx.comandas
+        WHERE salao_id = %(salao)s AND status = 'paga'
+        ORDER BY data_abertura DESC
+        LIMIT 20
+    """),
+    ("comandas_abertas_filial", """
+        SELECT * FROM sgsx.comandas
+        WHERE salao_id = %(salao)s AND filial_id = %(filial)s
+        AND status IN ('aberta', 'em_atendimento', 'aguardando_pagamento')
+        ORDER BY data_abertura DESC
+        LIMIT 50
+    """),
+    ("mensagens_conversa", """
+        SELECT id, message_id, from_me, conteudo, "timestamp", status
+        FROM sgsx.whatsapp_mensagens
+        WHERE salao_id = %(salao)s AND remote_jid = %(remote_jid)s
+        ORDER BY "timestamp" DESC
+        LIMIT 50
+    """),
+    ("mensagens_recentes", """
+        SELECT id, remote_jid, from_me, conteudo, "timestamp"
+        FROM sgsx.whatsapp_mensagens
+        WHERE salao_id = %(salao)s
+        ORDER BY "timestamp" DESC
+        LIMIT 50
+    """),
+]
+
+CONSULTAS_FUNCOES = [
+    ("comissoes_mes", lambda cur, p: comissoes.totais_comissoes(cur, p['salao'], p['inicio_mes'], p['hoje'])),
+    ("dashboard", lambda cur, p: contadores.estatisticas_salao(cur, p['salao'], p['hoje'])),
+]
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _resumo(tempos):
+    return {
+        'execucoes': len(tempos),
+        'media_ms': round(statistics.fmean(tempos), 3),
+        'p50_ms': round(_percentil(tempos, 50), 3),
+        'p95_ms': round(_percentil(tempos, 95), 3),
+        'p99_ms': round(_percentil(tempos, 99), 3),
+        'max_ms': round(max(tempos), 3),
+    }
+
+
+def executar(conn, saloes=10, repeticoes=20, semente=SEMENTE, hoje=None):
+    """Mede as consultas e devolve o relatorio (dict serializavel em JSON)."""
+    hoje = hoje or date.today()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM sgsx.saloes ORDER BY id")
+        todos = [str(row[0]) for row in cur.fetchall()]
+        if not todos:
+            raise RuntimeError("Nenhum salao no banco; gere dados com seed.py --gerar")
+        amostra = random.Random(semente).sample(todos, min(saloes, len(todos)))
+
+        cur.execute(PARAMETROS, (amostra,))
+        colunas = [c.name for c in cur.description]
+        parametros = [dict(zip(colunas, row), hoje=hoje, inicio_mes=hoje.replace(day=1)) for row in cur.fetchall()]
+
+        cur.execute("SELECT current_setting('server_version')")
+        versao = cur.fetchone()[0]
+        cur.execute("""
+            SELECT c.relname, c.reltuples::bigint FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'sgsx' AND c.relname = ANY(%s)
+        """, (list(COLUNAS),))
+        volumes = dict(cur.fetchall())
+
+        consultas = [(nome, lambda cur, p, sql=sql: cur.execute(sql, p)) for nome, sql in CONSULTAS_SQL]
+        consultas += CONSULTAS_FUNCOES
+
+        resultados = {}
+        for nome, consulta in consultas:
+            tempos = []
+            for p in parametros:
+                consulta(cur, p)
+                if cur.description:
+                    cur.fetchall()
+                for _ in range(repeticoes):
+                    inicio = time.perf_counter()
+                    consulta(cur, p)
+                    if cur.description:
+                        cur.fetchall()
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+            resultados[nome] = _resumo(tempos)
+            print(f"  {nome:<26} p50 {resultados[nome]['p50_ms']:>8.2f} ms   p95 {resultados[nome]['p95_ms']:>8.2f} ms")
+
+    return {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'postgres': versao,
+        'semente': semente,
+        'saloes_amostrados': len(parametros),
+        'repeticoes': repeticoes,
+        'volumes': volumes,
+        'consultas': resultados,
+    }
+
+
+def comparar(atual, anterior):
+    """Imprime p50/p95 do relatorio anterior x atual por consulta."""
+    print(f"\n{'Consulta':<26}{'p50 antes':>11}{'p50 agora':>11}{'p95 antes':>11}{'p95 agora':>11}{'Variacao':>10}")
+    for nome, agora in atual['consultas'].items():
+        antes = anterior['consultas'].get(nome)
+        if not antes:
+            print(f"{nome:<26}{'-':>11}{agora['p50_ms']:>11.2f}{'-':>11}{agora['p95_ms']:>11.2f}")
+            continue
+        variacao = (agora['p50_ms'] - antes['p50_ms']) / antes['p50_ms'] * 100 if antes['p50_ms'] else 0
+        print(f"{nome:<26}{antes['p50_ms']:>11.2f}{agora['p50_ms']:>11.2f}"
+              f"{antes['p95_ms']:>11.2f}{agora['p95_ms']:>11.2f}{variacao:>+9.0f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark das consultas da API do SGSx")
+    parser.add_argument('--saloes', type=int, default=10, help="saloes sorteados para medir")
+    parser.add_argument('--repeticoes', type=int, default=20, help="execucoes de cada consulta por salao")
+    parser.add_argument('--semente', type=int, default=SEMENTE, help="semente do sorteio dos saloes")
+    parser.add_argument('--hoje', type=date.fromisoformat, help="data de referencia (padrao: hoje)")
+    parser.add_argument('--saida', help="arquivo JSON do relatorio")
+    parser.add_argument('--comparar', help="relatorio JSON anterior para comparacao")
+    args = parser.parse_args()
+
+    conn = conectar()
+    try:
+        relatorio = executar(conn, args.saloes, args.repeticoes, args.semente, args.hoje)
+    finally:
+        conn.close()
+
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump(relatorio, f, indent=2, default=str)
+        print(f"\nRelatorio gravado em {args.saida}")
+    if args.comparar:
+        with open(args.comparar) as f:
+            comparar(relatorio, json.load(f))
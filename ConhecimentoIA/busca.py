@@ -0,0 +1,226 @@
+"""
+Busca textual em clientes e mensagens do WhatsApp.
+
+O autocomplete de clientes e o search de listarMensagensPorSessao faziam busca
+por trecho e sem acento, o que forcava seq scan em sgsx.clientes e em
+whatsapp_mensagens.conteudo. A migracao 0008 instala pg_trgm e unaccent e cria:
+
+- sgsx.f_unaccent(): wrapper IMMUTABLE do unaccent, utilizavel em indices;
+- clientes.telefone_digitos e clientes.whatsapp_digitos: colunas geradas so com
+  os digitos, para busca exata de telefone/WhatsApp (ex.: a partir do remote_jid);
+- whatsapp_mensagens.conteudo_tsv: tsvector gerado com a configuracao
+  sgsx.portugues_sem_acento (stemming portugues + unaccent).
+
+Os indices ficam na migracao 0009 (migracao_de_indices), que aceita
+--indices-concorrentes: GIN trigram em f_unaccent(lower(nome)), btree nos
+telefones normalizados e GIN no tsvector das mensagens.
+
+Execute: python migrations/busca.py --benchmark 100000
+"""
+import argparse
+import statistics
+import time
+
+import particoes
+from conexao import conectar
+from schema import Indice
+
+CONFIGURACAO_TEXTO = 'sgsx.portugues_sem_acento'
+
+DDL = [
+    ("extensao pg_trgm", "CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public"),
+    ("extensao unaccent", "CREATE EXTENSION IF NOT EXISTS unaccent SCHEMA public"),
+    # unaccent() e STABLE (depende do search_path); com o dicionario explicito
+    # o resultado e fixo e a funcao pode ser usada em indices de expressao
+    ("funcao f_unaccent", """
+        CREATE OR REPLACE FUNCTION sgsx.f_unaccent(texto TEXT)
+        RETURNS TEXT AS $$
+            SELECT public.unaccent('public.unaccent'::regdictionary, texto)
+        $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """),
+    ("configuracao de texto portugues_sem_acento", f"""
+        CREATE TEXT SEARCH CONFIGURATION {CONFIGURACAO_TEXTO} (COPY = pg_catalog.portuguese);
+        ALTER TEXT SEARCH CONFIGURATION {CONFIGURACAO_TEXTO}
+            ALTER MAPPING FOR hword, hword_part, word WITH public.unaccent, portuguese_stem
+    """),
+    ("colunas clientes telefone_digitos e whatsapp_digitos", r"""
+        ALTER TABLE sgsx.clientes
+            ADD COLUMN telefone_digitos VARCHAR(20)
+                GENERATED ALWAYS AS (NULLIF(regexp_replace(telefone, '\D', '', 'g'), '')) STORED,
+            ADD COLUMN whatsapp_digitos VARCHAR(20)
+                GENERATED ALWAYS AS (NULLIF(regexp_replace(whatsapp, '\D', '', 'g'), '')) STORED
+    """),
+    ("funcao criar_particao_whatsapp", particoes.FUNCAO_CRIAR_PARTICAO_COLUNAS_GERADAS),
+    ("coluna whatsapp_mensagens.conteudo_tsv", f"""
+        ALTER TABLE sgsx.whatsapp_mensagens
+            ADD COLUMN conteudo_tsv TSVECTOR
+                GENERATED ALWAYS AS (to_tsvector('{CONFIGURACAO_TEXTO}', COALESCE(conteudo, ''))) STORED
+    """),
+    ("comentarios de busca", """
+        COMMENT ON COLUMN sgsx.clientes.telefone_digitos IS 'Telefone so com digitos (gerada)';
+        COMMENT ON COLUMN sgsx.clientes.whatsapp_digitos IS 'WhatsApp so com digitos (gerada)';
+        COMMENT ON COLUMN sgsx.whatsapp_mensagens.conteudo_tsv IS 'Busca textual do conteudo (gerada)'
+    """),
+]
+
+INDICES = [
+    # Autocomplete: LIKE '%trecho%' sem acento e sem diferenciar maiusculas
+    Indice('idx_clientes_nome_trgm', 'clientes',
+           ' USING gin (sgsx.f_unaccent(lower(nome)) gin_trgm_ops)'),
+    Indice('idx_clientes_telefone_digitos', 'clientes',
+           '(salao_id, telefone_digitos) WHERE telefone_digitos IS NOT NULL'),
+    Indice('idx_clientes_whatsapp_digitos', 'clientes',
+           '(salao_id, whatsapp_digitos) WHERE whatsapp_digitos IS NOT NULL'),
+    Indice('idx_whatsapp_mensagens_conteudo_tsv', 'whatsapp_mensagens',
+           ' USING gin (conteudo_tsv)'),
+]
+
+BUSCA_CLIENTES_NOME = """
+    SELECT id, nome, telefone, whatsapp
+    FROM sgsx.clientes
+    WHERE salao_id = %(salao)s AND ativo IS TRUE
+    AND sgsx.f_unaccent(lower(nome)) LIKE '%%' || sgsx.f_unaccent(lower(%(termo)s)) || '%%'
+    ORDER BY similarity(sgsx.f_unaccent(lower(nome)), sgsx.f_unaccent(lower(%(termo)s))) DESC, nome
+    LIMIT %(limite)s
+"""
+
+BUSCA_CLIENTES_TELEFONE = """
+    SELECT id, nome, telefone, whatsapp
+    FROM sgsx.clientes
+    WHERE salao_id = %(salao)s
+    AND (telefone_digitos = ANY(%(variantes)s) OR whatsapp_digitos = ANY(%(variantes)s))
+    LIMIT %(limite)s
+"""
+
+BUSCA_MENSAGENS = f"""
+    SELECT id, remote_jid, conteudo, tipo, from_me, timestamp, status, cliente_id
+    FROM sgsx.whatsapp_mensagens
+    WHERE sessao_id = %(sessao)s
+    AND conteudo_tsv @@ websearch_to_tsquery('{CONFIGURACAO_TEXTO}', %(termo)s)
+    ORDER BY timestamp DESC
+    LIMIT %(limite)s OFFSET %(offset)s
+"""
+
+
+def variantes_telefone(texto):
+    """
+    Digitos do telefone com e sem o DDI 55, ja que o cadastro pode ter
+    '(11) 98765-4321' e o remote_jid '5511987654321@c.us'.
+    """
+    digitos = ''.join(c for c in texto.split('@')[0] if c.isdigit())
+    variantes = {digitos}
+    if digitos.startswith('55') and len(digitos) >= 12:
+        variantes.add(digitos[2:])
+    elif len(digitos) in (10, 11):
+        variantes.add('55' + digitos)
+    return sorted(variantes)
+
+
+def _escapar_like(termo):
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def buscar_clientes(cur, salao_id, termo, limite=20):
+    """Autocomplete de clientes: por telefone se o termo tiver 8+ digitos, senao por trecho do nome."""
+    termo = termo.strip()
+    base = termo.split('@')[0]
+    if sum(c.isdigit() for c in base) >= 8 and not any(c.isalpha() for c in base):
+        cur.execute(BUSCA_CLIENTES_TELEFONE,
+                    {'salao': salao_id, 'variantes': variantes_telefone(termo), 'limite': limite})
+    else:
+        cur.execute(BUSCA_CLIENTES_NOME, {'salao': salao_id, 'termo': _escapar_like(termo), 'limite': limite})
+    return cur.fetchall()
+
+
+def buscar_mensagens(cur, sessao_id, termo, limite=50, offset=0):
+    """Mensagens da sessao que casam com o termo (sintaxe de busca web: "frase", -excluir, OR)."""
+    cur.execute(BUSCA_MENSAGENS, {'sessao': sessao_id, 'termo': termo, 'limite': limite, 'offset': offset})
+    return cur.fetchall()
+
+
+DADOS_BENCHMARK = """
+    INSERT INTO sgsx.saloes (id, nome) VALUES (md5('bench-busca')::uuid, 'Benchmark busca');
+    INSERT INTO sgsx.sessoes_whatsapp (id, salao_id, nome)
+    VALUES (md5('bench-busca-sessao')::uuid, md5('bench-busca')::uuid, 'Benchmark');
+
+    INSERT INTO sgsx.clientes (salao_id, nome, telefone, whatsapp)
+    SELECT md5('bench-busca')::uuid,
+           (ARRAY['Ana', 'Bia', 'Joao', 'Jose', 'Maria', 'Conceicao', 'Luis', 'Iris'])[n %% 8 + 1]
+           || ' ' || (ARRAY['Araujo', 'Gonçalves', 'Simões', 'Souza', 'Conceição', 'Lima'])[n %% 6 + 1]
+           || ' ' || n,
+           '(11) 9' || lpad((n * 7919 %% 100000000)::text, 8, '0'),
+           '55119' || lpad((n * 7919 %% 100000000)::text, 8, '0')
+    FROM generate_series(1, %(clientes)s) n;
+
+    INSERT INTO sgsx.whatsapp_mensagens (salao_id, sessao_id, remote_jid, message_id, conteudo, timestamp)
+    SELECT md5('bench-busca')::uuid, md5('bench-busca-sessao')::uuid,
+           '5511' || n %% 5000 || '@c.us', 'bench-busca-' || n,
+           (ARRAY['Ola, gostaria de agendar um corte', 'Qual o preço da escova?',
+                  'Confirmado o horário de amanhã', 'Obrigada pelo atendimento!',
+                  'Vocês fazem coloração e hidratação?'])[n %% 5 + 1] || ' #' || n,
+           NOW() - (n %% 60) * interval '1 day'
+    FROM generate_series(1, %(mensagens)s) n;
+
+    ANALYZE sgsx.clientes, sgsx.whatsapp_mensagens;
+"""
+
+
+def benchmark(conn, clientes=100000, mensagens=200000, repeticoes=20):
+    """
+    Mede p50/p95 (ms) das buscas em um salao sintetico, com os indices e com
+    index scans desligados (SET LOCAL) como referencia. Tudo e desfeito ao final.
+    """
+    consultas = [
+        ("cliente por trecho do nome", lambda cur: buscar_clientes(cur, salao, 'conceicao 12')),
+        ("cliente por nome com acento", lambda cur: buscar_clientes(cur, salao, 'Simões 99')),
+        ("cliente por telefone", lambda cur: buscar_clientes(cur, salao, '(11) 9' + telefone)),
+        ("cliente por remote_jid", lambda cur: buscar_clientes(cur, salao, '55119' + telefone + '@c.us')),
+        ("mensagens por termo", lambda cur: buscar_mensagens(cur, sessao, 'preco escova')),
+    ]
+
+    conn.autocommit = False
+    cur = conn.cursor()
+    resultado = []
+    try:
+        print(f"Gerando {clientes} clientes e {mensagens} mensagens...")
+        cur.execute(DADOS_BENCHMARK, {'clientes': clientes, 'mensagens': mensagens})
+        cur.execute("SELECT md5('bench-busca')::uuid, md5('bench-busca-sessao')::uuid, "
+                    "lpad((4242 * 7919 %% 100000000)::text, 8, '0')")
+        salao, sessao, telefone = cur.fetchone()
+
+        for modo, ajustes in (("com indices", []),
+                              ("sem indices", ["SET LOCAL enable_indexscan = off",
+                                               "SET LOCAL enable_bitmapscan = off"])):
+            for sql in ajustes:
+                cur.execute(sql)
+            for descricao, consulta in consultas:
+                tempos = []
+                for _ in range(repeticoes):
+                    inicio = time.perf_counter()
+                    linhas = consulta(cur)
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+                tempos.sort()
+                p95 = tempos[max(0, int(len(tempos) * 0.95) - 1)]
+                resultado.append((descricao, modo, len(linhas), statistics.median(tempos), p95))
+    finally:
+        conn.rollback()
+        cur.close()
+
+    print(f"\n{'Consulta':<32}{'Modo':<14}{'Linhas':>7}{'p50 (ms)':>10}{'p95 (ms)':>10}")
+    for descricao, modo, linhas, p50, p95 in resultado:
+        print(f"{descricao:<32}{modo:<14}{linhas:>7}{p50:>10.2f}{p95:>10.2f}")
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da busca de clientes e mensagens")
+    parser.add_argument('--benchmark', type=int, default=100000, help="clientes sinteticos")
+    parser.add_argument('--mensagens', type=int, default=200000, help="mensagens sinteticas")
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    conn = conectar()
+    try:
+        benchmark(conn, args.benchmark, args.mensagens, args.repeticoes)
+    finally:
+        conn.close()
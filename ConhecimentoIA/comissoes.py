@@ -0,0 +1,279 @@
+"""
+Rollup diario de comissoes por (salao, filial, colaborador).
+
+A tabela sgsx.comissoes_diarias guarda, por dia de fechamento, a quantidade de
+itens, o valor vendido e a comissao de cada colaborador. Ela e mantida por
+triggers:
+- em sgsx.comandas, quando a comanda entra em 'paga' (soma os itens) ou sai
+  de 'paga', ex.: cancelada (subtrai os itens);
+- em sgsx.comanda_itens, quando um item e incluido/alterado/removido de uma
+  comanda que ja esta paga;
+- na remocao de uma comanda paga (migracao 0026), que subtrai os itens. O
+  arquivamento (ver arquivamento.py) nao subtrai: o historico continua no rollup.
+
+Assim os totais de /relatorios/comissoes viram uma leitura O(dias) do rollup,
+sem agregar comanda_itens. O dia de referencia e a data de fechamento (ou de
+abertura, se a comanda nao tiver fechamento), sempre a mesma expressao nos
+triggers e no backfill.
+
+Execute: python migrations/comissoes.py --backfill                     (todo o historico)
+         python migrations/comissoes.py --backfill --de 2024-01-01 --ate 2024-12-31
+         python migrations/comissoes.py --relatorio --salao <uuid> --de 2024-01-01 --ate 2024-01-31
+"""
+import argparse
+import time
+from datetime import date
+
+from conexao import conectar
+
+# filial_id pode ser nulo; a chave unica usa este valor no lugar de NULL
+FILIAL_NULA = '00000000-0000-0000-0000-000000000000'
+
+DDL = [
+    ("tabela comissoes_diarias", """
+        CREATE TABLE IF NOT EXISTS sgsx.comissoes_diarias (
+            salao_id UUID NOT NULL REFERENCES sgsx.saloes(id) ON DELETE CASCADE,
+            filial_id UUID,
+            colaborador_id UUID NOT NULL,
+            dia DATE NOT NULL,
+            quantidade_itens INTEGER NOT NULL DEFAULT 0,
+            valor_total DECIMAL(12,2) NOT NULL DEFAULT 0,
+            comissao_valor DECIMAL(12,2) NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """),
+    ("comentario comissoes_diarias",
+     "COMMENT ON TABLE sgsx.comissoes_diarias IS "
+     "'Rollup diario de comissoes das comandas pagas (mantido por trigger, ver comissoes.py)'"),
+    ("indice uq_comissoes_diarias", f"""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_comissoes_diarias ON sgsx.comissoes_diarias
+        (salao_id, dia, colaborador_id, (COALESCE(filial_id, '{FILIAL_NULA}'::uuid)))
+    """),
+    ("funcao somar_comissao", f"""
+        CREATE OR REPLACE FUNCTION sgsx.somar_comissao(
+            p_salao_id UUID, p_filial_id UUID, p_colaborador_id UUID, p_dia DATE,
+            p_itens INTEGER, p_valor NUMERIC, p_comissao NUMERIC
+        ) RETURNS VOID AS $$
+            INSERT INTO sgsx.comissoes_diarias AS cd
+                (salao_id, filial_id, colaborador_id, dia, quantidade_itens, valor_total, comissao_valor)
+            VALUES (p_salao_id, p_filial_id, p_colaborador_id, p_dia, p_itens, p_valor, p_comissao)
+            ON CONFLICT (salao_id, dia, colaborador_id, (COALESCE(filial_id, '{FILIAL_NULA}'::uuid)))
+            DO UPDATE SET
+                quantidade_itens = cd.quantidade_itens + EXCLUDED.quantidade_itens,
+                valor_total = cd.valor_total + EXCLUDED.valor_total,
+                comissao_valor = cd.comissao_valor + EXCLUDED.comissao_valor,
+                updated_at = NOW()
+        $$ LANGUAGE sql
+    """),
+    ("funcao comissoes_comanda", """
+        CREATE OR REPLACE FUNCTION sgsx.comissoes_comanda()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            -- Saiu de 'paga' (ex.: cancelada): subtrai os itens no dia antigo
+            IF OLD.status = 'paga' THEN
+                PERFORM sgsx.somar_comissao(OLD.salao_id, OLD.filial_id, i.colaborador_id,
+                    COALESCE(OLD.data_fechamento, OLD.data_abertura)::date, -i.itens, -i.valor, -i.comissao)
+                FROM (
+                    SELECT colaborador_id, COUNT(*)::int AS itens, SUM(valor_total) AS valor,
+                           SUM(COALESCE(comissao_valor, 0)) AS comissao
+                    FROM sgsx.comanda_itens
+                    WHERE comanda_id = OLD.id AND colaborador_id IS NOT NULL
+                    GROUP BY colaborador_id
+                ) i;
+            END IF;
+            -- Entrou em (ou continua) 'paga': soma os itens no dia novo
+            IF NEW.status = 'paga' THEN
+                PERFORM sgsx.somar_comissao(NEW.salao_id, NEW.filial_id, i.colaborador_id,
+                    COALESCE(NEW.data_fechamento, NEW.data_abertura)::date, i.itens, i.valor, i.comissao)
+                FROM (
+                    SELECT colaborador_id, COUNT(*)::int AS itens, SUM(valor_total) AS valor,
+                           SUM(COALESCE(comissao_valor, 0)) AS comissao
+                    FROM sgsx.comanda_itens
+                    WHERE comanda_id = NEW.id AND colaborador_id IS NOT NULL
+                    GROUP BY colaborador_id
+                ) i;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+    ("trigger comissoes comandas", """
+        CREATE TRIGGER trigger_comissoes_comanda
+        AFTER UPDATE OF status, data_fechamento, data_abertura, salao_id, filial_id ON sgsx.comandas
+        FOR EACH ROW
+        WHEN (OLD.status = 'paga' OR NEW.status = 'paga')
+        EXECUTE FUNCTION sgsx.comissoes_comanda()
+    """),
+    ("funcao comissoes_item", """
+        CREATE OR REPLACE FUNCTION sgsx.comissoes_item()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            c RECORD;
+        BEGIN
+            -- Itens alterados em comanda ja paga entram como delta no rollup
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.colaborador_id IS NOT NULL THEN
+                SELECT * INTO c FROM sgsx.comandas WHERE id = OLD.comanda_id;
+                IF FOUND AND c.status = 'paga' THEN
+                    PERFORM sgsx.somar_comissao(c.salao_id, c.filial_id, OLD.colaborador_id,
+                        COALESCE(c.data_fechamento, c.data_abertura)::date,
+                        -1, -OLD.valor_total, -COALESCE(OLD.comissao_valor, 0));
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.colaborador_id IS NOT NULL THEN
+                SELECT * INTO c FROM sgsx.comandas WHERE id = NEW.comanda_id;
+                IF FOUND AND c.status = 'paga' THEN
+                    PERFORM sgsx.somar_comissao(c.salao_id, c.filial_id, NEW.colaborador_id,
+                        COALESCE(c.data_fechamento, c.data_abertura)::date,
+                        1, NEW.valor_total, COALESCE(NEW.comissao_valor, 0));
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+    ("trigger comissoes comanda_itens", """
+        CREATE TRIGGER trigger_comissoes_item
+        AFTER INSERT OR UPDATE OF colaborador_id, valor_total, comissao_valor OR DELETE ON sgsx.comanda_itens
+        FOR EACH ROW EXECUTE FUNCTION sgsx.comissoes_item()
+    """),
+]
+
+# BEFORE: num AFTER DELETE a cascata da FK (trigger RI_..., que dispara antes pela
+# ordem dos nomes) ja removeu os itens, e os triggers dos itens nao acham mais a comanda
+DDL_REMOCAO = [
+    ("funcao comissoes_comanda_removida", """
+        CREATE OR REPLACE FUNCTION sgsx.comissoes_comanda_removida()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM sgsx.somar_comissao(OLD.salao_id, OLD.filial_id, i.colaborador_id,
+                COALESCE(OLD.data_fechamento, OLD.data_abertura)::date, -i.itens, -i.valor, -i.comissao)
+            FROM (
+                SELECT colaborador_id, COUNT(*)::int AS itens, SUM(valor_total) AS valor,
+                       SUM(COALESCE(comissao_valor, 0)) AS comissao
+                FROM sgsx.comanda_itens
+                WHERE comanda_id = OLD.id AND colaborador_id IS NOT NULL
+                GROUP BY colaborador_id
+            ) i;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+    ("trigger comissoes comanda removida", """
+        CREATE TRIGGER trigger_comissoes_comanda_removida
+        BEFORE DELETE ON sgsx.comandas
+        FOR EACH ROW
+        WHEN (OLD.status = 'paga' AND NOT sgsx.arquivando())
+        EXECUTE FUNCTION sgsx.comissoes_comanda_removida()
+    """),
+]
+
+# Recalcula o rollup de um intervalo a partir das comandas pagas, quentes e
+# arquivadas (views da migracao 0015, ver arquivamento.py)
+RECALCULAR = """
+    DELETE FROM sgsx.comissoes_diarias WHERE dia BETWEEN %(de)s AND %(ate)s;
+
+    INSERT INTO sgsx.comissoes_diarias
+        (salao_id, filial_id, colaborador_id, dia, quantidade_itens, valor_total, comissao_valor)
+    SELECT c.salao_id, c.filial_id, ci.colaborador_id, COALESCE(c.data_fechamento, c.data_abertura)::date,
+           COUNT(*), SUM(ci.valor_total), SUM(COALESCE(ci.comissao_valor, 0))
+    FROM sgsx.comandas_todas c
+    JOIN sgsx.comanda_itens_todos ci ON ci.comanda_id = c.id
+    WHERE c.status = 'paga'
+    AND ci.colaborador_id IS NOT NULL
+    AND COALESCE(c.data_fechamento, c.data_abertura) >= %(de)s
+    AND COALESCE(c.data_fechamento, c.data_abertura) < %(ate)s::date + 1
+    GROUP BY 1, 2, 3, 4;
+"""
+
+RELATORIO = """
+    SELECT cd.colaborador_id, col.nome,
+           SUM(cd.quantidade_itens) AS total_itens,
+           SUM(cd.valor_total) AS total_valor,
+           SUM(cd.comissao_valor) AS total_comissao
+    FROM sgsx.comissoes_diarias cd
+    LEFT JOIN sgsx.colaboradores col ON col.id = cd.colaborador_id
+    WHERE cd.salao_id = %(salao)s
+    AND cd.dia BETWEEN %(de)s AND %(ate)s
+    AND (%(colaborador)s::uuid IS NULL OR cd.colaborador_id = %(colaborador)s::uuid)
+    AND (%(filial)s::uuid IS NULL OR cd.filial_id = %(filial)s::uuid)
+    GROUP BY cd.colaborador_id, col.nome
+    ORDER BY total_comissao DESC
+"""
+
+
+def totais_comissoes(cur, salao_id, de, ate, colaborador_id=None, filial_id=None):
+    """Totais por colaborador no periodo, lidos do rollup: [(colaborador_id, nome, itens, valor, comissao)]."""
+    cur.execute(RELATORIO, {
+        'salao': salao_id, 'de': de, 'ate': ate,
+        'colaborador': colaborador_id, 'filial': filial_id,
+    })
+    return cur.fetchall()
+
+
+def _meses(de, ate):
+    """Divide [de, ate] em intervalos mensais."""
+    inicio = de
+    while inicio <= ate:
+        proximo = date(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+        yield inicio, min(ate, date.fromordinal(proximo.toordinal() - 1))
+        inicio = proximo
+
+
+def backfill(conn, de=None, ate=None):
+    """
+    Recalcula o rollup a partir do historico, um mes por transacao.
+
+    Cada mes trava sgsx.comissoes_diarias em EXCLUSIVE (leituras continuam):
+    comandas pagas durante o recalculo esperam o fim da transacao e entram
+    como delta sobre o valor ja recalculado.
+    """
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT MIN(COALESCE(data_fechamento, data_abertura))::date,
+                   MAX(COALESCE(data_fechamento, data_abertura))::date
+            FROM sgsx.comandas_todas WHERE status = 'paga'
+        """)
+        minimo, maximo = cur.fetchone()
+    de = de or minimo
+    ate = ate or maximo
+    if de is None or ate is None:
+        print("  Nenhuma comanda paga para recalcular.")
+        return 0
+
+    total = 0
+    inicio = time.perf_counter()
+    conn.autocommit = False
+    with conn.cursor() as cur:
+        for mes_de, mes_ate in _meses(de, ate):
+            cur.execute("LOCK TABLE sgsx.comissoes_diarias IN EXCLUSIVE MODE")
+            cur.execute(RECALCULAR, {'de': mes_de, 'ate': mes_ate})
+            conn.commit()
+            total += cur.rowcount
+            print(f"  {mes_de:%Y-%m}: {cur.rowcount} linhas de rollup")
+    print(f"  Backfill concluido: {total} linhas em {time.perf_counter() - inicio:.1f}s")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rollup diario de comissoes do SGSx")
+    parser.add_argument('--backfill', action='store_true', help="recalcula o rollup a partir das comandas pagas")
+    parser.add_argument('--relatorio', action='store_true', help="imprime os totais do periodo a partir do rollup")
+    parser.add_argument('--salao', help="id do salao (para --relatorio)")
+    parser.add_argument('--colaborador', help="id do colaborador (opcional, para --relatorio)")
+    parser.add_argument('--de', type=date.fromisoformat)
+    parser.add_argument('--ate', type=date.fromisoformat)
+    args = parser.parse_args()
+
+    conn = conectar()
+    try:
+        if args.backfill:
+            backfill(conn, args.de, args.ate)
+        if args.relatorio:
+            with conn.cursor() as cur:
+                linhas = totais_comissoes(cur, args.salao, args.de, args.ate, args.colaborador)
+            print(f"\n{'Colaborador':<40}{'Itens':>8}{'Valor':>14}{'Comissao':>14}")
+            for _, nome, itens, valor, comissao in linhas:
+                print(f"{(nome or '-'):<40}{itens:>8}{valor:>14.2f}{comissao:>14.2f}")
+    finally:
+        conn.close()
@@ -0,0 +1,186 @@
+"""
+Conexao com o banco SGSx para os scripts de seed, migracao e manutencao.
+
+Toda conexao sai daqui com connect_timeout, TCP keepalives (uma conexao
+parada num lote longo nao morre em silencio num NAT/firewall) e
+application_name com o nome do script, e a abertura e repetida em falhas
+transitorias de rede. statement_timeout e lock_timeout sao opcionais
+(DATABASE_STATEMENT_TIMEOUT / DATABASE_LOCK_TIMEOUT ou argumentos).
+
+Para varias conexoes (ex.: builds de indices em paralelo) use Pool: o numero
+de conexoes abertas nunca passa de `maximo`, quem pede a mais espera, e
+Pool.executar() repete a unidade de trabalho em erros transitorios (queda de
+conexao, deadlock, serialization failure, servidor reiniciando).
+
+Atras do pgbouncer (DATABASE_PGBOUNCER=1) os timeouts nao vao como parametro
+de inicializacao, que o pgbouncer recusa; configure-os no pgbouncer ou no
+usuario do banco. Migracoes usam advisory lock de sessao: aponte-as direto
+para o PostgreSQL ou para um pool em modo session.
+"""
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TENTATIVAS = int(os.getenv('DATABASE_TENTATIVAS', '3'))
+ESPERA_INICIAL = 0.5
+
+# SQLSTATEs em que repetir a transacao resolve: serialization failure,
+# deadlock, servidor encerrando/reiniciando e excesso de conexoes; a classe
+# 08 (connection exception) tambem entra, ver erro_transitorio()
+SQLSTATES_TRANSITORIOS = {'40001', '40P01', '57P01', '57P02', '57P03', '53300'}
+
+
+class CursorContador(psycopg2.extensions.cursor):
+    """Cursor que conta as idas ao servidor (cada execute e um round trip)."""
+    round_trips = 0
+
+    def execute(self, query, vars=None):
+        CursorContador.round_trips += 1
+        return super().execute(query, vars)
+
+
+def erro_transitorio(erro):
+    """True se o erro vem de uma falha passageira (rede, deadlock, restart) e vale repetir."""
+    if not isinstance(erro, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+        return False
+    codigo = getattr(erro, 'pgcode', None)
+    # Sem SQLSTATE: a conexao caiu ou nem chegou a abrir
+    return codigo is None or codigo in SQLSTATES_TRANSITORIOS or codigo.startswith('08')
+
+
+def parametros_conexao(aplicacao=None, statement_timeout=None, lock_timeout=None, banco=None):
+    """Parametros do psycopg2.connect a partir das variaveis de ambiente."""
+    parametros = {
+        'host': os.getenv('DATABASE_HOST', '177.136.244.5'),
+        'port': os.getenv('DATABASE_PORT', '5432'),
+        'user': os.getenv('DATABASE_USER', 'codex'),
+        'password': os.getenv('DATABASE_PASSWORD', ''),
+        'database': banco or os.getenv('DATABASE_NAME', 'sgsx'),
+        'connect_timeout': int(os.getenv('DATABASE_CONNECT_TIMEOUT', '10')),
+        'keepalives': 1,
+        'keepalives_idle': int(os.getenv('DATABASE_KEEPALIVE_IDLE', '30')),
+        'keepalives_interval': 10,
+        'keepalives_count': 5,
+        'application_name': aplicacao or f"sgsx:{os.path.basename(sys.argv[0] or 'python')}"[:63],
+        'cursor_factory': CursorContador,
+    }
+    statement_timeout = statement_timeout or os.getenv('DATABASE_STATEMENT_TIMEOUT')
+    lock_timeout = lock_timeout or os.getenv('DATABASE_LOCK_TIMEOUT')
+    opcoes = []
+    if statement_timeout:
+        opcoes.append(f"-c statement_timeout={statement_timeout}")
+    if lock_timeout:
+        opcoes.append(f"-c lock_timeout={lock_timeout}")
+    if opcoes and not os.getenv('DATABASE_PGBOUNCER'):
+        parametros['options'] = ' '.join(opcoes)
+    return parametros
+
+
+def conectar(autocommit=False, verbose=True, statement_timeout=None, lock_timeout=None,
+             aplicacao=None, tentativas=TENTATIVAS, banco=None):
+    """
+    Abre uma conexao com o banco usando as variaveis de ambiente, repetindo
+    a tentativa (espera exponencial) em falhas transitorias. `banco` troca o
+    DATABASE_NAME (ex.: bancos de teste criados por banco_modelo.py).
+    """
+    parametros = parametros_conexao(aplicacao, statement_timeout, lock_timeout, banco)
+
+    if verbose:
+        print(f"\nConectando a {parametros['host']}:{parametros['port']}/{parametros['database']}...")
+
+    espera = ESPERA_INICIAL
+    for tentativa in range(1, tentativas + 1):
+        try:
+            conn = psycopg2.connect(**parametros)
+            break
+        except psycopg2.OperationalError as e:
+            if tentativa == tentativas or not erro_transitorio(e):
+                raise
+            print(f"  Falha ao conectar ({' '.join(str(e).split())}); nova tentativa em {espera:.1f}s")
+            time.sleep(espera)
+            espera *= 2
+    conn.autocommit = autocommit
+
+    if verbose:
+        print("Conexao estabelecida!")
+    return conn
+
+
+class Pool:
+    """
+    Pool de conexoes limitado a `maximo` (quem pede alem do limite espera).
+    Conexoes quebradas sao descartadas na devolucao e reabertas sob demanda.
+    """
+
+    def __init__(self, maximo=None, autocommit=False, **opcoes):
+        self.maximo = maximo or int(os.getenv('DATABASE_POOL_MAXIMO', '4'))
+        self.autocommit = autocommit
+        self.opcoes = opcoes
+        self._livres = queue.LifoQueue()
+        self._vagas = threading.BoundedSemaphore(self.maximo)
+
+    @contextmanager
+    def conexao(self):
+        """Empresta uma conexao; transacoes abertas sao desfeitas na devolucao."""
+        self._vagas.acquire()
+        conn = None
+        try:
+            try:
+                conn = self._livres.get_nowait()
+            except queue.Empty:
+                conn = conectar(autocommit=self.autocommit, verbose=False, **self.opcoes)
+            yield conn
+        finally:
+            if conn is not None:
+                if not conn.closed and conn.status != psycopg2.extensions.STATUS_READY:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        conn.close()
+                if not conn.closed:
+                    self._livres.put(conn)
+            self._vagas.release()
+
+    def executar(self, funcao, tentativas=TENTATIVAS):
+        """
+        Executa funcao(conn) e faz commit; em erro transitorio desfaz, espera e
+        repete (em outra conexao, se a anterior caiu). funcao deve ser uma
+        unidade de trabalho que pode ser repetida.
+        """
+        espera = ESPERA_INICIAL
+        for tentativa in range(1, tentativas + 1):
+            with self.conexao() as conn:
+                try:
+                    resultado = funcao(conn)
+                    if not conn.autocommit:
+                        conn.commit()
+                    return resultado
+                except psycopg2.Error as e:
+                    if tentativa == tentativas or not erro_transitorio(e):
+                        raise
+                    print(f"  Erro transitorio ({e.pgcode or ' '.join(str(e).split())}); "
+                          f"tentativa {tentativa + 1}/{tentativas} em {espera:.1f}s")
+            time.sleep(espera)
+            espera *= 2
+
+    def fechar(self):
+        while True:
+            try:
+                self._livres.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
@@ -0,0 +1,405 @@
+"""
+Contadores do dashboard mantidos por trigger.
+
+getDashboard e getAdminEstatisticas contavam linhas de saloes, usuarios,
+clientes, colaboradores, servicos, produtos e comandas a cada carga de tela.
+Aqui esses numeros ficam em tabelas pequenas, atualizadas por triggers (por
+comando desde a migracao 0012, ver DDL_POR_COMANDO):
+
+- sgsx.contadores: linhas ativas (ativo = TRUE) por salao e no total do
+  sistema, e comandas em andamento por salao. O total do sistema e dividido em
+  FATIAS_GLOBAIS linhas para que inserts de saloes diferentes nao disputem o
+  mesmo registro; a leitura soma essas poucas linhas.
+- sgsx.comandas_totais_diarios: atendimentos (comandas pagas) e faturamento
+  por salao e dia de fechamento; o mes e a soma de no maximo 31 linhas.
+
+A reconciliacao recalcula tudo a partir das tabelas de origem (comandas
+quentes e arquivadas, ver arquivamento.py), mostra as divergencias e, com
+--corrigir, regrava os contadores.
+
+Execute: python migrations/contadores.py --reconciliar
+         python migrations/contadores.py --reconciliar --corrigir
+         python migrations/contadores.py --salao <uuid>     (estatisticas do dashboard)
+"""
+import argparse
+from datetime import date
+
+from conexao import conectar
+
+# Escopo usado para os totais do sistema (getAdminEstatisticas)
+ESCOPO_GLOBAL = '00000000-0000-0000-0000-000000000000'
+FATIAS_GLOBAIS = 16
+
+# Tabelas cujas linhas ativas sao contadas; a chave do contador e o nome da tabela
+TABELAS_CONTADAS = ['saloes', 'usuarios', 'clientes', 'colaboradores', 'servicos', 'produtos']
+
+STATUS_EM_ANDAMENTO = "('aberta', 'em_atendimento', 'aguardando_pagamento')"
+
+DDL = [
+    ("tabela contadores", """
+        CREATE TABLE IF NOT EXISTS sgsx.contadores (
+            escopo UUID NOT NULL,
+            chave VARCHAR(50) NOT NULL,
+            fatia SMALLINT NOT NULL DEFAULT 0,
+            valor BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (escopo, chave, fatia)
+        )
+    """),
+    ("comentario contadores",
+     "COMMENT ON TABLE sgsx.contadores IS "
+     "'Contadores do dashboard por salao (escopo) ou do sistema (escopo zero), mantidos por trigger'"),
+    ("tabela comandas_totais_diarios", """
+        CREATE TABLE IF NOT EXISTS sgsx.comandas_totais_diarios (
+            salao_id UUID NOT NULL REFERENCES sgsx.saloes(id) ON DELETE CASCADE,
+            dia DATE NOT NULL,
+            atendimentos INTEGER NOT NULL DEFAULT 0,
+            faturamento DECIMAL(14,2) NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (salao_id, dia)
+        )
+    """),
+    ("funcao somar_contador", f"""
+        CREATE OR REPLACE FUNCTION sgsx.somar_contador(p_escopo UUID, p_chave TEXT, p_delta BIGINT)
+        RETURNS VOID AS $$
+            INSERT INTO sgsx.contadores AS c (escopo, chave, fatia, valor)
+            VALUES (
+                p_escopo, p_chave,
+                CASE WHEN p_escopo = '{ESCOPO_GLOBAL}'::uuid THEN pg_backend_pid() % {FATIAS_GLOBAIS} ELSE 0 END,
+                p_delta
+            )
+            ON CONFLICT (escopo, chave, fatia)
+            DO UPDATE SET valor = c.valor + EXCLUDED.valor, updated_at = NOW()
+        $$ LANGUAGE sql
+    """),
+    ("funcao somar_total_diario", """
+        CREATE OR REPLACE FUNCTION sgsx.somar_total_diario(
+            p_salao_id UUID, p_dia DATE, p_atendimentos INTEGER, p_faturamento NUMERIC
+        ) RETURNS VOID AS $$
+            INSERT INTO sgsx.comandas_totais_diarios AS t (salao_id, dia, atendimentos, faturamento)
+            VALUES (p_salao_id, p_dia, p_atendimentos, p_faturamento)
+            ON CONFLICT (salao_id, dia)
+            DO UPDATE SET
+                atendimentos = t.atendimentos + EXCLUDED.atendimentos,
+                faturamento = t.faturamento + EXCLUDED.faturamento,
+                updated_at = NOW()
+        $$ LANGUAGE sql
+    """),
+    ("funcao contar_ativos", f"""
+        CREATE OR REPLACE FUNCTION sgsx.contar_ativos()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.ativo IS TRUE THEN
+                PERFORM sgsx.somar_contador('{ESCOPO_GLOBAL}', TG_TABLE_NAME, -1);
+                IF TG_TABLE_NAME <> 'saloes' THEN
+                    IF OLD.salao_id IS NOT NULL THEN
+                        PERFORM sgsx.somar_contador(OLD.salao_id, TG_TABLE_NAME, -1);
+                    END IF;
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.ativo IS TRUE THEN
+                PERFORM sgsx.somar_contador('{ESCOPO_GLOBAL}', TG_TABLE_NAME, 1);
+                IF TG_TABLE_NAME <> 'saloes' THEN
+                    IF NEW.salao_id IS NOT NULL THEN
+                        PERFORM sgsx.somar_contador(NEW.salao_id, TG_TABLE_NAME, 1);
+                    END IF;
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+    ("funcao contadores_comanda", f"""
+        CREATE OR REPLACE FUNCTION sgsx.contadores_comanda()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                IF OLD.status IN {STATUS_EM_ANDAMENTO} THEN
+                    PERFORM sgsx.somar_contador(OLD.salao_id, 'comandas_abertas', -1);
+                END IF;
+                IF OLD.status = 'paga' THEN
+                    PERFORM sgsx.somar_total_diario(OLD.salao_id,
+                        COALESCE(OLD.data_fechamento, OLD.data_abertura)::date, -1, -COALESCE(OLD.total, 0));
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                IF NEW.status IN {STATUS_EM_ANDAMENTO} THEN
+                    PERFORM sgsx.somar_contador(NEW.salao_id, 'comandas_abertas', 1);
+                END IF;
+                IF NEW.status = 'paga' THEN
+                    PERFORM sgsx.somar_total_diario(NEW.salao_id,
+                        COALESCE(NEW.data_fechamento, NEW.data_abertura)::date, 1, COALESCE(NEW.total, 0));
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+] + [
+    (f"trigger contadores {tabela}", f"""
+        CREATE TRIGGER trigger_contadores_{tabela}
+        AFTER INSERT OR DELETE OR UPDATE OF ativo{'' if tabela == 'saloes' else ', salao_id'} ON sgsx.{tabela}
+        FOR EACH ROW EXECUTE FUNCTION sgsx.contar_ativos()
+    """)
+    for tabela in TABELAS_CONTADAS
+] + [
+    ("trigger contadores comandas", """
+        CREATE TRIGGER trigger_contadores_comandas
+        AFTER INSERT OR DELETE OR UPDATE OF status, total, salao_id, data_fechamento, data_abertura
+        ON sgsx.comandas
+        FOR EACH ROW EXECUTE FUNCTION sgsx.contadores_comanda()
+    """),
+]
+
+# Migracao 0012: os triggers por linha atualizavam a mesma linha de contador uma
+# vez por registro, e dentro de uma transacao cada versao nova precisa percorrer
+# todas as anteriores (custo quadratico em cargas em lote). Os triggers passam a
+# ser por comando, com tabelas de transicao, e aplicam um delta por salao/dia.
+# Os deltas saem ordenados pela chave para que comandos concorrentes travem as
+# linhas de contador na mesma ordem.
+ORIGEM_TRANSICAO = """
+    origem TEXT := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT *, 1 AS sinal FROM novas'
+        WHEN 'DELETE' THEN 'SELECT *, -1 AS sinal FROM antigas'
+        ELSE 'SELECT *, -1 AS sinal FROM antigas UNION ALL SELECT *, 1 AS sinal FROM novas'
+    END;
+"""
+
+DDL_POR_COMANDO = [
+    ("funcao contar_ativos_comando", f"""
+        CREATE OR REPLACE FUNCTION sgsx.contar_ativos_comando()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            {ORIGEM_TRANSICAO}
+        BEGIN
+            EXECUTE format(
+                'SELECT sgsx.somar_contador(%L, %L, n) FROM ('
+                '  SELECT SUM(sinal) AS n FROM (%s) m WHERE ativo IS TRUE'
+                ') d WHERE n <> 0',
+                '{ESCOPO_GLOBAL}', TG_TABLE_NAME, origem);
+            IF TG_TABLE_NAME <> 'saloes' THEN
+                EXECUTE format(
+                    'SELECT sgsx.somar_contador(salao_id, %L, n) FROM ('
+                    '  SELECT salao_id, SUM(sinal) AS n FROM (%s) m'
+                    '  WHERE ativo IS TRUE AND salao_id IS NOT NULL'
+                    '  GROUP BY salao_id ORDER BY salao_id'
+                    ') d WHERE n <> 0',
+                    TG_TABLE_NAME, origem);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+    ("funcao contadores_comandas_comando", f"""
+        CREATE OR REPLACE FUNCTION sgsx.contadores_comandas_comando()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            {ORIGEM_TRANSICAO}
+        BEGIN
+            EXECUTE format(
+                'SELECT sgsx.somar_contador(salao_id, %L, n) FROM ('
+                '  SELECT salao_id, SUM(sinal) AS n FROM (%s) m'
+                '  WHERE status IN {STATUS_EM_ANDAMENTO.replace("'", "''")}'
+                '  GROUP BY salao_id ORDER BY salao_id'
+                ') d WHERE n <> 0',
+                'comandas_abertas', origem);
+            EXECUTE format(
+                'SELECT sgsx.somar_total_diario(salao_id, dia, atendimentos, faturamento) FROM ('
+                '  SELECT salao_id, COALESCE(data_fechamento, data_abertura)::date AS dia,'
+                '         SUM(sinal)::int AS atendimentos, SUM(sinal * COALESCE(total, 0)) AS faturamento'
+                '  FROM (%s) m WHERE status = %L'
+                '  GROUP BY 1, 2 ORDER BY 1, 2'
+                ') d WHERE atendimentos <> 0 OR faturamento <> 0',
+                origem, 'paga');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+] + [
+    (f"triggers por comando {tabela}", f"""
+        DROP TRIGGER trigger_contadores_{tabela} ON sgsx.{tabela};
+        CREATE TRIGGER trigger_contadores_{tabela}_insert
+            AFTER INSERT ON sgsx.{tabela} REFERENCING NEW TABLE AS novas
+            FOR EACH STATEMENT EXECUTE FUNCTION sgsx.{funcao}();
+        CREATE TRIGGER trigger_contadores_{tabela}_update
+            AFTER UPDATE ON sgsx.{tabela} REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+            FOR EACH STATEMENT EXECUTE FUNCTION sgsx.{funcao}();
+        CREATE TRIGGER trigger_contadores_{tabela}_delete
+            AFTER DELETE ON sgsx.{tabela} REFERENCING OLD TABLE AS antigas
+            FOR EACH STATEMENT EXECUTE FUNCTION sgsx.{funcao}()
+    """)
+    for tabela, funcao in [(t, 'contar_ativos_comando') for t in TABELAS_CONTADAS]
+    + [('comandas', 'contadores_comandas_comando')]
+] + [
+    ("remocao das funcoes por linha", """
+        DROP FUNCTION sgsx.contar_ativos();
+        DROP FUNCTION sgsx.contadores_comanda()
+    """),
+]
+
+# Valores reais, calculados a partir das tabelas de origem: (escopo, chave, valor)
+VALORES_REAIS = " UNION ALL ".join(
+    [f"""
+        SELECT '{ESCOPO_GLOBAL}'::uuid, '{tabela}', COUNT(*) FROM sgsx.{tabela} WHERE ativo IS TRUE
+    """ for tabela in TABELAS_CONTADAS]
+    + [f"""
+        SELECT salao_id, '{tabela}', COUNT(*) FROM sgsx.{tabela}
+        WHERE ativo IS TRUE AND salao_id IS NOT NULL GROUP BY salao_id
+    """ for tabela in TABELAS_CONTADAS if tabela != 'saloes']
+    + [f"""
+        SELECT salao_id, 'comandas_abertas', COUNT(*) FROM sgsx.comandas
+        WHERE status IN {STATUS_EM_ANDAMENTO} GROUP BY salao_id
+    """]
+)
+
+_TOTAIS_DIARIOS = """
+    SELECT salao_id, COALESCE(data_fechamento, data_abertura)::date AS dia,
+           COUNT(*) AS atendimentos, SUM(COALESCE(total, 0)) AS faturamento
+    FROM {comandas}
+    WHERE status = 'paga'
+    GROUP BY 1, 2
+"""
+
+TOTAIS_DIARIOS_REAIS = _TOTAIS_DIARIOS.format(comandas='sgsx.comandas')
+
+# Comandas pagas arquivadas (migracao 0015, ver arquivamento.py) continuam nos
+# totais diarios: a reconciliacao le tabela quente + arquivo
+TOTAIS_DIARIOS_COM_ARQUIVO = _TOTAIS_DIARIOS.format(comandas='sgsx.comandas_todas')
+
+
+def _recarregar(totais_diarios):
+    return [
+        ("carga contadores", f"""
+        DELETE FROM sgsx.contadores;
+        INSERT INTO sgsx.contadores (escopo, chave, fatia, valor)
+        SELECT escopo, chave, 0, valor FROM ({VALORES_REAIS}) AS v(escopo, chave, valor)
+    """),
+        ("carga comandas_totais_diarios", f"""
+        DELETE FROM sgsx.comandas_totais_diarios;
+        INSERT INTO sgsx.comandas_totais_diarios (salao_id, dia, atendimentos, faturamento)
+        {totais_diarios}
+    """),
+    ]
+
+
+# Carga inicial (migracao 0005) e regravacao completa do --corrigir
+RECARREGAR = _recarregar(TOTAIS_DIARIOS_REAIS)
+RECARREGAR_COM_ARQUIVO = _recarregar(TOTAIS_DIARIOS_COM_ARQUIVO)
+
+DIVERGENCIAS_CONTADORES = f"""
+    SELECT COALESCE(r.escopo, c.escopo), COALESCE(r.chave, c.chave),
+           COALESCE(c.valor, 0) AS contador, COALESCE(r.valor, 0) AS real
+    FROM ({VALORES_REAIS}) AS r(escopo, chave, valor)
+    FULL JOIN (
+        SELECT escopo, chave, SUM(valor) AS valor FROM sgsx.contadores GROUP BY escopo, chave
+    ) c ON c.escopo = r.escopo AND c.chave = r.chave
+    WHERE COALESCE(c.valor, 0) <> COALESCE(r.valor, 0)
+"""
+
+DIVERGENCIAS_DIARIAS = f"""
+    SELECT COALESCE(r.salao_id, t.salao_id), COALESCE(r.dia, t.dia),
+           COALESCE(t.atendimentos, 0), COALESCE(r.atendimentos, 0),
+           COALESCE(t.faturamento, 0), COALESCE(r.faturamento, 0)
+    FROM ({TOTAIS_DIARIOS_COM_ARQUIVO}) r
+    FULL JOIN sgsx.comandas_totais_diarios t ON t.salao_id = r.salao_id AND t.dia = r.dia
+    WHERE COALESCE(t.atendimentos, 0) <> COALESCE(r.atendimentos, 0)
+    OR COALESCE(t.faturamento, 0) <> COALESCE(r.faturamento, 0)
+"""
+
+
+def estatisticas_salao(cur, salao_id, hoje=None):
+    """Numeros do getDashboard em uma consulta de tempo constante."""
+    hoje = hoje or date.today()
+    cur.execute("""
+        SELECT
+            (SELECT COALESCE(SUM(valor), 0) FROM sgsx.contadores WHERE escopo = %(salao)s AND chave = 'clientes'),
+            (SELECT COALESCE(SUM(valor), 0) FROM sgsx.contadores WHERE escopo = %(salao)s AND chave = 'colaboradores'),
+            (SELECT COALESCE(SUM(valor), 0) FROM sgsx.contadores WHERE escopo = %(salao)s AND chave = 'servicos'),
+            (SELECT COALESCE(SUM(valor), 0) FROM sgsx.contadores WHERE escopo = %(salao)s AND chave = 'produtos'),
+            (SELECT COALESCE(SUM(valor), 0) FROM sgsx.contadores
+             WHERE escopo = %(salao)s AND chave = 'comandas_abertas'),
+            COALESCE(SUM(t.faturamento) FILTER (WHERE t.dia = %(hoje)s), 0),
+            COALESCE(SUM(t.faturamento), 0),
+            COALESCE(SUM(t.atendimentos) FILTER (WHERE t.dia = %(hoje)s), 0),
+            COALESCE(SUM(t.atendimentos), 0)
+        FROM sgsx.comandas_totais_diarios t
+        WHERE t.salao_id = %(salao)s AND t.dia BETWEEN date_trunc('month', %(hoje)s::date) AND %(hoje)s
+    """, {'salao': salao_id, 'hoje': hoje})
+    chaves = ['total_clientes', 'total_colaboradores', 'total_servicos', 'total_produtos',
+              'comandas_abertas', 'faturamento_hoje', 'faturamento_mes', 'atendimentos_hoje', 'atendimentos_mes']
+    return dict(zip(chaves, cur.fetchone()))
+
+
+def estatisticas_admin(cur):
+    """Numeros do getAdminEstatisticas (total_saloes, total_usuarios, total_clientes)."""
+    cur.execute("""
+        SELECT chave, SUM(valor) FROM sgsx.contadores
+        WHERE escopo = %s AND chave IN ('saloes', 'usuarios', 'clientes')
+        GROUP BY chave
+    """, (ESCOPO_GLOBAL,))
+    valores = dict(cur.fetchall())
+    return {f"total_{chave}": int(valores.get(chave, 0)) for chave in ('saloes', 'usuarios', 'clientes')}
+
+
+def reconciliar(conn, corrigir=False):
+    """
+    Compara contadores e totais diarios com os valores reais e devolve a
+    quantidade de divergencias. Com corrigir=True regrava tudo em uma transacao
+    com as tabelas de contadores travadas em EXCLUSIVE: escritas concorrentes
+    esperam e entram como delta sobre o valor recalculado.
+    """
+    conn.autocommit = False
+    cur = conn.cursor()
+    try:
+        if corrigir:
+            cur.execute("LOCK TABLE sgsx.contadores, sgsx.comandas_totais_diarios IN EXCLUSIVE MODE")
+
+        cur.execute(DIVERGENCIAS_CONTADORES)
+        divergencias = cur.fetchall()
+        for escopo, chave, contador, real in divergencias:
+            escopo = 'sistema' if str(escopo) == ESCOPO_GLOBAL else escopo
+            print(f"  contador {chave} ({escopo}): {contador} -> real {real}")
+
+        cur.execute(DIVERGENCIAS_DIARIAS)
+        diarias = cur.fetchall()
+        for salao_id, dia, atend, atend_real, fat, fat_real in diarias:
+            print(f"  {dia} ({salao_id}): atendimentos {atend} -> {atend_real}, faturamento {fat} -> {fat_real}")
+
+        total = len(divergencias) + len(diarias)
+        if total and corrigir:
+            for _, sql in RECARREGAR_COM_ARQUIVO:
+                cur.execute(sql)
+            print(f"  {total} divergencias corrigidas.")
+        elif total:
+            print(f"  {total} divergencias encontradas (use --corrigir para regravar).")
+        else:
+            print("  Contadores em dia, nenhuma divergencia.")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Contadores do dashboard do SGSx")
+    parser.add_argument('--reconciliar', action='store_true', help="compara contadores com os valores reais")
+    parser.add_argument('--corrigir', action='store_true', help="regrava os contadores divergentes")
+    parser.add_argument('--salao', help="imprime as estatisticas do dashboard deste salao")
+    args = parser.parse_args()
+
+    conn = conectar()
+    try:
+        if args.reconciliar:
+            reconciliar(conn, args.corrigir)
+        with conn.cursor() as cur:
+            if args.salao:
+                for chave, valor in estatisticas_salao(cur, args.salao).items():
+                    print(f"  {chave}: {valor}")
+            else:
+                for chave, valor in estatisticas_admin(cur).items():
+                    print(f"  {chave}: {valor}")
+    finally:
+        conn.close()
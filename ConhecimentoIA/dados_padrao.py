@@ -0,0 +1,174 @@
+"""
+Dados padrao do SGSx (perfis do sistema e catalogo inicial de cada salao).
+
+Os dados ficam declarados aqui como linhas e sao aplicados com um unico
+INSERT de varias linhas ... ON CONFLICT por tabela: criar (ou reprovisionar)
+um salao custa sempre o mesmo numero de round trips, e rodar o seed de novo
+converge as mudancas (ex.: permissoes de um perfil do sistema) sem duplicar.
+
+A migracao 0013 cria as chaves unicas que o ON CONFLICT precisa:
+- perfis (codigo) dos perfis do sistema (salao_id nulo) e (salao_id, codigo)
+  dos perfis de cada salao;
+- tipos_recebimento e servicos por (salao_id, nome).
+Se ja houver duplicatas a migracao para e lista os casos para correcao manual
+(as linhas podem estar referenciadas por comandas, nada e removido sozinho).
+
+No catalogo do salao so convergem as colunas em `atualizar`: precos, taxas e
+comissoes que o salao ja ajustou nao voltam ao padrao.
+"""
+import json
+from dataclasses import dataclass, field
+
+from psycopg2.extras import execute_values
+
+from schema import Indice
+
+
+@dataclass
+class DadosPadrao:
+    """Linhas padrao de uma tabela e a chave unica usada no ON CONFLICT."""
+    tabela: str
+    colunas: list
+    linhas: list
+    conflito: str
+    atualizar: list = field(default_factory=list)
+    por_salao: bool = True
+
+    def sql(self):
+        colunas = (['salao_id'] if self.por_salao else []) + self.colunas
+        sql = f"INSERT INTO sgsx.{self.tabela} AS t ({', '.join(colunas)}) VALUES %s ON CONFLICT {self.conflito} "
+        if not self.atualizar:
+            return sql + "DO NOTHING"
+        # Sem escrita (nem updated_at) quando a linha ja esta igual ao padrao
+        return sql + (
+            f"DO UPDATE SET {', '.join(f'{c} = EXCLUDED.{c}' for c in self.atualizar)}, updated_at = NOW() "
+            f"WHERE ({', '.join(f't.{c}' for c in self.atualizar)}) "
+            f"IS DISTINCT FROM ({', '.join(f'EXCLUDED.{c}' for c in self.atualizar)})"
+        )
+
+
+TIPOS_RECEBIMENTO_PADRAO = [
+    ('Dinheiro', 'Pagamento em dinheiro', 0, 0),
+    ('PIX', 'Pagamento instantaneo via PIX', 0, 0),
+    ('Cartao Debito', 'Pagamento com cartao de debito', 1.5, 1),
+    ('Cartao Credito', 'Pagamento com cartao de credito', 3.5, 30),
+    ('Notinha a Pagar', 'Fiado / Conta a receber do cliente', 0, 0),
+]
+
+SERVICOS_PADRAO = [
+    ('Corte Feminino', 80.00, 45, 30),
+    ('Corte Masculino', 50.00, 30, 30),
+    ('Escova', 60.00, 40, 25),
+    ('Hidratacao', 90.00, 60, 20),
+    ('Coloracao', 150.00, 90, 25),
+    ('Manicure', 40.00, 40, 30),
+    ('Pedicure', 50.00, 50, 30),
+    ('Sobrancelha', 30.00, 20, 30),
+]
+
+PERFIS_SISTEMA = [
+    ('super_admin', 'Super Administrador', 'Acesso total ao sistema', 100, {
+        'saloes': ['criar', 'editar', 'excluir', 'listar'],
+        'usuarios': ['criar', 'editar', 'excluir', 'listar'],
+        'configuracoes': ['editar'],
+    }),
+    ('admin', 'Administrador', 'Administrador do salao', 90, {
+        'filiais': ['criar', 'editar', 'excluir', 'listar'],
+        'usuarios': ['criar', 'editar', 'excluir', 'listar'],
+        'clientes': ['criar', 'editar', 'excluir', 'listar'],
+        'colaboradores': ['criar', 'editar', 'excluir', 'listar'],
+        'servicos': ['criar', 'editar', 'excluir', 'listar'],
+        'produtos': ['criar', 'editar', 'excluir', 'listar'],
+        'comandas': ['criar', 'editar', 'excluir', 'listar', 'fechar', 'cancelar'],
+    }),
+    ('gerente', 'Gerente', 'Gerente de filial', 70, {}),
+    ('atendente', 'Atendente', 'Atendente/Recepcionista', 50, {}),
+    ('caixa', 'Caixa', 'Operador de caixa', 30, {}),
+]
+
+PERFIS = DadosPadrao(
+    'perfis', ['codigo', 'nome', 'descricao', 'nivel_acesso', 'permissoes', 'sistema'],
+    [(codigo, nome, descricao, nivel, json.dumps(permissoes), True)
+     for codigo, nome, descricao, nivel, permissoes in PERFIS_SISTEMA],
+    conflito='(codigo) WHERE salao_id IS NULL',
+    atualizar=['nome', 'descricao', 'nivel_acesso', 'permissoes', 'sistema'],
+    por_salao=False,
+)
+
+TIPOS_RECEBIMENTO = DadosPadrao(
+    'tipos_recebimento', ['nome', 'descricao', 'taxa_percentual', 'dias_recebimento'],
+    TIPOS_RECEBIMENTO_PADRAO,
+    conflito='(salao_id, nome)',
+    atualizar=['descricao'],
+)
+
+SERVICOS = DadosPadrao(
+    'servicos', ['nome', 'preco', 'duracao_minutos', 'comissao_percentual'],
+    SERVICOS_PADRAO,
+    conflito='(salao_id, nome)',
+)
+
+# Catalogo aplicado a cada salao novo
+CATALOGO_SALAO = [TIPOS_RECEBIMENTO, SERVICOS]
+
+INDICES = [
+    Indice('uq_perfis_sistema_codigo', 'perfis', '(codigo) WHERE salao_id IS NULL', unico=True),
+    Indice('uq_perfis_salao_codigo', 'perfis', '(salao_id, codigo) WHERE salao_id IS NOT NULL', unico=True),
+    Indice('uq_tipos_recebimento_salao_nome', 'tipos_recebimento', '(salao_id, nome)', unico=True),
+    Indice('uq_servicos_salao_nome', 'servicos', '(salao_id, nome)', unico=True),
+]
+
+DDL = [
+    ("verificacao de duplicatas", """
+        DO $$
+        DECLARE
+            duplicatas TEXT;
+        BEGIN
+            SELECT string_agg(d, '; ') INTO duplicatas FROM (
+                SELECT 'perfis ' || codigo || ' (sistema)' AS d FROM sgsx.perfis
+                WHERE salao_id IS NULL GROUP BY codigo HAVING COUNT(*) > 1
+                UNION ALL
+                SELECT 'perfis ' || codigo || ' (salao ' || salao_id || ')' FROM sgsx.perfis
+                WHERE salao_id IS NOT NULL GROUP BY salao_id, codigo HAVING COUNT(*) > 1
+                UNION ALL
+                SELECT 'tipos_recebimento ' || nome || ' (salao ' || salao_id || ')' FROM sgsx.tipos_recebimento
+                GROUP BY salao_id, nome HAVING COUNT(*) > 1
+                UNION ALL
+                SELECT 'servicos ' || nome || ' (salao ' || salao_id || ')' FROM sgsx.servicos
+                GROUP BY salao_id, nome HAVING COUNT(*) > 1
+            ) d;
+            IF duplicatas IS NOT NULL THEN
+                RAISE EXCEPTION 'Registros duplicados impedem as chaves unicas dos dados padrao: %', duplicatas
+                    USING HINT = 'Renomeie ou mescle as duplicatas e rode as migracoes de novo.';
+            END IF;
+        END $$
+    """),
+] + [(f"indice {ix.nome}", ix.sql()) for ix in INDICES]
+
+
+def aplicar(cur, dados, saloes=None):
+    """
+    Aplica as linhas padrao de `dados` (a cada salao de `saloes`, se por_salao)
+    com um unico INSERT ... ON CONFLICT.
+    """
+    if dados.por_salao:
+        linhas = [(salao_id,) + tuple(linha) for salao_id in saloes for linha in dados.linhas]
+    else:
+        linhas = [tuple(linha) for linha in dados.linhas]
+    execute_values(cur, dados.sql(), linhas, page_size=max(len(linhas), 1))
+
+
+def aplicar_perfis_sistema(cur):
+    """Cria/atualiza os perfis do sistema e devolve o mapa codigo -> id."""
+    aplicar(cur, PERFIS)
+    cur.execute(
+        "SELECT codigo, id FROM sgsx.perfis WHERE salao_id IS NULL AND codigo = ANY(%s)",
+        ([linha[0] for linha in PERFIS.linhas],)
+    )
+    return {codigo: str(perfil_id) for codigo, perfil_id in cur.fetchall()}
+
+
+def aplicar_catalogo(cur, saloes):
+    """Tipos de recebimento e servicos padrao para os saloes (um comando por tabela)."""
+    for dados in CATALOGO_SALAO:
+        aplicar(cur, dados, saloes)
@@ -0,0 +1,308 @@
+"""
+Movimentos de estoque e saldo de produtos.estoque_atual mantido pelo banco.
+
+produtos.estoque_atual era uma coluna solta: nada a ligava aos itens de
+produto das comandas, entao o saldo ou era recalculado varrendo as vendas ou
+ficava errado. A migracao 0019 cria sgsx.estoque_movimentos, o livro de
+movimentos de cada produto (quantidade com sinal: entradas positivas, vendas
+negativas), e passa o saldo para o banco:
+
+- cada movimento inserido soma sua quantidade em produtos.estoque_atual
+  (trigger por comando, um UPDATE por produto);
+- itens de produto incluidos, alterados ou removidos de comandas e comandas
+  que entram ou saem de 'cancelada' geram os movimentos de venda/estorno.
+  O trigger compara, por item, o que o item deveria ter baixado (quantidade,
+  ou zero se removido/cancelado) com o que o livro ja baixou e grava so a
+  diferenca;
+- entradas, perdas e ajustes manuais sao movimentos inseridos pela API
+  (registrar_movimento()); movimentos nao sao alterados nem removidos.
+
+A migracao grava uma venda para cada item de produto das comandas nao
+canceladas e um saldo inicial por produto com o restante, de modo que
+estoque_atual nao muda. A migracao 0020 cria o indice parcial dos produtos
+com estoque baixo (estoque_atual <= estoque_minimo).
+
+Remocoes do arquivamento nao mexem no estoque: os movimentos ficam no livro.
+
+Execute: python migrations/estoque.py --reconciliar
+         python migrations/estoque.py --reconciliar --corrigir
+         python migrations/estoque.py --baixo <salao_uuid>
+"""
+import argparse
+
+from conexao import conectar
+from contadores import ORIGEM_TRANSICAO
+from schema import Indice
+
+TIPOS = "('inicial', 'entrada', 'saida', 'ajuste', 'venda', 'estorno')"
+
+INDICES = [
+    # Alerta de estoque baixo do salao vira um index scan so nos produtos abaixo do minimo
+    Indice('idx_produtos_estoque_baixo', 'produtos',
+           '(salao_id, nome) INCLUDE (estoque_atual, estoque_minimo) '
+           'WHERE ativo AND estoque_atual <= estoque_minimo'),
+]
+
+DDL = [
+    ("tipo tipo_movimento_estoque", f"""
+        DO $$ BEGIN
+            CREATE TYPE sgsx.tipo_movimento_estoque AS ENUM {TIPOS};
+        EXCEPTION WHEN duplicate_object THEN NULL;
+        END $$
+    """),
+    # Sem FK para comandas/itens: o arquivamento remove as comandas e o livro fica
+    ("tabela estoque_movimentos", """
+        CREATE TABLE IF NOT EXISTS sgsx.estoque_movimentos (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            salao_id UUID NOT NULL REFERENCES sgsx.saloes(id) ON DELETE CASCADE,
+            produto_id UUID NOT NULL REFERENCES sgsx.produtos(id) ON DELETE CASCADE,
+            tipo sgsx.tipo_movimento_estoque NOT NULL,
+            quantidade DECIMAL(10,3) NOT NULL,
+            comanda_id UUID,
+            comanda_item_id UUID,
+            usuario_id UUID REFERENCES sgsx.usuarios(id) ON DELETE SET NULL,
+            observacao TEXT,
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+    """),
+    ("comentario estoque_movimentos",
+     "COMMENT ON TABLE sgsx.estoque_movimentos IS "
+     "'Livro de movimentos de estoque; a soma por produto e produtos.estoque_atual (ver estoque.py)'"),
+    ("indices estoque_movimentos", """
+        CREATE INDEX IF NOT EXISTS idx_estoque_movimentos_produto ON sgsx.estoque_movimentos (produto_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_estoque_movimentos_item ON sgsx.estoque_movimentos (comanda_item_id)
+            WHERE comanda_item_id IS NOT NULL
+    """),
+    # Carga antes dos triggers: vendas dos itens atuais + saldo inicial com o restante
+    ("carga estoque_movimentos", """
+        INSERT INTO sgsx.estoque_movimentos
+            (salao_id, produto_id, tipo, quantidade, comanda_id, comanda_item_id, created_at)
+        SELECT p.salao_id, i.produto_id, 'venda', -COALESCE(i.quantidade, 1), i.comanda_id, i.id, i.created_at
+        FROM sgsx.comanda_itens i
+        JOIN sgsx.comandas c ON c.id = i.comanda_id
+        JOIN sgsx.produtos p ON p.id = i.produto_id
+        WHERE i.tipo = 'produto' AND c.status <> 'cancelada';
+
+        INSERT INTO sgsx.estoque_movimentos (salao_id, produto_id, tipo, quantidade, observacao, created_at)
+        SELECT p.salao_id, p.id, 'inicial', COALESCE(p.estoque_atual, 0) - COALESCE(v.quantidade, 0),
+               'Saldo anterior ao livro de movimentos', p.created_at
+        FROM sgsx.produtos p
+        LEFT JOIN (SELECT produto_id, SUM(quantidade) AS quantidade FROM sgsx.estoque_movimentos GROUP BY produto_id) v
+            ON v.produto_id = p.id
+        WHERE COALESCE(p.estoque_atual, 0) - COALESCE(v.quantidade, 0) <> 0
+    """),
+    ("funcao saldo_estoque", """
+        CREATE OR REPLACE FUNCTION sgsx.saldo_estoque()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            -- Trava os produtos sempre na mesma ordem (vendas concorrentes dos mesmos produtos)
+            PERFORM 1 FROM sgsx.produtos WHERE id IN (SELECT produto_id FROM novas) ORDER BY id FOR UPDATE;
+            UPDATE sgsx.produtos p SET estoque_atual = COALESCE(p.estoque_atual, 0) + m.quantidade
+            FROM (SELECT produto_id, SUM(quantidade) AS quantidade FROM novas GROUP BY produto_id) m
+            WHERE p.id = m.produto_id AND m.quantidade <> 0;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+    ("trigger saldo_estoque", """
+        CREATE TRIGGER trigger_saldo_estoque
+        AFTER INSERT ON sgsx.estoque_movimentos REFERENCING NEW TABLE AS novas
+        FOR EACH STATEMENT EXECUTE FUNCTION sgsx.saldo_estoque()
+    """),
+    # Baixa devida por item (quantidade, ou zero se o item sumiu ou a comanda foi
+    # cancelada) menos o que o livro ja registrou para o item = movimento a gravar
+    ("funcao movimentar_estoque_itens", """
+        CREATE OR REPLACE FUNCTION sgsx.movimentar_estoque_itens(p_itens UUID[])
+        RETURNS INTEGER AS $$
+            WITH diferencas AS (
+                SELECT comanda_item_id, produto_id, comanda_id, SUM(quantidade) AS quantidade
+                FROM (
+                    SELECT i.id AS comanda_item_id, i.produto_id, i.comanda_id, -COALESCE(i.quantidade, 1) AS quantidade
+                    FROM sgsx.comanda_itens i
+                    JOIN sgsx.comandas c ON c.id = i.comanda_id
+                    WHERE i.id = ANY(p_itens) AND i.tipo = 'produto' AND i.produto_id IS NOT NULL
+                    AND c.status <> 'cancelada'
+                    UNION ALL
+                    SELECT comanda_item_id, produto_id, comanda_id, -quantidade
+                    FROM sgsx.estoque_movimentos
+                    WHERE comanda_item_id = ANY(p_itens)
+                ) m
+                GROUP BY comanda_item_id, produto_id, comanda_id
+                HAVING SUM(quantidade) <> 0
+            ), gravados AS (
+                INSERT INTO sgsx.estoque_movimentos
+                    (salao_id, produto_id, tipo, quantidade, comanda_id, comanda_item_id)
+                SELECT p.salao_id, d.produto_id,
+                       (CASE WHEN d.quantidade < 0 THEN 'venda' ELSE 'estorno' END)::sgsx.tipo_movimento_estoque,
+                       d.quantidade, d.comanda_id, d.comanda_item_id
+                FROM diferencas d JOIN sgsx.produtos p ON p.id = d.produto_id
+                RETURNING 1
+            )
+            SELECT COUNT(*)::int FROM gravados
+        $$ LANGUAGE sql
+    """),
+    ("funcao estoque_comanda_itens", f"""
+        CREATE OR REPLACE FUNCTION sgsx.estoque_comanda_itens()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            {ORIGEM_TRANSICAO}
+            itens UUID[];
+        BEGIN
+            EXECUTE format('SELECT array_agg(DISTINCT id) FROM (%s) m WHERE tipo = ''produto''', origem) INTO itens;
+            IF itens IS NOT NULL THEN
+                PERFORM sgsx.movimentar_estoque_itens(itens);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+    ("triggers estoque_comanda_itens", """
+        CREATE TRIGGER trigger_estoque_comanda_itens_insert
+            AFTER INSERT ON sgsx.comanda_itens REFERENCING NEW TABLE AS novas
+            FOR EACH STATEMENT EXECUTE FUNCTION sgsx.estoque_comanda_itens();
+        CREATE TRIGGER trigger_estoque_comanda_itens_update
+            AFTER UPDATE ON sgsx.comanda_itens REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+            FOR EACH STATEMENT EXECUTE FUNCTION sgsx.estoque_comanda_itens();
+        CREATE TRIGGER trigger_estoque_comanda_itens_delete
+            AFTER DELETE ON sgsx.comanda_itens REFERENCING OLD TABLE AS antigas
+            FOR EACH STATEMENT WHEN (NOT sgsx.arquivando()) EXECUTE FUNCTION sgsx.estoque_comanda_itens()
+    """),
+    ("funcao estoque_comanda_cancelada", """
+        CREATE OR REPLACE FUNCTION sgsx.estoque_comanda_cancelada()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            itens UUID[];
+        BEGIN
+            SELECT array_agg(i.id) INTO itens
+            FROM novas n
+            JOIN antigas a ON a.id = n.id
+            JOIN sgsx.comanda_itens i ON i.comanda_id = n.id AND i.tipo = 'produto'
+            WHERE (n.status = 'cancelada') IS DISTINCT FROM (a.status = 'cancelada');
+            IF itens IS NOT NULL THEN
+                PERFORM sgsx.movimentar_estoque_itens(itens);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+    ("trigger estoque_comanda_cancelada", """
+        CREATE TRIGGER trigger_estoque_comanda_cancelada
+        AFTER UPDATE ON sgsx.comandas REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+        FOR EACH STATEMENT EXECUTE FUNCTION sgsx.estoque_comanda_cancelada()
+    """),
+]
+
+SALDOS_DIVERGENTES = """
+    SELECT p.id, p.nome, p.estoque_atual, COALESCE(m.quantidade, 0)
+    FROM sgsx.produtos p
+    LEFT JOIN (SELECT produto_id, SUM(quantidade) AS quantidade FROM sgsx.estoque_movimentos GROUP BY produto_id) m
+        ON m.produto_id = p.id
+    WHERE p.estoque_atual IS DISTINCT FROM COALESCE(m.quantidade, 0)
+    ORDER BY p.salao_id, p.nome
+"""
+
+# Itens atuais de produto + itens do livro que nao existem mais (nem no arquivo)
+ITENS_DO_LIVRO = """
+    SELECT sgsx.movimentar_estoque_itens(array_agg(id)) FROM (
+        SELECT id FROM sgsx.comanda_itens WHERE tipo = 'produto'
+        UNION
+        SELECT m.comanda_item_id FROM sgsx.estoque_movimentos m
+        WHERE m.comanda_item_id IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM sgsx.comanda_itens_todos i WHERE i.id = m.comanda_item_id)
+    ) itens
+"""
+
+RECALCULAR_SALDOS = """
+    WITH saldos AS (
+        SELECT p.id, COALESCE(SUM(m.quantidade), 0) AS quantidade
+        FROM sgsx.produtos p LEFT JOIN sgsx.estoque_movimentos m ON m.produto_id = p.id
+        GROUP BY p.id
+    )
+    UPDATE sgsx.produtos p SET estoque_atual = s.quantidade
+    FROM saldos s
+    WHERE p.id = s.id AND p.estoque_atual IS DISTINCT FROM s.quantidade
+"""
+
+
+def registrar_movimento(cur, produto_id, quantidade, tipo='entrada', observacao=None, usuario_id=None):
+    """
+    Grava um movimento manual (entrada, saida, ajuste) e devolve o novo saldo.
+    quantidade tem sinal: saidas e perdas sao negativas. Nao faz commit.
+    """
+    cur.execute("""
+        INSERT INTO sgsx.estoque_movimentos (salao_id, produto_id, tipo, quantidade, usuario_id, observacao)
+        SELECT salao_id, id, %s, %s, %s, %s FROM sgsx.produtos WHERE id = %s
+    """, (tipo, quantidade, usuario_id, observacao, produto_id))
+    if cur.rowcount == 0:
+        raise ValueError(f"Produto {produto_id} nao encontrado")
+    cur.execute("SELECT estoque_atual FROM sgsx.produtos WHERE id = %s", (produto_id,))
+    return cur.fetchone()[0]
+
+
+def estoque_baixo(cur, salao_id):
+    """Produtos ativos do salao com estoque_atual <= estoque_minimo (idx_produtos_estoque_baixo)."""
+    cur.execute("""
+        SELECT id, nome, estoque_atual, estoque_minimo FROM sgsx.produtos
+        WHERE salao_id = %s AND ativo AND estoque_atual <= estoque_minimo
+        ORDER BY nome
+    """, (salao_id,))
+    return cur.fetchall()
+
+
+def reconciliar(conn, corrigir=False, limite=20):
+    """
+    Lista os produtos cujo estoque_atual nao bate com a soma dos movimentos e
+    devolve a quantidade. Com corrigir=True grava os movimentos que faltam
+    para os itens de comanda e recalcula todos os saldos em um UPDATE.
+    """
+    conn.autocommit = False
+    cur = conn.cursor()
+    try:
+        if corrigir:
+            cur.execute(ITENS_DO_LIVRO)
+            print(f"  {cur.fetchone()[0] or 0} movimentos de itens de comanda gravados.")
+
+        cur.execute(SALDOS_DIVERGENTES)
+        divergencias = cur.fetchall()
+        for produto_id, nome, saldo, movimentos in divergencias[:limite]:
+            print(f"  {nome} ({produto_id}): estoque_atual {saldo} -> {movimentos}")
+        if len(divergencias) > limite:
+            print(f"  ... e mais {len(divergencias) - limite}")
+
+        if divergencias and corrigir:
+            cur.execute(RECALCULAR_SALDOS)
+            print(f"  {cur.rowcount} saldos recalculados.")
+        elif divergencias:
+            print(f"  {len(divergencias)} produtos divergentes (use --corrigir para recalcular).")
+        else:
+            print("  Saldos de estoque em dia, nenhuma divergencia.")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return len(divergencias)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Movimentos e saldos de estoque")
+    parser.add_argument('--reconciliar', action='store_true', help="compara estoque_atual com o livro de movimentos")
+    parser.add_argument('--corrigir', action='store_true', help="grava movimentos faltantes e recalcula os saldos")
+    parser.add_argument('--baixo', metavar='SALAO', help="lista os produtos do salao com estoque baixo")
+    args = parser.parse_args()
+
+    if not args.reconciliar and not args.baixo:
+        parser.error("informe --reconciliar ou --baixo")
+    conn = conectar()
+    try:
+        if args.baixo:
+            with conn.cursor() as cur:
+                produtos = estoque_baixo(cur, args.baixo)
+            for produto_id, nome, saldo, minimo in produtos:
+                print(f"  {nome}: {saldo} (minimo {minimo})")
+            print(f"  {len(produtos)} produtos com estoque baixo.")
+        if args.reconciliar:
+            reconciliar(conn, args.corrigir)
+    finally:
+        conn.close()
@@ -0,0 +1,310 @@
+"""
+Gerador de dados sinteticos multi-salao para medir consultas e indices.
+
+Fabrica N saloes com filiais, catalogo (servicos, produtos, tipos de
+recebimento), colaboradores, clientes, comandas em todos os status de
+sgsx.status_comanda com itens e pagamentos, sessao e mensagens do WhatsApp.
+Tudo e gravado com COPY, um salao por transacao, passando pelos triggers de
+contadores, comissoes, totais e estoque como em producao.
+
+O resultado depende so da semente: ids, nomes, valores e distribuicoes se
+repetem; as datas sao relativas a `referencia` (padrao: hoje), para que o
+dashboard e os relatorios do mes tenham dados. Fixe `referencia` (e `primeiro`,
+o numero do primeiro "Salao Sintetico", que por padrao continua a numeracao do
+banco) para reproduzir um banco identico em outro dia. Para somar saloes a um
+banco ja gerado use outra semente (a mesma repetiria os ids). Comandas, itens,
+pagamentos, mensagens e movimentos de estoque tem ids v7 com a data do
+registro, como o padrao dessas tabelas (ver identificadores.py).
+
+Distribuicoes:
+- tamanho do salao log-normal (poucos saloes grandes, muitos pequenos),
+  multiplicando as medias de clientes, comandas e mensagens;
+- 1 a 4 filiais (60/25/10/5%), 3 a 15 colaboradores, 10 a 40 produtos;
+- comandas: 80% pagas, 5% canceladas, e as em andamento (aberta,
+  em_atendimento, aguardando_pagamento) sempre do dia de referencia; domingos
+  com pouco movimento;
+- 1 a 4 itens por comanda (80% servicos), 1 ou 2 pagamentos por comanda paga.
+
+Execute: python migrations/seed.py --gerar 50 --semente 42
+         python migrations/seed.py --gerar 50 --semente 42 --referencia 2026-01-31 --primeiro 1
+"""
+import io
+import random
+import time
+import uuid
+from datetime import date, datetime, time as hora, timedelta, timezone
+
+from identificadores import uuid7
+from whatsapp_ingestao import campo_copy
+
+SEMENTE = 42
+
+STATUS_PESOS = [('paga', 80), ('cancelada', 5), ('aberta', 7), ('em_atendimento', 5), ('aguardando_pagamento', 3)]
+STATUS_EM_ANDAMENTO = ('aberta', 'em_atendimento', 'aguardando_pagamento')
+FILIAIS_PESOS = [(1, 60), (2, 25), (3, 10), (4, 5)]
+ITENS_PESOS = [(1, 45), (2, 30), (3, 15), (4, 10)]
+# Peso de cada tipo de recebimento pelo nome (os demais recebem 5)
+RECEBIMENTO_PESOS = {'PIX': 35, 'Cartao Credito': 30, 'Cartao Debito': 20, 'Dinheiro': 10}
+
+NOMES = ['Ana', 'Maria', 'Juliana', 'Fernanda', 'Patricia', 'Camila', 'Beatriz', 'Larissa', 'Carla', 'Renata',
+         'Joao', 'Pedro', 'Lucas', 'Rafael', 'Bruno', 'Carlos', 'Marcos', 'Paulo', 'Gabriel', 'Thiago']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Ferreira', 'Costa', 'Rodrigues',
+              'Almeida', 'Nascimento', 'Carvalho', 'Gomes', 'Martins', 'Araujo', 'Ribeiro', 'Barbosa', 'Rocha']
+CARGOS = ['Cabeleireiro(a)', 'Manicure', 'Esteticista', 'Barbeiro', 'Maquiador(a)']
+PRODUTOS = ['Shampoo', 'Condicionador', 'Mascara', 'Oleo', 'Leave-in', 'Esmalte', 'Pomada', 'Tonico']
+MENSAGENS_CLIENTE = ['Oi, tem horario amanha?', 'Quanto custa a escova?', 'Pode ser as 15h?', 'Obrigada!',
+                     'Vou me atrasar 10 minutos', 'Preciso remarcar meu horario', 'Voces abrem no sabado?']
+MENSAGENS_SALAO = ['Ola! Temos sim, qual horario prefere?', 'Seu horario esta confirmado.',
+                   'Lembrete: seu atendimento e amanha.', 'Obrigado pela visita!', 'Podemos remarcar para quinta?']
+
+COLUNAS = {
+    'saloes': ['id', 'nome', 'email', 'telefone', 'created_at'],
+    'filiais': ['id', 'salao_id', 'nome', 'telefone'],
+    'tipos_recebimento': ['id', 'salao_id', 'nome', 'descricao', 'taxa_percentual', 'dias_recebimento'],
+    'servicos': ['id', 'salao_id', 'nome', 'preco', 'duracao_minutos', 'comissao_percentual'],
+    # estoque_atual vem dos movimentos (saldo inicial + vendas dos itens), ver estoque.py
+    'produtos': ['id', 'salao_id', 'nome', 'categoria', 'preco_custo', 'preco_venda', 'estoque_minimo'],
+    'estoque_movimentos': ['id', 'salao_id', 'produto_id', 'tipo', 'quantidade', 'created_at'],
+    'colaboradores': ['id', 'salao_id', 'filial_id', 'nome', 'cargo', 'comissao_padrao', 'ativo'],
+    'clientes': ['id', 'salao_id', 'filial_id', 'nome', 'telefone', 'whatsapp', 'data_nascimento', 'ativo',
+                 'created_at'],
+    # subtotal e total vem dos itens, pelos triggers do banco (ver totais_comanda.py)
+    'comandas': ['id', 'salao_id', 'filial_id', 'cliente_id', 'nome_cliente', 'status', 'desconto',
+                 'data_abertura', 'data_fechamento', 'created_at', 'numero'],
+    'comanda_itens': ['id', 'comanda_id', 'salao_id', 'tipo', 'servico_id', 'produto_id', 'colaborador_id',
+                      'descricao', 'quantidade', 'valor_unitario', 'valor_total', 'comissao_percentual',
+                      'comissao_valor'],
+    'comanda_pagamentos': ['id', 'comanda_id', 'salao_id', 'tipo_recebimento_id', 'valor'],
+    'sessoes_whatsapp': ['id', 'salao_id', 'nome', 'numero', 'status'],
+    'whatsapp_mensagens': ['id', 'salao_id', 'sessao_id', 'remote_jid', 'message_id', 'tipo', 'conteudo',
+                           'from_me', 'timestamp', 'status', 'cliente_id', 'comanda_id'],
+    # Chaves de deduplicacao da ingestao (ver whatsapp_ingestao.py)
+    'whatsapp_message_ids': ['salao_id', 'message_id', 'timestamp'],
+}
+
+
+def _sortear(rng, pesos):
+    return rng.choices([v for v, _ in pesos], weights=[p for _, p in pesos])[0]
+
+
+def _uuid(rng, momento=None):
+    """UUID v4 do rng; com `momento`, v7 (como o padrao das tabelas de muita escrita)."""
+    if momento:
+        return str(uuid7(momento, rng))
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _nome(rng):
+    return f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}"
+
+
+def _celular(rng):
+    ddd = rng.choice([11, 11, 11, 21, 31, 41, 51, 61, 71, 81])
+    numero = rng.randint(10000000, 99999999)
+    return f"({ddd}) 9{numero // 10000:04d}-{numero % 10000:04d}", f"55{ddd}9{numero}"
+
+
+def _dinheiro(valor):
+    return round(valor, 2)
+
+
+def gerar_salao(rng, n, referencia, servicos, tipos_recebimento, clientes=500, comandas=2000, mensagens=2000,
+                dias=365):
+    """
+    Linhas de um salao por tabela ({tabela: [tupla na ordem de COLUNAS]}).
+
+    `servicos` e `tipos_recebimento` sao os catalogos padrao (dados_padrao.py);
+    clientes, comandas e mensagens sao medias, escaladas pelo tamanho sorteado.
+    """
+    tamanho = min(rng.lognormvariate(0, 0.75), 8)
+    t = {tabela: [] for tabela in COLUNAS}
+
+    salao_id = _uuid(rng)
+    criado = datetime.combine(referencia - timedelta(days=dias + rng.randint(0, 365)), hora(9))
+    telefone, _ = _celular(rng)
+    t['saloes'].append((salao_id, f"Salao Sintetico {n:05d}", f"contato{n}@salao{n}.com.br", telefone, criado))
+
+    filiais = [_uuid(rng) for _ in range(_sortear(rng, FILIAIS_PESOS))]
+    for i, filial_id in enumerate(filiais):
+        t['filiais'].append((filial_id, salao_id, 'Matriz' if i == 0 else f"Filial {i + 1}", _celular(rng)[0]))
+
+    tipos = []
+    for nome, descricao, taxa, prazo in tipos_recebimento:
+        tipos.append((_uuid(rng), RECEBIMENTO_PESOS.get(nome, 5)))
+        t['tipos_recebimento'].append((tipos[-1][0], salao_id, nome, descricao, taxa, prazo))
+
+    catalogo = []
+    for nome, preco, duracao, comissao in servicos:
+        # Cada salao pratica precos proprios em torno do padrao
+        preco = _dinheiro(preco * rng.uniform(0.7, 1.5))
+        catalogo.append((_uuid(rng), nome, preco, comissao))
+        t['servicos'].append((catalogo[-1][0], salao_id, nome, preco, duracao, comissao))
+
+    produtos = []
+    estoque = {}
+    for i in range(rng.randint(10, 40)):
+        nome = f"{rng.choice(PRODUTOS)} {rng.choice(SOBRENOMES)} {i + 1}"
+        custo = _dinheiro(rng.uniform(8, 120))
+        venda = _dinheiro(custo * rng.uniform(1.4, 2.2))
+        produtos.append((_uuid(rng), nome, venda))
+        estoque[produtos[-1][0]] = rng.randint(0, 50)
+        t['produtos'].append((produtos[-1][0], salao_id, nome, 'Revenda', custo, venda, rng.randint(2, 10)))
+
+    colaboradores = []
+    for _ in range(rng.randint(3, 15)):
+        colaboradores.append(_uuid(rng))
+        t['colaboradores'].append((colaboradores[-1], salao_id, rng.choice(filiais), _nome(rng),
+                                   rng.choice(CARGOS), rng.choice([20, 25, 30, 35, 40]), rng.random() < 0.9))
+
+    lista_clientes = []
+    for _ in range(max(1, int(clientes * tamanho))):
+        cliente_id = _uuid(rng)
+        nome = _nome(rng)
+        telefone, whatsapp = _celular(rng)
+        nascimento = date(1950, 1, 1) + timedelta(days=rng.randint(0, 21000)) if rng.random() < 0.7 else None
+        lista_clientes.append((cliente_id, nome, whatsapp))
+        t['clientes'].append((cliente_id, salao_id, rng.choice(filiais), nome, telefone, whatsapp, nascimento,
+                              rng.random() < 0.95, criado + timedelta(days=rng.randint(0, dias))))
+
+    for _ in range(max(1, int(comandas * tamanho))):
+        status = _sortear(rng, STATUS_PESOS)
+        if status in STATUS_EM_ANDAMENTO:
+            dia = referencia
+        else:
+            dia = referencia - timedelta(days=rng.randint(0, dias))
+            if dia.weekday() == 6 and rng.random() < 0.8:
+                dia -= timedelta(days=1)
+        abertura = datetime.combine(dia, hora(rng.randint(8, 19), rng.randint(0, 59), rng.randint(0, 59)))
+        fechamento = abertura + timedelta(minutes=rng.randint(20, 180)) if status in ('paga', 'cancelada') else None
+        cliente = rng.choice(lista_clientes) if rng.random() < 0.8 else None
+        comanda_id = _uuid(rng, abertura)
+
+        subtotal = 0
+        for _ in range(_sortear(rng, ITENS_PESOS)):
+            if rng.random() < 0.8:
+                servico_id, descricao, preco, comissao = rng.choice(catalogo)
+                item = ('servico', servico_id, None, rng.choice(colaboradores), descricao, 1, preco, comissao)
+            else:
+                produto_id, descricao, preco = rng.choice(produtos)
+                colaborador = rng.choice(colaboradores) if rng.random() < 0.5 else None
+                item = ('produto', None, produto_id, colaborador, descricao, rng.choice([1, 1, 1, 2]), preco,
+                        10 if colaborador else 0)
+            tipo, servico_id, produto_id, colaborador, descricao, quantidade, unitario, comissao = item
+            valor = _dinheiro(unitario * quantidade)
+            subtotal += valor
+            if produto_id and status != 'cancelada':
+                estoque[produto_id] += quantidade
+            t['comanda_itens'].append((_uuid(rng, abertura), comanda_id, salao_id, tipo, servico_id, produto_id,
+                                       colaborador, descricao, quantidade, unitario, valor, comissao,
+                                       _dinheiro(valor * comissao / 100)))
+
+        subtotal = _dinheiro(subtotal)
+        desconto = _dinheiro(subtotal * rng.choice([0.05, 0.1])) if rng.random() < 0.1 else 0
+        total = _dinheiro(subtotal - desconto)
+        t['comandas'].append((comanda_id, salao_id, rng.choice(filiais), cliente and cliente[0],
+                              cliente[1] if cliente else f"Avulso {_nome(rng)}", status, desconto,
+                              abertura, fechamento, abertura))
+
+        if status == 'paga':
+            if rng.random() < 0.85:
+                partes = [total]
+            else:
+                # Segunda parte pelo que falta: as duas somam o total mesmo com centavo impar
+                primeira = _dinheiro(total / 2)
+                partes = [primeira, _dinheiro(total - primeira)]
+            for valor in partes:
+                tipo_id = _sortear(rng, tipos)
+                t['comanda_pagamentos'].append((_uuid(rng, fechamento), comanda_id, salao_id, tipo_id, valor))
+
+    # Numero por filial na ordem de abertura, como o contador do banco faria (ver numeracao.py)
+    numeros = {}
+    for i in sorted(range(len(t['comandas'])), key=lambda i: t['comandas'][i][7]):
+        filial_id = t['comandas'][i][2]
+        numeros[filial_id] = numeros.get(filial_id, 0) + 1
+        t['comandas'][i] += (numeros[filial_id],)
+
+    # Saldo inicial = estoque sorteado + o que as vendas vao baixar, para terminar no sorteado
+    for produto_id, quantidade in estoque.items():
+        t['estoque_movimentos'].append((_uuid(rng, criado), salao_id, produto_id, 'inicial', quantidade, criado))
+
+    sessao_id = _uuid(rng)
+    t['sessoes_whatsapp'].append((sessao_id, salao_id, 'Principal', _celular(rng)[1], 'conectada'))
+
+    # Conversas: rajadas de mensagens com um cliente, alternando cliente e salao
+    inicio_mensagens = datetime.combine(referencia - timedelta(days=dias), hora(0), timezone.utc)
+    total_mensagens = int(mensagens * tamanho)
+    while total_mensagens > 0:
+        cliente_id, _, whatsapp = rng.choice(lista_clientes)
+        momento = inicio_mensagens + timedelta(seconds=rng.randint(0, dias * 86400))
+        for _ in range(min(total_mensagens, rng.randint(2, 8))):
+            from_me = rng.random() < 0.45
+            conteudo = rng.choice(MENSAGENS_SALAO if from_me else MENSAGENS_CLIENTE)
+            message_id = f"sint-{rng.getrandbits(64):016x}"
+            t['whatsapp_mensagens'].append((_uuid(rng, momento), salao_id, sessao_id, f"{whatsapp}@c.us",
+                                            message_id, 'chat', conteudo, from_me,
+                                            momento, 'enviada' if from_me else 'recebida', cliente_id, None))
+            t['whatsapp_message_ids'].append((salao_id, message_id, momento))
+            momento += timedelta(seconds=rng.randint(5, 900))
+            total_mensagens -= 1
+    return t
+
+
+def _copiar(cur, tabela, linhas):
+    """COPY das linhas (formato texto) para sgsx.<tabela>."""
+    if not linhas:
+        return
+    buffer = io.StringIO(''.join('\t'.join(campo_copy(v) for v in linha) + '\n' for linha in linhas))
+    colunas = ', '.join(f'"{c}"' for c in COLUNAS[tabela])
+    cur.copy_expert(f"COPY sgsx.{tabela} ({colunas}) FROM STDIN", buffer)
+
+
+def gerar(conn, saloes, servicos, tipos_recebimento, semente=SEMENTE, referencia=None, clientes=500,
+          comandas=2000, mensagens=2000, dias=365, primeiro=None):
+    """
+    Gera `saloes` saloes sinteticos, um por transacao, e devolve o total de
+    linhas por tabela. A mesma semente, referencia e primeiro produzem os
+    mesmos dados; primeiro=None continua a numeracao dos saloes do banco.
+    """
+    rng = random.Random(semente)
+    referencia = referencia or date.today()
+    totais = {tabela: 0 for tabela in COLUNAS}
+
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        # Particoes mensais do periodo das mensagens (as futuras ja sao mantidas pelo particoes.py)
+        cur.execute("""
+            SELECT sgsx.criar_particao_whatsapp(mes::date)
+            FROM generate_series(date_trunc('month', %s::date), date_trunc('month', %s::date), interval '1 month') mes
+        """, (referencia - timedelta(days=dias), referencia))
+        if primeiro is None:
+            # Numeracao dos nomes continua entre execucoes (com outra semente) no mesmo banco
+            cur.execute("SELECT COUNT(*) FROM sgsx.saloes WHERE nome LIKE 'Salao Sintetico %%'")
+            primeiro = cur.fetchone()[0] + 1
+
+    inicio = time.perf_counter()
+    conn.autocommit = False
+    with conn.cursor() as cur:
+        for n in range(primeiro, primeiro + saloes):
+            linhas = gerar_salao(rng, n, referencia, servicos, tipos_recebimento, clientes, comandas, mensagens, dias)
+            try:
+                for tabela in COLUNAS:
+                    _copiar(cur, tabela, linhas[tabela])
+                    totais[tabela] += len(linhas[tabela])
+                cur.execute("SELECT sgsx.sincronizar_numeracao_comandas(%s)", (linhas['saloes'][0][0],))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            print(f"  Salao {n - primeiro + 1}/{saloes}: {len(linhas['clientes'])} clientes, "
+                  f"{len(linhas['comandas'])} comandas, {len(linhas['whatsapp_mensagens'])} mensagens")
+
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE " + ', '.join(f"sgsx.{tabela}" for tabela in COLUNAS))
+
+    duracao = time.perf_counter() - inicio
+    linhas = sum(totais.values())
+    print(f"\n  {linhas} linhas em {duracao:.1f}s ({linhas / duracao:.0f} linhas/s)")
+    for tabela, total in totais.items():
+        print(f"    {tabela:<22}{total:>10}")
+    return totais
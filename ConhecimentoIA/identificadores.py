@@ -0,0 +1,105 @@
+"""
+UUIDs ordenados pelo tempo (versao 7) para as chaves das tabelas de muita escrita.
+
+O padrao gen_random_uuid() (versao 4) e aleatorio: cada insert cai numa pagina
+qualquer do indice da chave primaria, o indice incha com paginas meio vazias
+(splits em todo lugar) e sob carga de escrita as paginas quentes do btree
+disputam o cache com o resto. O UUID versao 7 (RFC 9562) comeca com os
+milissegundos Unix: inserts do mesmo periodo vao para as ultimas paginas do
+indice, como num BIGSERIAL, e o id continua unico sem coordenacao.
+
+A migracao 0021 cria sgsx.uuid_v7() e a usa como padrao do id de comandas,
+comanda_itens, comanda_pagamentos, whatsapp_mensagens e estoque_movimentos.
+Os ids existentes nao mudam (continuam UUIDs validos). No Python use uuid7(),
+que tambem aceita o momento (cargas historicas) e um random.Random (gerador).
+
+Execute: python migrations/identificadores.py --benchmark 200000
+"""
+import argparse
+import os
+import time
+import uuid
+
+from conexao import conectar
+
+TABELAS = ['comandas', 'comanda_itens', 'comanda_pagamentos', 'whatsapp_mensagens', 'estoque_movimentos']
+
+DDL = [
+    # 48 bits de milissegundos sobre um v4: troca os 6 primeiros bytes e a versao (0100 -> 0111)
+    ("funcao uuid_v7", """
+        CREATE OR REPLACE FUNCTION sgsx.uuid_v7()
+        RETURNS UUID AS $$
+            SELECT encode(
+                set_bit(set_bit(
+                    overlay(uuid_send(gen_random_uuid())
+                            PLACING substring(int8send(floor(extract(epoch FROM clock_timestamp()) * 1000)::bigint)
+                                              FROM 3)
+                            FROM 1 FOR 6),
+                    52, 1), 53, 1),
+                'hex')::uuid
+        $$ LANGUAGE sql VOLATILE
+    """),
+    ("padrao uuid_v7", ";\n".join(
+        f"ALTER TABLE sgsx.{tabela} ALTER COLUMN id SET DEFAULT sgsx.uuid_v7()" for tabela in TABELAS)),
+]
+
+
+def uuid7(momento=None, rng=None):
+    """
+    UUID versao 7: milissegundos Unix de `momento` (padrao: agora) + 74 bits
+    aleatorios (de `rng`, se informado, para resultados reproduziveis).
+    """
+    ms = int((momento.timestamp() if momento else time.time()) * 1000) & 0xFFFF_FFFF_FFFF
+    aleatorio = rng.getrandbits(74) if rng else int.from_bytes(os.urandom(10), 'big') >> 6
+    return uuid.UUID(int=ms << 80 | 0x7 << 76 | (aleatorio >> 62) << 64 | 0b10 << 62 | aleatorio & (1 << 62) - 1)
+
+
+def benchmark(linhas=200000, lote=1000):
+    """
+    Inserts/s e tamanho do indice da chave primaria com id v4 x v7, em tabelas
+    temporarias no schema sgsx (removidas ao final), `lote` linhas por transacao.
+    """
+    resultado = []
+    conn = conectar(verbose=False)
+    try:
+        with conn.cursor() as cur:
+            for versao, funcao in (('v4', 'gen_random_uuid()'), ('v7', 'sgsx.uuid_v7()')):
+                tabela = f"sgsx.benchmark_uuid_{versao}"
+                cur.execute(f"DROP TABLE IF EXISTS {tabela}")
+                cur.execute(f"""
+                    CREATE TABLE {tabela} (
+                        id UUID PRIMARY KEY DEFAULT {funcao},
+                        valor INTEGER,
+                        created_at TIMESTAMP DEFAULT NOW()
+                    )
+                """)
+                conn.commit()
+                try:
+                    inicio = time.perf_counter()
+                    for feitas in range(0, linhas, lote):
+                        cur.execute(f"INSERT INTO {tabela} (valor) SELECT generate_series(1, %s)",
+                                    (min(lote, linhas - feitas),))
+                        conn.commit()
+                    segundos = time.perf_counter() - inicio
+                    cur.execute(f"SELECT pg_relation_size('{tabela}_pkey')")
+                    resultado.append((versao, segundos, cur.fetchone()[0]))
+                finally:
+                    cur.execute(f"DROP TABLE IF EXISTS {tabela}")
+                    conn.commit()
+    finally:
+        conn.close()
+
+    print(f"\n{'Id':<6}{'Linhas':>10}{'Tempo (s)':>12}{'Linhas/s':>12}{'Indice PK (MB)':>16}")
+    for versao, segundos, tamanho in resultado:
+        print(f"{versao:<6}{linhas:>10}{segundos:>12.2f}{linhas / segundos:>12.0f}{tamanho / 1024 / 1024:>16.1f}")
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UUIDs versao 7 nas chaves do SGSx")
+    parser.add_argument('--benchmark', type=int, default=200000, metavar='LINHAS',
+                        help="linhas inseridas por versao na comparacao v4 x v7")
+    parser.add_argument('--lote', type=int, default=1000, help="linhas por transacao no --benchmark")
+    args = parser.parse_args()
+
+    benchmark(args.benchmark, args.lote)
@@ -0,0 +1,133 @@
+"""
+Construcao de indices sem bloquear escritas (CREATE INDEX CONCURRENTLY).
+
+Um CREATE INDEX comum segura um lock SHARE na tabela durante todo o build e
+bloqueia INSERT/UPDATE/DELETE em tabelas movimentadas como comandas,
+comanda_itens e whatsapp_mensagens. Aqui os indices que faltam sao criados
+com CONCURRENTLY (fora de transacao), indices INVALID deixados por um build
+concorrente que falhou sao removidos e recriados, e tabelas diferentes podem
+ser processadas em paralelo, cada uma em sua propria conexao.
+
+Execute: python migrations/indices.py                (indices das migracoes, uma conexao)
+         python migrations/indices.py --paralelo 4    (ate 4 tabelas em paralelo)
+
+O mesmo build e usado pelo runner de migracoes com --indices-concorrentes.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import schema
+from conexao import Pool, conectar
+
+
+def estado_indices(cur, nomes):
+    """Devolve {nome: valido} dos indices do schema sgsx que existem entre os nomes informados."""
+    cur.execute("""
+        SELECT c.relname, i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'sgsx' AND c.relname = ANY(%s)
+    """, (list(nomes),))
+    return dict(cur.fetchall())
+
+
+def tabelas_particionadas(cur, tabelas):
+    """Tabelas pai de particionamento: nelas o PostgreSQL nao aceita CONCURRENTLY."""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'sgsx' AND c.relkind = 'p' AND c.relname = ANY(%s)
+    """, (list(tabelas),))
+    return {row[0] for row in cur.fetchall()}
+
+
+def _construir_tabela(pool, tabela, itens, concorrente):
+    """Constroi, em sequencia e em uma conexao do pool, os indices de uma tabela."""
+    # Dois builds concorrentes na mesma tabela se bloqueiam (SHARE UPDATE
+    # EXCLUSIVE), por isso o paralelismo e entre tabelas, nunca dentro de uma
+    resultado = []
+    with pool.conexao() as conn:
+        with conn.cursor() as cur:
+            for ix, invalido in itens:
+                inicio = time.perf_counter()
+                if invalido:
+                    modo = "CONCURRENTLY " if concorrente else ""
+                    cur.execute(f"DROP INDEX {modo}IF EXISTS sgsx.{ix.nome}")
+                cur.execute(ix.sql(concorrente))
+                duracao = time.perf_counter() - inicio
+                acao = 'recriado' if invalido else 'criado'
+                print(f"  {ix.nome} ({tabela}): {acao} em {duracao:.2f}s")
+                resultado.append((ix.nome, tabela, acao, duracao))
+    return resultado
+
+
+def construir_indices(indices=None, concorrente=True, paralelo=1, banco=None):
+    """
+    Cria os indices que faltam e recria os INVALID. Devolve [(nome, tabela, acao, segundos)].
+    `banco`: banco alvo (padrao DATABASE_NAME).
+
+    Com concorrente=True usa CREATE INDEX CONCURRENTLY, exceto em tabelas
+    particionadas (o PostgreSQL nao suporta), onde o build e feito no modo comum.
+    """
+    indices = indices or schema.INDICES
+
+    conn = conectar(autocommit=True, verbose=False, banco=banco)
+    try:
+        with conn.cursor() as cur:
+            estado = estado_indices(cur, [ix.nome for ix in indices])
+            particionadas = tabelas_particionadas(cur, {ix.tabela for ix in indices}) if concorrente else set()
+    finally:
+        conn.close()
+
+    por_tabela = {}
+    for ix in indices:
+        if estado.get(ix.nome):
+            continue
+        por_tabela.setdefault(ix.tabela, []).append((ix, ix.nome in estado))
+
+    if not por_tabela:
+        print("  Todos os indices ja existem e sao validos.")
+        return []
+
+    invalidos = sum(invalido for itens in por_tabela.values() for _, invalido in itens)
+    total = sum(len(itens) for itens in por_tabela.values())
+    print(f"  {total} indices a construir ({invalidos} INVALID) em {len(por_tabela)} tabelas, "
+          f"paralelo={paralelo}, concorrente={concorrente}")
+    for tabela in sorted(particionadas & set(por_tabela)):
+        print(f"  Aviso: sgsx.{tabela} e particionada, indices construidos sem CONCURRENTLY")
+
+    inicio = time.perf_counter()
+    # Uma conexao por thread, no maximo `paralelo` abertas ao mesmo tempo
+    with Pool(maximo=max(1, paralelo), autocommit=True, banco=banco) as pool, \
+            ThreadPoolExecutor(max_workers=max(1, paralelo)) as executor:
+        futuros = [
+            executor.submit(_construir_tabela, pool, tabela, itens, concorrente and tabela not in particionadas)
+            for tabela, itens in por_tabela.items()
+        ]
+        resultado = [r for futuro in futuros for r in futuro.result()]
+
+    print(f"  {len(resultado)} indices construidos em {time.perf_counter() - inicio:.2f}s")
+    return resultado
+
+
+def imprimir_relatorio(resultado):
+    """Tabela com a duracao de cada indice, do mais lento para o mais rapido."""
+    print(f"\n{'Indice':<45}{'Tabela':<22}{'Acao':<10}{'Tempo (s)':>10}")
+    for nome, tabela, acao, segundos in sorted(resultado, key=lambda r: -r[3]):
+        print(f"{nome:<45}{tabela:<22}{acao:<10}{segundos:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construcao de indices do SGSx sem bloquear escritas")
+    parser.add_argument('--paralelo', type=int, default=1, help="tabelas processadas ao mesmo tempo")
+    parser.add_argument('--sem-concorrente', action='store_true',
+                        help="usa CREATE INDEX comum (bloqueia escritas; so para bancos vazios)")
+    args = parser.parse_args()
+
+    from migracoes import indices_registrados
+    imprimir_relatorio(construir_indices(
+        indices_registrados(), concorrente=not args.sem_concorrente, paralelo=args.paralelo
+    ))
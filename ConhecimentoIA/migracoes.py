@@ -0,0 +1,353 @@
+"""
+Motor de migracoes versionadas do SGSx.
+
+Cada migracao tem versao, nome e a lista de comandos que aplica. O historico
+fica no ledger sgsx.schema_migracoes junto com o checksum dos comandos, e so
+as migracoes pendentes sao executadas: um deploy contra um banco em dia custa
+uma unica consulta ao ledger, sem replay de DDL nem recriacao de triggers.
+
+Execute: python migrations/migracoes.py                (aplica as pendentes)
+         python migrations/migracoes.py --status       (aplicadas x pendentes)
+         python migrations/migracoes.py --modo passo   (um comando por vez)
+         python migrations/migracoes.py --indices-concorrentes --paralelo 4
+
+Para alterar o schema, adicione uma nova Migracao ao final de MIGRACOES.
+Nunca edite uma migracao ja aplicada: o checksum dela deixa de bater.
+"""
+import argparse
+import hashlib
+import time
+from dataclasses import dataclass
+
+import psycopg2
+import psycopg2.errors
+from psycopg2.extras import execute_values
+
+import aniversariantes
+import arquivamento
+import atualizacoes
+import busca
+import comissoes
+import contadores
+import dados_padrao
+import estoque
+import identificadores
+import notificacoes
+import numeracao
+import particoes
+import particoes_comandas
+import provisionamento
+import schema
+import totais_comanda
+import whatsapp_ingestao
+from conexao import conectar
+from indices import construir_indices
+
+MODO_PASSO = 'passo'
+MODO_LOTE = 'lote'
+
+# Chave do advisory lock que serializa deploys concorrentes
+LOCK_MIGRACOES = 7247_0001
+
+LEDGER_DDL = """
+    CREATE SCHEMA IF NOT EXISTS sgsx;
+    CREATE TABLE IF NOT EXISTS sgsx.schema_migracoes (
+        versao VARCHAR(20) PRIMARY KEY,
+        nome VARCHAR(200) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        duracao_ms INTEGER,
+        aplicada_em TIMESTAMPTZ DEFAULT NOW()
+    );
+    COMMENT ON TABLE sgsx.schema_migracoes IS 'Ledger das migracoes aplicadas (ver migracoes.py)'
+"""
+
+
+class ErroMigracao(Exception):
+    """Ledger inconsistente com as migracoes definidas no codigo."""
+
+
+@dataclass
+class Migracao:
+    versao: str
+    nome: str
+    comandos: list
+    transacional: bool = True
+    indices: list = None
+    # No modo passo roda comando a comando, mas em uma unica transacao (ex.: LOCK TABLE)
+    atomica: bool = False
+
+    @property
+    def checksum(self):
+        """SHA-256 dos comandos, ignorando diferencas de espacamento."""
+        h = hashlib.sha256()
+        for _, sql in self.comandos:
+            h.update(' '.join(sql.split()).encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+
+def migracao_de_indices(versao, nome, indices):
+    """
+    Migracao que so cria indices. O checksum vem do SQL comum (sem CONCURRENTLY),
+    entao o modo de build escolhido no deploy nao altera o ledger.
+    """
+    return Migracao(versao, nome, schema.plano_indices(indices), indices=indices)
+
+
+MIGRACOES = [
+    Migracao('0001', 'schema_inicial', schema.montar_plano_ddl()),
+    migracao_de_indices('0002', 'indices_iniciais', schema.INDICES),
+    migracao_de_indices('0003', 'indices_consultas', schema.INDICES_CONSULTAS),
+    Migracao('0004', 'comissoes_diarias', comissoes.DDL),
+    Migracao('0005', 'contadores_dashboard', contadores.DDL + contadores.RECARREGAR),
+    Migracao('0006', 'whatsapp_mensagens_particionada', particoes.DDL, atomica=True),
+    Migracao('0007', 'whatsapp_message_id_unico', whatsapp_ingestao.DDL),
+    Migracao('0008', 'busca_textual', busca.DDL),
+    migracao_de_indices('0009', 'indices_busca', busca.INDICES),
+    Migracao('0010', 'funcao_mes_dia', aniversariantes.DDL),
+    migracao_de_indices('0011', 'indices_aniversario', aniversariantes.INDICES),
+    Migracao('0012', 'contadores_por_comando', contadores.DDL_POR_COMANDO),
+    Migracao('0013', 'chaves_dados_padrao', dados_padrao.DDL),
+    Migracao('0014', 'provisionamento_saloes', provisionamento.DDL),
+    Migracao('0015', 'arquivo_comandas', arquivamento.DDL),
+    Migracao('0016', 'numeracao_comandas', numeracao.DDL),
+    migracao_de_indices('0017', 'indice_numero_comanda', numeracao.INDICES),
+    Migracao('0018', 'totais_comanda', totais_comanda.DDL),
+    Migracao('0019', 'estoque_movimentos', estoque.DDL),
+    migracao_de_indices('0020', 'indice_estoque_baixo', estoque.INDICES),
+    Migracao('0021', 'uuid_v7', identificadores.DDL),
+    Migracao('0022', 'salao_id_itens_pagamentos', particoes_comandas.DDL),
+    Migracao('0023', 'updates_sem_mudanca_fillfactor', atualizacoes.DDL),
+    Migracao('0024', 'notificacoes_status', notificacoes.DDL),
+    Migracao('0025', 'whatsapp_message_ids', whatsapp_ingestao.DDL_CHAVES),
+    Migracao('0026', 'comissoes_comanda_removida', comissoes.DDL_REMOCAO),
+    Migracao('0027', 'updated_at_colunas_geradas', atualizacoes.DDL_COLUNAS_GERADAS),
+]
+
+
+def indices_registrados():
+    """Todos os indices declarados por migracoes de indices, na ordem do registro."""
+    return [ix for m in MIGRACOES if m.indices for ix in m.indices]
+
+
+# =============================================================================
+# Execucao de comandos
+# =============================================================================
+
+def executar_passo_a_passo(cur, plano):
+    """Executa o plano um comando por vez (conexao em AUTOCOMMIT)."""
+    for descricao, sql in plano:
+        cur.execute(sql)
+        print(f"  {descricao}: ok")
+
+
+def executar_em_lote(cur, plano, tamanho_lote=0):
+    """
+    Envia o plano como scripts de varios comandos separados por ';'.
+    Com tamanho_lote=0 o plano inteiro vai em uma unica ida ao servidor.
+    """
+    comandos = [sql.strip() for _, sql in plano]
+    tamanho = tamanho_lote or len(comandos)
+    lotes = [comandos[i:i + tamanho] for i in range(0, len(comandos), tamanho)]
+    for numero, lote in enumerate(lotes, start=1):
+        cur.execute(";\n".join(lote))
+        print(f"  Lote {numero}/{len(lotes)}: {len(lote)} comandos")
+
+
+# =============================================================================
+# Ledger
+# =============================================================================
+
+def ler_ledger(conn):
+    """Devolve {versao: checksum} das migracoes aplicadas, ou None se o ledger nao existe."""
+    with conn.cursor() as cur:
+        try:
+            cur.execute("SELECT versao, checksum FROM sgsx.schema_migracoes")
+            return dict(cur.fetchall())
+        except psycopg2.errors.UndefinedTable:
+            conn.rollback()
+            return None
+
+
+def calcular_pendentes(aplicadas, migracoes=None):
+    """Confere os checksums das migracoes aplicadas e devolve as pendentes, em ordem."""
+    migracoes = migracoes or MIGRACOES
+    conhecidas = {m.versao for m in migracoes}
+
+    for m in migracoes:
+        if m.versao in aplicadas and aplicadas[m.versao].strip() != m.checksum:
+            raise ErroMigracao(
+                f"Migracao {m.versao} ({m.nome}) foi alterada depois de aplicada. "
+                "Crie uma nova migracao em vez de editar a existente."
+            )
+
+    desconhecidas = sorted(set(aplicadas) - conhecidas)
+    if desconhecidas:
+        raise ErroMigracao(
+            f"Banco tem migracoes que este codigo nao conhece: {', '.join(desconhecidas)}. "
+            "Atualize o codigo antes de migrar."
+        )
+
+    return [m for m in migracoes if m.versao not in aplicadas]
+
+
+def _registrar(cur, aplicadas):
+    execute_values(cur, """
+        INSERT INTO sgsx.schema_migracoes (versao, nome, checksum, duracao_ms)
+        VALUES %s
+    """, [(m.versao, m.nome, m.checksum, ms) for m, ms in aplicadas])
+
+
+# =============================================================================
+# Runner
+# =============================================================================
+
+def _aplicar_grupo_em_lote(conn, grupo, tamanho_lote):
+    """Aplica migracoes transacionais em uma unica transacao, incluindo o registro no ledger."""
+    conn.autocommit = False
+    cur = conn.cursor()
+    try:
+        aplicadas = []
+        for m in grupo:
+            print(f"\n[{m.versao}] {m.nome} ({len(m.comandos)} comandos)")
+            inicio = time.perf_counter()
+            executar_em_lote(cur, m.comandos, tamanho_lote)
+            aplicadas.append((m, int((time.perf_counter() - inicio) * 1000)))
+        _registrar(cur, aplicadas)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        print("\nErro: transacao desfeita, nenhuma migracao deste grupo foi aplicada.")
+        raise
+    finally:
+        cur.close()
+        conn.autocommit = True
+    return aplicadas
+
+
+def _aplicar_passo_a_passo(conn, m):
+    """
+    Aplica uma migracao comando a comando e registra no ledger ao final: em
+    AUTOCOMMIT, ou em uma unica transacao se m.atomica.
+    """
+    print(f"\n[{m.versao}] {m.nome} ({len(m.comandos)} comandos{', uma transacao' if m.atomica else ''})")
+    conn.autocommit = not m.atomica
+    try:
+        with conn.cursor() as cur:
+            inicio = time.perf_counter()
+            executar_passo_a_passo(cur, m.comandos)
+            aplicada = (m, int((time.perf_counter() - inicio) * 1000))
+            _registrar(cur, [aplicada])
+        if m.atomica:
+            conn.commit()
+    except Exception:
+        if m.atomica:
+            conn.rollback()
+            print("\nErro: transacao desfeita, a migracao nao foi aplicada.")
+        raise
+    finally:
+        conn.autocommit = True
+    return [aplicada]
+
+
+def _aplicar_indices_concorrentes(conn, m, paralelo):
+    """
+    Aplica uma migracao de indices com CREATE INDEX CONCURRENTLY, fora de
+    transacao, no mesmo banco de `conn` (as conexoes do build sao novas).
+    """
+    print(f"\n[{m.versao}] {m.nome} ({len(m.indices)} indices, CONCURRENTLY)")
+    inicio = time.perf_counter()
+    construir_indices(m.indices, concorrente=True, paralelo=paralelo, banco=conn.info.dbname)
+    aplicada = (m, int((time.perf_counter() - inicio) * 1000))
+    with conn.cursor() as cur:
+        _registrar(cur, [aplicada])
+    return [aplicada]
+
+
+def aplicar_migracoes(conn, modo=MODO_LOTE, tamanho_lote=0, migracoes=None,
+                      indices_concorrentes=False, paralelo=1):
+    """
+    Aplica as migracoes pendentes e devolve [(migracao, duracao_ms)].
+
+    No modo lote, migracoes transacionais consecutivas sao aplicadas juntas em
+    uma transacao; migracoes com transacional=False e o modo passo rodam em
+    AUTOCOMMIT, comando a comando (migracoes com atomica=True rodam comando a
+    comando em uma unica transacao). Com indices_concorrentes=True, migracoes
+    de indices usam CREATE INDEX CONCURRENTLY (recriando indices INVALID), com
+    ate `paralelo` tabelas construidas ao mesmo tempo.
+    """
+    migracoes = migracoes or MIGRACOES
+    conn.autocommit = True
+
+    aplicadas = ler_ledger(conn)
+    if not calcular_pendentes(aplicadas or {}, migracoes):
+        print("  Banco em dia: nenhuma migracao pendente.")
+        return []
+
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_lock(%s)", (LOCK_MIGRACOES,))
+    try:
+        if aplicadas is None:
+            cur.execute(LEDGER_DDL)
+            print("  Ledger sgsx.schema_migracoes criado!")
+
+        # Rele o ledger ja com o lock: outro deploy pode ter aplicado algo
+        pendentes = calcular_pendentes(ler_ledger(conn) or {}, migracoes)
+
+        resultado = []
+        grupo = []
+        for m in pendentes:
+            concorrente = indices_concorrentes and m.indices
+            if modo == MODO_LOTE and m.transacional and not concorrente:
+                grupo.append(m)
+                continue
+            if grupo:
+                resultado += _aplicar_grupo_em_lote(conn, grupo, tamanho_lote)
+                grupo = []
+            if concorrente:
+                resultado += _aplicar_indices_concorrentes(conn, m, paralelo)
+            else:
+                resultado += _aplicar_passo_a_passo(conn, m)
+        if grupo:
+            resultado += _aplicar_grupo_em_lote(conn, grupo, tamanho_lote)
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_MIGRACOES,))
+        cur.close()
+
+    print(f"\n  {len(resultado)} migracoes aplicadas:")
+    for m, ms in resultado:
+        print(f"    {m.versao} {m.nome}: {ms} ms")
+    return resultado
+
+
+def imprimir_status(conn):
+    """Lista as migracoes aplicadas e pendentes."""
+    conn.autocommit = True
+    aplicadas = ler_ledger(conn) or {}
+    pendentes = {m.versao for m in calcular_pendentes(aplicadas)}
+    for m in MIGRACOES:
+        situacao = 'pendente' if m.versao in pendentes else 'aplicada'
+        print(f"  {m.versao}  {m.nome:<40} {situacao}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migracoes versionadas do SGSx")
+    parser.add_argument('--modo', choices=[MODO_LOTE, MODO_PASSO], default=MODO_LOTE)
+    parser.add_argument('--lote-tamanho', type=int, default=0,
+                        help="quantidade de comandos por lote (0 = migracao inteira em um lote)")
+    parser.add_argument('--status', action='store_true', help="apenas lista aplicadas e pendentes")
+    parser.add_argument('--indices-concorrentes', action='store_true',
+                        help="cria indices com CONCURRENTLY, sem bloquear escritas")
+    parser.add_argument('--paralelo', type=int, default=1,
+                        help="tabelas com indices construidos ao mesmo tempo (com --indices-concorrentes)")
+    args = parser.parse_args()
+
+    conn = conectar()
+    try:
+        if args.status:
+            imprimir_status(conn)
+        else:
+            aplicar_migracoes(conn, args.modo, args.lote_tamanho,
+                              indices_concorrentes=args.indices_concorrentes, paralelo=args.paralelo)
+    finally:
+        conn.close()
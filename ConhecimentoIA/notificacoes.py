@@ -0,0 +1,258 @@
+"""
+Eventos de mudanca de status (LISTEN/NOTIFY) no lugar do polling do frontend.
+
+O frontend consulta whatsappService.getStatus/getQrCode e recarrega as listas
+de comandas em intervalos fixos so para descobrir se algo mudou: carga
+constante de SELECT em sessoes_whatsapp e comandas, quase sempre com a mesma
+resposta. A migracao 0024 instala triggers que publicam no canal sgsx_status
+cada comanda ou sessao criada e cada mudanca de status:
+
+    {"tabela": "comandas", "salao_id": "...", "id": "...",
+     "status": "paga", "anterior": "aguardando_pagamento"}
+
+(`anterior` e null na criacao). O NOTIFY sai no commit e so se a transacao
+confirmar; updates que nao mexem em status nao disparam o trigger (WHEN).
+
+Ouvinte mantem uma conexao em LISTEN e repassa cada evento aos assinantes
+cujo filtro (tabela, salao_id) bate: a API assina uma vez por cliente
+conectado (websocket/SSE) e busca a linha so quando chega o evento. Eventos
+publicados com o ouvinte desconectado se perdem: na reconexao os assinantes
+recebem ao_reconectar() para recarregar o estado. LISTEN precisa de conexao
+de sessao: aponte o ouvinte direto para o PostgreSQL (ou pgbouncer em modo
+session), nunca para um pool em modo transaction.
+
+Execute: python migrations/notificacoes.py --ouvir [--tabela comandas] [--salao <uuid>]
+         python migrations/notificacoes.py --latencia 200
+"""
+import argparse
+import json
+import select
+import statistics
+import threading
+import time
+
+import psycopg2
+
+from conexao import ESPERA_INICIAL, conectar, erro_transitorio
+
+CANAL = 'sgsx_status'
+
+TABELAS = ['comandas', 'sessoes_whatsapp']
+
+# Espera maxima entre tentativas de reconexao do ouvinte (s)
+ESPERA_MAXIMA = 30
+
+DDL = [
+    ("funcao notificar_status", f"""
+        CREATE OR REPLACE FUNCTION sgsx.notificar_status()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            -- TG_ARGV[0]: nome da tabela (TG_TABLE_NAME seria a particao)
+            PERFORM pg_notify('{CANAL}', jsonb_build_object(
+                'tabela', TG_ARGV[0], 'salao_id', NEW.salao_id, 'id', NEW.id, 'status', NEW.status,
+                'anterior', CASE WHEN TG_OP = 'UPDATE' THEN OLD.status END)::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+] + [
+    (f"triggers notificar_status {tabela}", f"""
+        CREATE TRIGGER trigger_notificar_status_{tabela}_insert
+            AFTER INSERT ON sgsx.{tabela}
+            FOR EACH ROW EXECUTE FUNCTION sgsx.notificar_status('{tabela}');
+        CREATE TRIGGER trigger_notificar_status_{tabela}_update
+            AFTER UPDATE OF status ON sgsx.{tabela}
+            FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status)
+            EXECUTE FUNCTION sgsx.notificar_status('{tabela}')
+    """) for tabela in TABELAS
+]
+
+
+def ler_evento(payload):
+    """Evento do payload JSON do NOTIFY, ou None se nao for um objeto com tabela e salao_id."""
+    try:
+        evento = json.loads(payload)
+    except ValueError:
+        return None
+    if not isinstance(evento, dict) or 'tabela' not in evento or 'salao_id' not in evento:
+        return None
+    return evento
+
+
+class Ouvinte:
+    """
+    Conexao em LISTEN no `canal` que repassa os eventos aos assinantes. Os
+    callbacks rodam na thread do ouvinte, um evento por vez: devem ser
+    rapidos (ex.: colocar o evento na fila do cliente). Erro em um assinante
+    nao afeta os outros nem o ouvinte; payloads invalidos no canal sao
+    registrados e descartados (ler_evento).
+    """
+
+    def __init__(self, canal=CANAL, intervalo=5.0):
+        self.canal = canal
+        self.intervalo = intervalo
+        self._assinantes = {}
+        self._proxima = 0
+        self._trava = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def assinar(self, callback, tabela=None, salao_id=None, ao_reconectar=None):
+        """
+        Chama callback(evento) para os eventos da tabela e do salao (None:
+        todos) e ao_reconectar() depois de cada reconexao. Devolve a
+        assinatura, para cancelar().
+        """
+        with self._trava:
+            self._proxima += 1
+            self._assinantes[self._proxima] = (callback, tabela, salao_id and str(salao_id), ao_reconectar)
+            return self._proxima
+
+    def cancelar(self, assinatura):
+        with self._trava:
+            self._assinantes.pop(assinatura, None)
+
+    def _chamar(self, funcao, *args):
+        try:
+            funcao(*args)
+        except Exception as e:
+            print(f"  Erro no assinante {getattr(funcao, '__name__', funcao)}: {e}")
+
+    def _repassar(self, evento):
+        with self._trava:
+            assinantes = list(self._assinantes.values())
+        for callback, tabela, salao_id, _ in assinantes:
+            if (tabela is None or tabela == evento['tabela']) and (salao_id is None or salao_id == evento['salao_id']):
+                self._chamar(callback, evento)
+
+    def _reconectado(self):
+        with self._trava:
+            avisos = [ao_reconectar for _, _, _, ao_reconectar in self._assinantes.values() if ao_reconectar]
+        for ao_reconectar in avisos:
+            self._chamar(ao_reconectar)
+
+    def _escutar(self, conn):
+        """Le eventos ate parar() ou a conexao cair."""
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.canal}")
+        while not self._parar.is_set():
+            if select.select([conn], [], [], self.intervalo) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                payload = conn.notifies.pop(0).payload
+                evento = ler_evento(payload)
+                if evento is None:
+                    # NOTIFY manual ou de outra versao no mesmo canal: ignora so este evento
+                    print(f"  Evento ignorado, payload invalido: {payload[:200]!r}")
+                    continue
+                self._repassar(evento)
+
+    def rodar(self):
+        """Loop do ouvinte (bloqueia ate parar()); reconecta em falhas transitorias."""
+        self._parar.clear()
+        espera = ESPERA_INICIAL
+        conectado_antes = False
+        while not self._parar.is_set():
+            conn = None
+            try:
+                conn = conectar(autocommit=True, verbose=False, aplicacao='sgsx:notificacoes')
+                espera = ESPERA_INICIAL
+                if conectado_antes:
+                    print("  Ouvinte reconectado.")
+                    self._reconectado()
+                conectado_antes = True
+                self._escutar(conn)
+            except psycopg2.Error as e:
+                if not erro_transitorio(e):
+                    raise
+                print(f"  Ouvinte desconectado ({' '.join(str(e).split())}); nova tentativa em {espera:.1f}s")
+                self._parar.wait(espera)
+                espera = min(espera * 2, ESPERA_MAXIMA)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def iniciar(self):
+        """Roda o ouvinte em uma thread daemon."""
+        self._thread = threading.Thread(target=self.rodar, name='sgsx-notificacoes', daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self, espera=None):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(espera if espera is not None else self.intervalo + 1)
+
+
+def latencia(eventos=200):
+    """
+    Tempo do commit de uma mudanca de status ate o callback do ouvinte, com
+    uma sessao de WhatsApp temporaria no primeiro salao (removida ao final).
+    """
+    recebidos = {}
+    chegou = threading.Event()
+    conn = conectar(verbose=False)
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO sgsx.sessoes_whatsapp (salao_id, nome)
+        SELECT id, 'benchmark notificacoes' FROM sgsx.saloes ORDER BY created_at LIMIT 1
+        RETURNING id
+    """)
+    sessao_id = str(cur.fetchone()[0])
+    conn.commit()
+
+    def receber(evento):
+        if evento['id'] == sessao_id:
+            recebidos[evento['status']] = time.perf_counter()
+            chegou.set()
+
+    ouvinte = Ouvinte(intervalo=0.5)
+    ouvinte.assinar(receber, tabela='sessoes_whatsapp')
+    ouvinte.iniciar()
+    time.sleep(0.5)
+    tempos = []
+    try:
+        for n in range(eventos):
+            status = ('conectando', 'conectada')[n % 2]
+            chegou.clear()
+            cur.execute("UPDATE sgsx.sessoes_whatsapp SET status = %s WHERE id = %s", (status, sessao_id))
+            inicio = time.perf_counter()
+            conn.commit()
+            if not chegou.wait(5):
+                raise RuntimeError(f"evento {n} nao chegou em 5s")
+            tempos.append((recebidos[status] - inicio) * 1000)
+    finally:
+        ouvinte.parar()
+        cur.execute("DELETE FROM sgsx.sessoes_whatsapp WHERE id = %s", (sessao_id,))
+        conn.commit()
+        conn.close()
+
+    tempos.sort()
+    print(f"\n{eventos} mudancas de status: commit -> callback p50 {statistics.median(tempos):.2f} ms, "
+          f"p95 {tempos[int(len(tempos) * 0.95) - 1]:.2f} ms, max {tempos[-1]:.2f} ms")
+    return tempos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Eventos de status (LISTEN/NOTIFY) do SGSx")
+    parser.add_argument('--ouvir', action='store_true', help="imprime os eventos recebidos (Ctrl+C para sair)")
+    parser.add_argument('--tabela', choices=TABELAS, help="so eventos desta tabela")
+    parser.add_argument('--salao', help="so eventos deste salao (uuid)")
+    parser.add_argument('--latencia', type=int, metavar='EVENTOS',
+                        help="mede commit -> callback com uma sessao temporaria")
+    args = parser.parse_args()
+
+    if args.latencia:
+        latencia(args.latencia)
+    elif args.ouvir:
+        ouvinte = Ouvinte()
+        ouvinte.assinar(lambda evento: print(json.dumps(evento), flush=True), args.tabela, args.salao,
+                        lambda: print("  Reconectado: eventos do intervalo podem ter se perdido.", flush=True))
+        print(f"Ouvindo {CANAL}...")
+        try:
+            ouvinte.rodar()
+        except KeyboardInterrupt:
+            pass
+    else:
+        parser.error("informe --ouvir ou --latencia")
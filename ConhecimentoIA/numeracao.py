@@ -0,0 +1,200 @@
+"""
+Numeracao de comandas por (salao, filial).
+
+comandas.numero era um SERIAL global: todos os saloes dividiam a mesma
+sequencia e o numero nao dizia nada dentro da filial. Calcular MAX(numero) + 1
+por filial serializaria os inserts (e ainda geraria duplicatas sem lock).
+
+A migracao 0016 cria sgsx.comandas_numeracao, uma linha (ultimo numero) por
+salao e filial. O trigger BEFORE INSERT de sgsx.comandas pega o proximo numero
+com um UPSERT nessa linha: so comandas da mesma filial esperam umas pelas
+outras (lock de linha ate o commit), filiais e saloes diferentes nao disputam
+nada. Como o numero e alocado na propria transacao, um rollback devolve o
+numero e a sequencia da filial fica sem buracos.
+
+Cargas em lote (importacoes, gerador) nao devem alocar um numero por linha na
+mesma transacao: reserve um bloco com reservar_numeros() (transacao propria,
+numeros nao usados viram buracos) ou informe numero e rode
+sgsx.sincronizar_numeracao_comandas(salao) ao final. Comandas com numero
+informado nao passam pelo contador.
+
+Comandas existentes mantem o numero; o contador de cada filial comeca no maior
+numero ja usado nela (tabela quente e arquivo).
+
+Execute: python migrations/numeracao.py --sincronizar
+         python migrations/numeracao.py --benchmark 2000 --threads 8
+"""
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from comissoes import FILIAL_NULA
+from conexao import Pool, conectar
+from schema import Indice
+
+INDICES = [
+    # Garante o numero unico na filial (comandas sem filial usam FILIAL_NULA)
+    Indice('uq_comandas_filial_numero', 'comandas',
+           f"(salao_id, (COALESCE(filial_id, '{FILIAL_NULA}'::uuid)), numero)", unico=True),
+]
+
+DDL = [
+    ("tabela comandas_numeracao", """
+        CREATE TABLE IF NOT EXISTS sgsx.comandas_numeracao (
+            salao_id UUID NOT NULL REFERENCES sgsx.saloes(id) ON DELETE CASCADE,
+            filial_id UUID NOT NULL,
+            ultimo INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (salao_id, filial_id)
+        )
+    """),
+    ("comentario comandas_numeracao",
+     "COMMENT ON TABLE sgsx.comandas_numeracao IS "
+     "'Ultimo numero de comanda por salao e filial (filial nula = zero), ver numeracao.py'"),
+    ("funcao proximo_numero_comanda", f"""
+        CREATE OR REPLACE FUNCTION sgsx.proximo_numero_comanda(
+            p_salao_id UUID, p_filial_id UUID, p_quantidade INTEGER DEFAULT 1
+        ) RETURNS INTEGER AS $$
+            -- Devolve o ultimo numero do bloco alocado (o primeiro e ultimo - quantidade + 1)
+            INSERT INTO sgsx.comandas_numeracao AS n (salao_id, filial_id, ultimo)
+            VALUES (p_salao_id, COALESCE(p_filial_id, '{FILIAL_NULA}'::uuid), p_quantidade)
+            ON CONFLICT (salao_id, filial_id) DO UPDATE SET ultimo = n.ultimo + EXCLUDED.ultimo
+            RETURNING ultimo
+        $$ LANGUAGE sql
+    """),
+    ("funcao numerar_comanda", """
+        CREATE OR REPLACE FUNCTION sgsx.numerar_comanda()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.numero := sgsx.proximo_numero_comanda(NEW.salao_id, NEW.filial_id);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+    ("trigger numerar_comanda", """
+        CREATE TRIGGER trigger_numerar_comanda
+        BEFORE INSERT ON sgsx.comandas
+        FOR EACH ROW WHEN (NEW.numero IS NULL)
+        EXECUTE FUNCTION sgsx.numerar_comanda()
+    """),
+    ("funcao sincronizar_numeracao_comandas", f"""
+        CREATE OR REPLACE FUNCTION sgsx.sincronizar_numeracao_comandas(p_salao_id UUID DEFAULT NULL)
+        RETURNS INTEGER AS $$
+            -- Contadores atrasados (comandas com numero informado) avancam ate o maior numero da filial
+            WITH maximos AS (
+                SELECT salao_id, COALESCE(filial_id, '{FILIAL_NULA}'::uuid) AS filial_id, MAX(numero) AS ultimo
+                FROM sgsx.comandas_todas
+                WHERE p_salao_id IS NULL OR salao_id = p_salao_id
+                GROUP BY 1, 2
+                ORDER BY 1, 2
+            ), gravados AS (
+                INSERT INTO sgsx.comandas_numeracao AS n (salao_id, filial_id, ultimo)
+                SELECT salao_id, filial_id, ultimo FROM maximos
+                ON CONFLICT (salao_id, filial_id) DO UPDATE SET ultimo = EXCLUDED.ultimo
+                WHERE n.ultimo < EXCLUDED.ultimo
+                RETURNING 1
+            )
+            SELECT COUNT(*)::int FROM gravados
+        $$ LANGUAGE sql
+    """),
+    ("carga comandas_numeracao", "SELECT sgsx.sincronizar_numeracao_comandas()"),
+    ("remocao do SERIAL global", """
+        ALTER TABLE sgsx.comandas ALTER COLUMN numero DROP DEFAULT;
+        DROP SEQUENCE IF EXISTS sgsx.comandas_numero_seq
+    """),
+]
+
+
+def reservar_numeros(conn, salao_id, filial_id, quantidade):
+    """
+    Reserva `quantidade` numeros seguidos da filial em uma transacao curta
+    (a linha do contador fica travada so durante a reserva) e devolve
+    range(primeiro, ultimo + 1). Use uma conexao sem transacao aberta.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT sgsx.proximo_numero_comanda(%s, %s, %s)", (salao_id, filial_id, quantidade))
+        ultimo = cur.fetchone()[0]
+    conn.commit()
+    return range(ultimo - quantidade + 1, ultimo + 1)
+
+
+def sincronizar(conn, salao_id=None):
+    """Avanca os contadores que ficaram atras do maior numero usado; devolve quantos mudaram."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT sgsx.sincronizar_numeracao_comandas(%s)", (salao_id,))
+        alterados = cur.fetchone()[0]
+    conn.commit()
+    print(f"  {alterados} contadores de numeracao ajustados.")
+    return alterados
+
+
+def benchmark(quantidade=2000, threads=8):
+    """
+    Comandas/s com `threads` conexoes abrindo comandas (uma transacao cada):
+    todas na mesma filial (disputam a mesma linha do contador) x cada thread
+    em uma filial. Usa um salao temporario, removido ao final.
+    """
+    salao_id = str(uuid.uuid4())
+    filiais = [str(uuid.uuid4()) for _ in range(threads)]
+    conn = conectar(verbose=False)
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO sgsx.saloes (id, nome) VALUES (%s, 'Benchmark numeracao')", (salao_id,))
+        for i, filial_id in enumerate(filiais):
+            cur.execute("INSERT INTO sgsx.filiais (id, salao_id, nome) VALUES (%s, %s, %s)",
+                        (filial_id, salao_id, f"Filial {i + 1}"))
+    conn.commit()
+
+    def abrir(conn, filial_id):
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO sgsx.comandas (salao_id, filial_id, nome_cliente) VALUES (%s, %s, 'Benchmark')",
+                        (salao_id, filial_id))
+
+    resultado = []
+    try:
+        with Pool(maximo=threads) as pool, ThreadPoolExecutor(max_workers=threads) as executor:
+            for nome, escolher in (('mesma filial', lambda n: filiais[0]),
+                                   ('filial por thread', lambda n: filiais[n % threads])):
+                inicio = time.perf_counter()
+                list(executor.map(lambda n: pool.executar(lambda c: abrir(c, escolher(n))), range(quantidade)))
+                resultado.append((nome, time.perf_counter() - inicio))
+
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT COUNT(*) FROM (
+                    SELECT filial_id, COUNT(*) AS n, MAX(numero) AS maximo FROM sgsx.comandas
+                    WHERE salao_id = %s GROUP BY filial_id
+                ) f WHERE n <> maximo
+            """, (salao_id,))
+            buracos = cur.fetchone()[0]
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM sgsx.comandas WHERE salao_id = %s", (salao_id,))
+            cur.execute("DELETE FROM sgsx.filiais WHERE salao_id = %s", (salao_id,))
+            cur.execute("DELETE FROM sgsx.saloes WHERE id = %s", (salao_id,))
+        conn.commit()
+        conn.close()
+
+    print(f"\n{'Cenario':<22}{'Comandas':>10}{'Tempo (s)':>12}{'Comandas/s':>12}")
+    for nome, segundos in resultado:
+        print(f"{nome:<22}{quantidade:>10}{segundos:>12.2f}{quantidade / segundos:>12.0f}")
+    print(f"\n  Filiais com buracos na numeracao: {buracos}")
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Numeracao de comandas por salao e filial")
+    parser.add_argument('--sincronizar', action='store_true',
+                        help="avanca contadores atrasados em relacao ao maior numero usado")
+    parser.add_argument('--salao', help="limita o --sincronizar a um salao")
+    parser.add_argument('--benchmark', type=int, metavar='COMANDAS', help="comandas/s com inserts concorrentes")
+    parser.add_argument('--threads', type=int, default=8, help="conexoes concorrentes no --benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.threads)
+    else:
+        conn = conectar()
+        try:
+            sincronizar(conn, args.salao)
+        finally:
+            conn.close()
@@ -0,0 +1,282 @@
+"""
+Particionamento mensal de sgsx.whatsapp_mensagens.
+
+A tabela passa a ser particionada por RANGE em "timestamp", uma particao por
+mes (UTC) com nome whatsapp_mensagens_pAAAAMM, mais a particao padrao
+whatsapp_mensagens_padrao que recebe o que cair fora dos meses criados. A
+migracao 0006 converte a tabela existente: cria a tabela particionada, copia as
+linhas com a original travada para escrita e troca os nomes.
+
+Manutencao (agende diariamente, ex.: Agendador de Tarefas do Windows):
+- cria as particoes dos proximos meses (sgsx.garantir_particoes_whatsapp);
+- retencao: particoes mais antigas que --reter meses sao desanexadas e
+  removidas com DROP, sem DELETE em massa nem VACUUM do historico.
+
+Execute: python migrations/particoes.py                  (cria particoes futuras)
+         python migrations/particoes.py --listar
+         python migrations/particoes.py --reter 12       (mantem 12 meses alem do atual)
+         python migrations/particoes.py --reter 12 --apenas-desanexar
+"""
+import argparse
+import re
+from datetime import date
+
+import psycopg2.errors
+
+import schema
+from conexao import conectar
+
+MESES_FUTUROS = 3
+PADRAO_NOME = re.compile(r'^whatsapp_mensagens_p(\d{4})(\d{2})$')
+
+COLUNAS = ("id, salao_id, sessao_id, remote_jid, message_id, tipo, conteudo, from_me, "
+           '"timestamp", status, cliente_id, comanda_id, created_at, updated_at')
+
+FUNCAO_CRIAR_PARTICAO = """
+    CREATE OR REPLACE FUNCTION sgsx.criar_particao_whatsapp(p_mes DATE)
+    RETURNS TEXT AS $$
+    DECLARE
+        inicio DATE := date_trunc('month', p_mes)::date;
+        fim DATE := (date_trunc('month', p_mes) + interval '1 month')::date;
+        nome TEXT := 'whatsapp_mensagens_p' || to_char(p_mes, 'YYYYMM');
+    BEGIN
+        IF to_regclass('sgsx.' || nome) IS NOT NULL THEN
+            RETURN NULL;
+        END IF;
+        -- Linhas do mes que ja cairam na particao padrao saem dela antes do ATTACH,
+        -- senao o PostgreSQL recusa a nova particao
+        EXECUTE format(
+            'CREATE TABLE sgsx.%I (LIKE sgsx.whatsapp_mensagens INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', nome);
+        EXECUTE format(
+            'WITH movidas AS (DELETE FROM sgsx.whatsapp_mensagens_padrao '
+            'WHERE "timestamp" >= %L AND "timestamp" < %L RETURNING *) '
+            'INSERT INTO sgsx.%I SELECT * FROM movidas',
+            inicio::timestamp AT TIME ZONE 'UTC', fim::timestamp AT TIME ZONE 'UTC', nome);
+        EXECUTE format(
+            'ALTER TABLE sgsx.whatsapp_mensagens ATTACH PARTITION sgsx.%I FOR VALUES FROM (%L) TO (%L)',
+            nome, inicio::timestamp AT TIME ZONE 'UTC', fim::timestamp AT TIME ZONE 'UTC');
+        RETURN nome;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+# Versao instalada pela migracao 0008 (busca_textual): a tabela passa a ter
+# colunas geradas, que precisam existir como geradas na particao para o ATTACH
+# e nao aceitam valores copiados da particao padrao
+FUNCAO_CRIAR_PARTICAO_COLUNAS_GERADAS = """
+    CREATE OR REPLACE FUNCTION sgsx.criar_particao_whatsapp(p_mes DATE)
+    RETURNS TEXT AS $$
+    DECLARE
+        inicio DATE := date_trunc('month', p_mes)::date;
+        fim DATE := (date_trunc('month', p_mes) + interval '1 month')::date;
+        nome TEXT := 'whatsapp_mensagens_p' || to_char(p_mes, 'YYYYMM');
+        colunas TEXT;
+    BEGIN
+        IF to_regclass('sgsx.' || nome) IS NOT NULL THEN
+            RETURN NULL;
+        END IF;
+        SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO colunas
+        FROM pg_attribute
+        WHERE attrelid = 'sgsx.whatsapp_mensagens'::regclass
+        AND attnum > 0 AND NOT attisdropped AND attgenerated = '';
+
+        EXECUTE format(
+            'CREATE TABLE sgsx.%I (LIKE sgsx.whatsapp_mensagens '
+            'INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED)', nome);
+        EXECUTE format(
+            'WITH movidas AS (DELETE FROM sgsx.whatsapp_mensagens_padrao '
+            'WHERE "timestamp" >= %L AND "timestamp" < %L RETURNING %s) '
+            'INSERT INTO sgsx.%I (%s) SELECT %s FROM movidas',
+            inicio::timestamp AT TIME ZONE 'UTC', fim::timestamp AT TIME ZONE 'UTC',
+            colunas, nome, colunas, colunas);
+        EXECUTE format(
+            'ALTER TABLE sgsx.whatsapp_mensagens ATTACH PARTITION sgsx.%I FOR VALUES FROM (%L) TO (%L)',
+            nome, inicio::timestamp AT TIME ZONE 'UTC', fim::timestamp AT TIME ZONE 'UTC');
+        RETURN nome;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+FUNCAO_GARANTIR_PARTICOES = """
+    CREATE OR REPLACE FUNCTION sgsx.garantir_particoes_whatsapp(p_meses_futuros INTEGER DEFAULT 3)
+    RETURNS SETOF TEXT AS $$
+        SELECT nome FROM (
+            SELECT sgsx.criar_particao_whatsapp(mes::date) AS nome
+            FROM generate_series(
+                date_trunc('month', NOW() AT TIME ZONE 'UTC'),
+                date_trunc('month', NOW() AT TIME ZONE 'UTC') + make_interval(months => p_meses_futuros),
+                interval '1 month'
+            ) mes
+        ) criadas
+        WHERE nome IS NOT NULL
+    $$ LANGUAGE sql
+"""
+
+DDL = [
+    ("bloqueio de escrita whatsapp_mensagens", "LOCK TABLE sgsx.whatsapp_mensagens IN EXCLUSIVE MODE"),
+    ("renomeia whatsapp_mensagens antiga", """
+        ALTER TABLE sgsx.whatsapp_mensagens RENAME TO whatsapp_mensagens_antiga;
+        ALTER TABLE sgsx.whatsapp_mensagens_antiga
+            RENAME CONSTRAINT whatsapp_mensagens_pkey TO whatsapp_mensagens_antiga_pkey
+    """),
+    ("tabela whatsapp_mensagens particionada", """
+        -- Nomes das FKs explicitos: a tabela antiga ainda existe e o nome automatico ganharia sufixo
+        CREATE TABLE sgsx.whatsapp_mensagens (
+            id UUID NOT NULL DEFAULT gen_random_uuid(),
+            salao_id UUID NOT NULL CONSTRAINT whatsapp_mensagens_salao_id_fkey
+                REFERENCES sgsx.saloes(id) ON DELETE CASCADE,
+            sessao_id UUID CONSTRAINT whatsapp_mensagens_sessao_id_fkey
+                REFERENCES sgsx.sessoes_whatsapp(id) ON DELETE SET NULL,
+            remote_jid VARCHAR(100) NOT NULL,
+            message_id VARCHAR(200) NOT NULL,
+            tipo VARCHAR(50) DEFAULT 'chat',
+            conteudo TEXT,
+            from_me BOOLEAN DEFAULT FALSE,
+            timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            status VARCHAR(50) DEFAULT 'recebida',
+            cliente_id UUID CONSTRAINT whatsapp_mensagens_cliente_id_fkey
+                REFERENCES sgsx.clientes(id) ON DELETE SET NULL,
+            comanda_id UUID CONSTRAINT whatsapp_mensagens_comanda_id_fkey
+                REFERENCES sgsx.comandas(id) ON DELETE SET NULL,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            updated_at TIMESTAMPTZ DEFAULT NOW(),
+            -- A chave de particionamento precisa fazer parte da chave primaria
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """),
+    ("particao padrao whatsapp_mensagens", """
+        CREATE TABLE sgsx.whatsapp_mensagens_padrao
+        PARTITION OF sgsx.whatsapp_mensagens DEFAULT
+    """),
+    ("funcao criar_particao_whatsapp", FUNCAO_CRIAR_PARTICAO),
+    ("funcao garantir_particoes_whatsapp", FUNCAO_GARANTIR_PARTICOES),
+    ("particoes do historico", f"""
+        SELECT sgsx.criar_particao_whatsapp(mes::date)
+        FROM generate_series(
+            date_trunc('month', COALESCE(
+                (SELECT MIN(COALESCE(timestamp, created_at)) FROM sgsx.whatsapp_mensagens_antiga), NOW()
+            ) AT TIME ZONE 'UTC'),
+            date_trunc('month', NOW() AT TIME ZONE 'UTC') + interval '{MESES_FUTUROS} months',
+            interval '1 month'
+        ) mes
+    """),
+    ("copia whatsapp_mensagens", f"""
+        INSERT INTO sgsx.whatsapp_mensagens ({COLUNAS})
+        SELECT id, salao_id, sessao_id, remote_jid, message_id, tipo, conteudo, from_me,
+               COALESCE(timestamp, created_at, NOW()), status, cliente_id, comanda_id, created_at, updated_at
+        FROM sgsx.whatsapp_mensagens_antiga
+    """),
+    ("remocao da tabela antiga", "DROP TABLE sgsx.whatsapp_mensagens_antiga"),
+] + [
+    # Mesmos nomes da migracao 0002 (liberados pelo DROP acima); na tabela pai o
+    # indice e propagado a cada particao, inclusive as criadas depois
+    (f"indice {ix.nome}", ix.sql())
+    for ix in schema.INDICES if ix.tabela == 'whatsapp_mensagens'
+] + [
+    ("trigger updated_at whatsapp_mensagens", """
+        CREATE TRIGGER trigger_updated_at_whatsapp_mensagens
+        BEFORE UPDATE ON sgsx.whatsapp_mensagens
+        FOR EACH ROW EXECUTE FUNCTION sgsx.update_updated_at()
+    """),
+] + [
+    ("comentario whatsapp_mensagens", sql) for sql in schema.COMENTARIOS
+]
+
+
+def listar_particoes(cur):
+    """Devolve [(nome, mes, linhas_estimadas)] das particoes mensais, da mais antiga para a mais nova."""
+    cur.execute("""
+        SELECT c.relname, c.reltuples::bigint
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'sgsx.whatsapp_mensagens'::regclass
+    """)
+    particoes = []
+    for nome, linhas in cur.fetchall():
+        casamento = PADRAO_NOME.match(nome)
+        if casamento:
+            mes = date(int(casamento.group(1)), int(casamento.group(2)), 1)
+            particoes.append((nome, mes, max(linhas, 0)))
+    return sorted(particoes, key=lambda p: p[1])
+
+
+def garantir_particoes(conn, meses_futuros=MESES_FUTUROS):
+    """Cria as particoes do mes atual ate `meses_futuros` meses a frente. Devolve os nomes criados."""
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SELECT sgsx.garantir_particoes_whatsapp(%s)", (meses_futuros,))
+        criadas = [row[0] for row in cur.fetchall()]
+    for nome in criadas:
+        print(f"  Particao sgsx.{nome} criada")
+    if not criadas:
+        print(f"  Particoes ate {meses_futuros} meses a frente ja existem.")
+    return criadas
+
+
+def aplicar_retencao(conn, manter_meses, remover=True, lock_timeout='5s'):
+    """
+    Desanexa (e por padrao remove) as particoes anteriores aos ultimos
+    `manter_meses` meses completos. Cada particao e tratada em uma transacao
+    curta; o DETACH precisa de ACCESS EXCLUSIVE na tabela pai, entao um
+    lock_timeout evita enfileirar as consultas da API atras dele.
+    """
+    hoje = date.today()
+    total = hoje.year * 12 + hoje.month - 1 - manter_meses
+    limite = date(total // 12, total % 12 + 1, 1)
+
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        expiradas = [p for p in listar_particoes(cur) if p[1] < limite]
+
+    if not expiradas:
+        print(f"  Nenhuma particao anterior a {limite:%Y-%m}.")
+        return []
+
+    conn.autocommit = False
+    removidas = []
+    for nome, mes, linhas in expiradas:
+        with conn.cursor() as cur:
+            try:
+                cur.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+                cur.execute(f"ALTER TABLE sgsx.whatsapp_mensagens DETACH PARTITION sgsx.{nome}")
+                if remover:
+                    cur.execute(f"DROP TABLE sgsx.{nome}")
+                conn.commit()
+            except psycopg2.errors.LockNotAvailable:
+                conn.rollback()
+                print(f"  {nome}: tabela ocupada, tente novamente mais tarde")
+                continue
+        acao = 'removida' if remover else 'desanexada'
+        print(f"  {nome} ({mes:%Y-%m}, ~{linhas} linhas): {acao}")
+        removidas.append(nome)
+    conn.autocommit = True
+    if removidas and remover:
+        # Chaves de deduplicacao da ingestao (ver whatsapp_ingestao.py) vao junto com as mensagens
+        with conn.cursor() as cur:
+            cur.execute("""DELETE FROM sgsx.whatsapp_message_ids WHERE "timestamp" < %s""", (limite,))
+            print(f"  {cur.rowcount} chaves de message_id anteriores a {limite:%Y-%m} removidas")
+    return removidas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Particoes mensais de sgsx.whatsapp_mensagens")
+    parser.add_argument('--meses-futuros', type=int, default=MESES_FUTUROS,
+                        help="meses a frente com particao criada")
+    parser.add_argument('--reter', type=int, help="meses completos mantidos alem do atual")
+    parser.add_argument('--apenas-desanexar', action='store_true',
+                        help="na retencao, desanexa sem remover (para arquivar a tabela antes)")
+    parser.add_argument('--listar', action='store_true', help="lista as particoes existentes")
+    args = parser.parse_args()
+
+    conn = conectar()
+    try:
+        if args.listar:
+            with conn.cursor() as cur:
+                for nome, mes, linhas in listar_particoes(cur):
+                    print(f"  {nome:<36} {mes:%Y-%m}  ~{linhas} linhas")
+        else:
+            garantir_particoes(conn, args.meses_futuros)
+            if args.reter is not None:
+                aplicar_retencao(conn, args.reter, remover=not args.apenas_desanexar)
+    finally:
+        conn.close()
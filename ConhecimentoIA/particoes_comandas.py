@@ -0,0 +1,332 @@
+"""
+Layout opcional: comandas, itens e pagamentos particionados por HASH(salao_id).
+
+Em tabelas unicas um salao grande (uma franquia) aumenta a profundidade dos
+indices e o custo de VACUUM de todos os saloes pequenos. Particionadas por
+hash do salao_id, com o mesmo numero de particoes nas tres tabelas, as linhas
+de um salao ficam em uma particao de cada tabela (comandas_h03,
+comanda_itens_h03, comanda_pagamentos_h03): consultas com salao_id so tocam
+essas particoes, os indices sao do tamanho da particao e o autovacuum trata
+cada particao separadamente.
+
+A migracao 0022 (todos os bancos) leva salao_id para comanda_itens e
+comanda_pagamentos (e seus arquivos), preenchido a partir da comanda; no
+layout de tabela unica um trigger completa o salao_id quando o insert nao o
+informa. A conversao para o layout particionado e opcional e fica fora do
+ledger de migracoes: converter() (ou seed.py --particoes-comandas N) troca as
+tabelas em uma transacao, com as tres travadas, recriando indices, triggers,
+FKs e views a partir do catalogo. No layout particionado:
+
+- a chave primaria passa a ser (salao_id, id) e as FKs para comandas usam
+  (salao_id, comanda_id); ha um indice so em id para buscas sem salao;
+- inserts de itens e pagamentos precisam informar salao_id (o trigger que o
+  completa e removido: a particao e escolhida antes dele);
+- consultas da API devem filtrar por salao_id para tocar uma particao so.
+
+Execute: python migrations/particoes_comandas.py --status
+         python migrations/particoes_comandas.py --converter --particoes 16
+         python migrations/particoes_comandas.py --benchmark 200 --crescer 20 --rodadas 3
+"""
+import argparse
+import os
+import statistics
+import time
+
+import dados_padrao
+import gerador
+from conexao import conectar
+
+PARTICOES = int(os.getenv('SGSX_PARTICOES_COMANDAS', '0'))
+
+TABELAS = ['comandas', 'comanda_itens', 'comanda_pagamentos']
+
+# FKs para comandas(id), que no layout particionado passam a (salao_id, coluna)
+FKS_COMANDA = [
+    ('comanda_itens', 'comanda_itens_comanda_id_fkey', 'comanda_id', 'ON DELETE CASCADE'),
+    ('comanda_pagamentos', 'comanda_pagamentos_comanda_id_fkey', 'comanda_id', 'ON DELETE CASCADE'),
+    ('whatsapp_mensagens', 'whatsapp_mensagens_comanda_id_fkey', 'comanda_id', 'ON DELETE SET NULL (comanda_id)'),
+]
+
+# Triggers que nao valem no layout particionado
+TRIGGERS_TABELA_UNICA = ['trigger_salao_da_comanda_itens', 'trigger_salao_da_comanda_pagamentos']
+
+DDL = [
+    ("colunas salao_id", """
+        ALTER TABLE sgsx.comanda_itens ADD COLUMN IF NOT EXISTS salao_id UUID;
+        ALTER TABLE sgsx.comanda_pagamentos ADD COLUMN IF NOT EXISTS salao_id UUID;
+        ALTER TABLE sgsx.comanda_itens_arquivo ADD COLUMN IF NOT EXISTS salao_id UUID;
+        ALTER TABLE sgsx.comanda_pagamentos_arquivo ADD COLUMN IF NOT EXISTS salao_id UUID
+    """),
+    ("views comanda_itens_todos e comanda_pagamentos_todos", """
+        CREATE OR REPLACE VIEW sgsx.comanda_itens_todos AS
+        SELECT * FROM sgsx.comanda_itens UNION ALL SELECT * FROM sgsx.comanda_itens_arquivo;
+        CREATE OR REPLACE VIEW sgsx.comanda_pagamentos_todos AS
+        SELECT * FROM sgsx.comanda_pagamentos UNION ALL SELECT * FROM sgsx.comanda_pagamentos_arquivo
+    """),
+    # Carga sem os triggers de usuario: nenhum total, estoque ou comissao muda
+    ("carga salao_id", """
+        ALTER TABLE sgsx.comanda_itens DISABLE TRIGGER USER;
+        UPDATE sgsx.comanda_itens i SET salao_id = c.salao_id FROM sgsx.comandas c WHERE c.id = i.comanda_id;
+        ALTER TABLE sgsx.comanda_itens ENABLE TRIGGER USER;
+        ALTER TABLE sgsx.comanda_pagamentos DISABLE TRIGGER USER;
+        UPDATE sgsx.comanda_pagamentos p SET salao_id = c.salao_id FROM sgsx.comandas c WHERE c.id = p.comanda_id;
+        ALTER TABLE sgsx.comanda_pagamentos ENABLE TRIGGER USER;
+        UPDATE sgsx.comanda_itens_arquivo i SET salao_id = c.salao_id
+        FROM sgsx.comandas_arquivo c WHERE c.id = i.comanda_id;
+        UPDATE sgsx.comanda_pagamentos_arquivo p SET salao_id = c.salao_id
+        FROM sgsx.comandas_arquivo c WHERE c.id = p.comanda_id
+    """),
+    ("salao_id obrigatorio", """
+        ALTER TABLE sgsx.comanda_itens ALTER COLUMN salao_id SET NOT NULL;
+        ALTER TABLE sgsx.comanda_pagamentos ALTER COLUMN salao_id SET NOT NULL
+    """),
+    ("funcao salao_da_comanda", """
+        CREATE OR REPLACE FUNCTION sgsx.salao_da_comanda()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            SELECT salao_id INTO NEW.salao_id FROM sgsx.comandas WHERE id = NEW.comanda_id;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+    ("triggers salao_da_comanda", """
+        CREATE TRIGGER trigger_salao_da_comanda_itens
+            BEFORE INSERT ON sgsx.comanda_itens
+            FOR EACH ROW WHEN (NEW.salao_id IS NULL) EXECUTE FUNCTION sgsx.salao_da_comanda();
+        CREATE TRIGGER trigger_salao_da_comanda_pagamentos
+            BEFORE INSERT ON sgsx.comanda_pagamentos
+            FOR EACH ROW WHEN (NEW.salao_id IS NULL) EXECUTE FUNCTION sgsx.salao_da_comanda()
+    """),
+]
+
+
+def particoes_atuais(cur):
+    """Numero de particoes de sgsx.comandas, ou 0 no layout de tabela unica."""
+    cur.execute("""
+        SELECT COUNT(i.inhrelid) FROM pg_class c LEFT JOIN pg_inherits i ON i.inhparent = c.oid
+        WHERE c.oid = 'sgsx.comandas'::regclass AND c.relkind = 'p'
+    """)
+    return cur.fetchone()[0]
+
+
+def _objetos(cur, tabela):
+    """Indices, triggers e FKs de saida da tabela, como SQL para recriar na tabela nova."""
+    cur.execute("""
+        SELECT pg_get_indexdef(x.indexrelid) FROM pg_index x
+        WHERE x.indrelid = %s::regclass AND NOT x.indisprimary
+        AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = x.indexrelid)
+    """, (f'sgsx.{tabela}',))
+    indices = [row[0] for row in cur.fetchall()]
+    cur.execute("""
+        SELECT tgname, pg_get_triggerdef(oid) FROM pg_trigger
+        WHERE tgrelid = %s::regclass AND NOT tgisinternal ORDER BY tgname
+    """, (f'sgsx.{tabela}',))
+    triggers = [sql for nome, sql in cur.fetchall() if nome not in TRIGGERS_TABELA_UNICA]
+    cur.execute("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'f' AND NOT confrelid = ANY(%s::regclass[])
+    """, (f'sgsx.{tabela}', [f'sgsx.{t}' for t in TABELAS]))
+    fks = [f"ALTER TABLE sgsx.{tabela} ADD CONSTRAINT {nome} {sql}" for nome, sql in cur.fetchall()]
+    return indices, triggers, fks
+
+
+def _views(cur):
+    """Views que dependem das tabelas: [(nome, definicao, comentario)]."""
+    cur.execute("""
+        SELECT DISTINCT v.oid::regclass::text, pg_get_viewdef(v.oid), obj_description(v.oid, 'pg_class')
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        JOIN pg_class v ON v.oid = r.ev_class
+        WHERE d.refobjid = ANY(%s::regclass[]) AND v.relkind = 'v'
+    """, ([f'sgsx.{t}' for t in TABELAS],))
+    return cur.fetchall()
+
+
+def converter(conn, particoes=16, lock_timeout='10s'):
+    """
+    Converte comandas, comanda_itens e comanda_pagamentos para HASH(salao_id)
+    com `particoes` particoes cada, em uma transacao. Nao faz nada se ja
+    estiverem particionadas. Bloqueia as tres tabelas (e whatsapp_mensagens)
+    durante a copia: rode em janela de manutencao.
+    """
+    if particoes < 1:
+        raise ValueError("particoes deve ser pelo menos 1")
+    conn.autocommit = False
+    cur = conn.cursor()
+    try:
+        atuais = particoes_atuais(cur)
+        if atuais:
+            print(f"  Comandas ja particionadas ({atuais} particoes).")
+            conn.rollback()
+            return False
+
+        inicio = time.perf_counter()
+        cur.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+        cur.execute("LOCK TABLE sgsx.comandas, sgsx.comanda_itens, sgsx.comanda_pagamentos, "
+                    "sgsx.whatsapp_mensagens IN ACCESS EXCLUSIVE MODE")
+
+        objetos = {tabela: _objetos(cur, tabela) for tabela in TABELAS}
+        views = _views(cur)
+        comentarios = {}
+        for tabela in TABELAS:
+            cur.execute("SELECT obj_description(%s::regclass, 'pg_class')", (f'sgsx.{tabela}',))
+            comentarios[tabela] = cur.fetchone()[0]
+
+        for nome, _, _ in views:
+            cur.execute(f"DROP VIEW {nome}")
+        for tabela, fk, _, _ in FKS_COMANDA:
+            cur.execute(f"ALTER TABLE sgsx.{tabela} DROP CONSTRAINT IF EXISTS {fk}")
+
+        for tabela in TABELAS:
+            cur.execute(f"ALTER TABLE sgsx.{tabela} RENAME TO {tabela}_antiga")
+            cur.execute(f"ALTER TABLE sgsx.{tabela}_antiga RENAME CONSTRAINT {tabela}_pkey TO {tabela}_antiga_pkey")
+            cur.execute(f"""
+                CREATE TABLE sgsx.{tabela} (
+                    LIKE sgsx.{tabela}_antiga
+                        INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS INCLUDING COMMENTS,
+                    PRIMARY KEY (salao_id, id)
+                ) PARTITION BY HASH (salao_id)
+            """)
+            # Parametros de armazenamento (fillfactor) so valem nas particoes
+            cur.execute("SELECT array_to_string(reloptions, ', ') FROM pg_class WHERE oid = %s::regclass",
+                        (f'sgsx.{tabela}_antiga',))
+            opcoes = cur.fetchone()[0]
+            for resto in range(particoes):
+                cur.execute(f"CREATE TABLE sgsx.{tabela}_h{resto:02d} PARTITION OF sgsx.{tabela} "
+                            f"FOR VALUES WITH (MODULUS {particoes}, REMAINDER {resto})"
+                            + (f" WITH ({opcoes})" if opcoes else ""))
+            cur.execute("""
+                SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) FROM pg_attribute
+                WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped AND attgenerated = ''
+            """, (f'sgsx.{tabela}',))
+            colunas = cur.fetchone()[0]
+            cur.execute(f"INSERT INTO sgsx.{tabela} ({colunas}) SELECT {colunas} FROM sgsx.{tabela}_antiga")
+            print(f"  sgsx.{tabela}: {cur.rowcount} linhas em {particoes} particoes")
+
+        for tabela in reversed(TABELAS):
+            cur.execute(f"DROP TABLE sgsx.{tabela}_antiga")
+
+        for tabela in TABELAS:
+            indices, triggers, fks = objetos[tabela]
+            # Busca por id sem salao_id (a chave primaria comeca pelo salao)
+            for sql in indices + [f"CREATE INDEX idx_{tabela}_id ON sgsx.{tabela} (id)"] + fks + triggers:
+                cur.execute(sql)
+            if comentarios[tabela]:
+                cur.execute(f"COMMENT ON TABLE sgsx.{tabela} IS %s", (comentarios[tabela],))
+        for tabela, fk, coluna, acao in FKS_COMANDA:
+            cur.execute(f"ALTER TABLE sgsx.{tabela} ADD CONSTRAINT {fk} FOREIGN KEY (salao_id, {coluna}) "
+                        f"REFERENCES sgsx.comandas (salao_id, id) {acao}")
+        for nome, definicao, comentario in views:
+            cur.execute(f"CREATE VIEW {nome} AS {definicao}")
+            if comentario:
+                cur.execute(f"COMMENT ON VIEW {nome} IS %s", (comentario,))
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE " + ', '.join(f"sgsx.{tabela}" for tabela in TABELAS))
+    print(f"  Conversao concluida em {time.perf_counter() - inicio:.1f}s.")
+    return True
+
+
+# Consultas tipicas de um salao (todas com salao_id, como a API deve fazer)
+CONSULTAS = [
+    ("comandas recentes", """
+        SELECT id, numero, status, total FROM sgsx.comandas
+        WHERE salao_id = %(salao)s ORDER BY data_abertura DESC LIMIT 50
+    """),
+    ("itens de uma comanda", """
+        SELECT descricao, quantidade, valor_total FROM sgsx.comanda_itens
+        WHERE salao_id = %(salao)s AND comanda_id = %(comanda)s
+    """),
+    ("faturamento do mes", """
+        SELECT COALESCE(SUM(total), 0) FROM sgsx.comandas
+        WHERE salao_id = %(salao)s AND status = 'paga' AND data_abertura >= date_trunc('month', %(referencia)s::date)
+    """),
+]
+
+
+def _medir(cur, consultas):
+    """Latencia (ms) p50/p95 de cada consulta de CONSULTAS para o menor salao sintetico."""
+    cur.execute("""
+        SELECT c.salao_id, MAX(c.id::text), MAX(c.data_abertura)::date FROM sgsx.comandas c
+        JOIN sgsx.saloes s ON s.id = c.salao_id WHERE s.nome LIKE 'Salao Sintetico %%'
+        GROUP BY c.salao_id ORDER BY COUNT(*), c.salao_id LIMIT 1
+    """)
+    salao, comanda, referencia = cur.fetchone()
+    parametros = {'salao': salao, 'comanda': comanda, 'referencia': referencia}
+    resultado = []
+    for nome, sql in CONSULTAS:
+        tempos = []
+        for _ in range(consultas):
+            inicio = time.perf_counter()
+            cur.execute(sql, parametros)
+            cur.fetchall()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        tempos.sort()
+        resultado.append((nome, statistics.median(tempos), tempos[int(len(tempos) * 0.95) - 1]))
+    return resultado
+
+
+def benchmark(consultas=200, crescer=0, rodadas=1, comandas=2000):
+    """
+    Latencia das consultas de um salao pequeno conforme o banco cresce: mede,
+    gera `crescer` saloes sinteticos (gerador.py, semente diferente por rodada)
+    e mede de novo, `rodadas` vezes. Rode nos dois layouts para comparar.
+    """
+    conn = conectar(verbose=False)
+    linhas = []
+    try:
+        for rodada in range(rodadas):
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                particoes = particoes_atuais(cur)
+                cur.execute("SELECT COUNT(*) FROM sgsx.comandas")
+                total = cur.fetchone()[0]
+                linhas.append((total, _medir(cur, consultas)))
+            if crescer and rodada < rodadas - 1:
+                print(f"\n  Rodada {rodada + 1}: gerando mais {crescer} saloes...")
+                gerador.gerar(conn, crescer, dados_padrao.SERVICOS_PADRAO, dados_padrao.TIPOS_RECEBIMENTO_PADRAO,
+                              semente=gerador.SEMENTE + 1000 * (rodada + 1), comandas=comandas)
+    finally:
+        conn.close()
+
+    layout = f"HASH(salao_id) x{particoes}" if particoes else "tabela unica"
+    print(f"\nLayout: {layout}")
+    print(f"{'Comandas no banco':>18}  {'Consulta':<24}{'p50 (ms)':>10}{'p95 (ms)':>10}")
+    for total, medidas in linhas:
+        for nome, p50, p95 in medidas:
+            print(f"{total:>18}  {nome:<24}{p50:>10.2f}{p95:>10.2f}")
+    return linhas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Layout particionado por salao das comandas")
+    parser.add_argument('--status', action='store_true', help="mostra o layout atual")
+    parser.add_argument('--converter', action='store_true', help="converte para HASH(salao_id)")
+    parser.add_argument('--particoes', type=int, default=PARTICOES or 16, help="particoes por tabela")
+    parser.add_argument('--benchmark', type=int, metavar='CONSULTAS',
+                        help="latencia das consultas de um salao pequeno (repeticoes por consulta)")
+    parser.add_argument('--crescer', type=int, default=0, help="saloes gerados entre as rodadas do --benchmark")
+    parser.add_argument('--rodadas', type=int, default=1, help="rodadas do --benchmark")
+    parser.add_argument('--comandas', type=int, default=2000, help="media de comandas dos saloes do --crescer")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.crescer, args.rodadas, args.comandas)
+    else:
+        conn = conectar()
+        try:
+            if args.converter:
+                converter(conn, args.particoes)
+            with conn.cursor() as cur:
+                particoes = particoes_atuais(cur)
+            print(f"  Layout: {'HASH(salao_id) com %d particoes' % particoes if particoes else 'tabela unica'}")
+        finally:
+            conn.close()
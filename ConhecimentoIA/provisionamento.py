@@ -0,0 +1,217 @@
+"""
+Provisionamento de saloes (tenants) a partir de um salao modelo, no servidor.
+
+Criar um salao era repetir, do Python, o ramo do salao de demonstracao do
+seed (salao -> filial Matriz -> tipos de recebimento -> servicos), com varias
+idas ao servidor por salao. A migracao 0014 cria a funcao
+sgsx.provisionar_saloes(modelo, saloes JSONB), uma unica cadeia de CTEs que
+insere os saloes e copia do modelo, para todos de uma vez:
+
+- filiais ativas (nome, endereco, telefone, email);
+- tipos de recebimento e servicos ativos, com os precos, taxas e comissoes do modelo;
+- perfis proprios do modelo (os perfis do sistema sao globais e nao sao copiados).
+
+Um lote de N saloes e um round trip. sgsx.provisionar_salao(modelo, nome, ...)
+e o atalho para um salao so.
+
+Execute: python migrations/provisionamento.py --modelo <uuid> --arquivo saloes.csv
+         python migrations/provisionamento.py --benchmark 1000 --lote 200
+         python migrations/provisionamento.py --arquivo saloes.csv --backend async --concorrencia 8
+"""
+import argparse
+import csv
+import json
+import time
+import uuid
+
+from psycopg2.extras import execute_values
+
+import dados_padrao
+from conexao import conectar
+
+TAMANHO_LOTE = 200
+
+# Salao usado como modelo quando nenhum e informado
+NOME_MODELO_PADRAO = 'Salao Demonstracao'
+
+DDL = [
+    ("funcao provisionar_saloes", """
+        CREATE OR REPLACE FUNCTION sgsx.provisionar_saloes(p_modelo UUID, p_saloes JSONB)
+        RETURNS SETOF sgsx.saloes AS $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM sgsx.saloes WHERE id = p_modelo) THEN
+                RAISE EXCEPTION 'Salao modelo % nao encontrado', p_modelo;
+            END IF;
+
+            RETURN QUERY
+            WITH novos AS (
+                INSERT INTO sgsx.saloes (id, nome, cnpj, email, telefone, endereco)
+                SELECT COALESCE(n.id, gen_random_uuid()), n.nome, n.cnpj, n.email, n.telefone, n.endereco
+                FROM jsonb_to_recordset(p_saloes)
+                    AS n(id UUID, nome TEXT, cnpj TEXT, email TEXT, telefone TEXT, endereco TEXT)
+                RETURNING *
+            ), filiais AS (
+                INSERT INTO sgsx.filiais (salao_id, nome, endereco, telefone, email)
+                SELECT s.id, f.nome, f.endereco, f.telefone, f.email
+                FROM novos s CROSS JOIN sgsx.filiais f
+                WHERE f.salao_id = p_modelo AND f.ativo IS TRUE
+            ), tipos AS (
+                INSERT INTO sgsx.tipos_recebimento (salao_id, nome, descricao, taxa_percentual, dias_recebimento)
+                SELECT s.id, t.nome, t.descricao, t.taxa_percentual, t.dias_recebimento
+                FROM novos s CROSS JOIN sgsx.tipos_recebimento t
+                WHERE t.salao_id = p_modelo AND t.ativo IS TRUE
+            ), servicos AS (
+                INSERT INTO sgsx.servicos (salao_id, nome, descricao, preco, duracao_minutos, comissao_percentual)
+                SELECT s.id, v.nome, v.descricao, v.preco, v.duracao_minutos, v.comissao_percentual
+                FROM novos s CROSS JOIN sgsx.servicos v
+                WHERE v.salao_id = p_modelo AND v.ativo IS TRUE
+            ), perfis AS (
+                INSERT INTO sgsx.perfis (salao_id, codigo, nome, descricao, permissoes, nivel_acesso, sistema)
+                SELECT s.id, p.codigo, p.nome, p.descricao, p.permissoes, p.nivel_acesso, p.sistema
+                FROM novos s CROSS JOIN sgsx.perfis p
+                WHERE p.salao_id = p_modelo AND p.ativo IS TRUE
+            )
+            SELECT * FROM novos;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+    ("funcao provisionar_salao", """
+        CREATE OR REPLACE FUNCTION sgsx.provisionar_salao(
+            p_modelo UUID, p_nome TEXT, p_email TEXT DEFAULT NULL, p_telefone TEXT DEFAULT NULL,
+            p_cnpj TEXT DEFAULT NULL
+        ) RETURNS UUID AS $$
+            SELECT id FROM sgsx.provisionar_saloes(p_modelo, jsonb_build_array(jsonb_build_object(
+                'nome', p_nome, 'email', p_email, 'telefone', p_telefone, 'cnpj', p_cnpj
+            )))
+        $$ LANGUAGE sql
+    """),
+]
+
+
+def salao_modelo(cur, nome=NOME_MODELO_PADRAO):
+    cur.execute("SELECT id FROM sgsx.saloes WHERE nome = %s ORDER BY created_at LIMIT 1", (nome,))
+    row = cur.fetchone()
+    if not row:
+        raise ValueError(f"Salao modelo {nome!r} nao encontrado (rode o seed.py ou informe --modelo)")
+    return str(row[0])
+
+
+def provisionar(conn, modelo_id, saloes, tamanho_lote=TAMANHO_LOTE):
+    """
+    Cria os saloes (dicts com nome e, opcionalmente, id, cnpj, email, telefone,
+    endereco) a partir do modelo, um lote por transacao. Devolve [(id, nome)].
+    """
+    if conn.autocommit:
+        conn.autocommit = False
+    criados = []
+    with conn.cursor() as cur:
+        for i in range(0, len(saloes), tamanho_lote):
+            try:
+                cur.execute("SELECT id, nome FROM sgsx.provisionar_saloes(%s, %s)",
+                            (modelo_id, json.dumps(saloes[i:i + tamanho_lote])))
+                criados += [(str(salao_id), nome) for salao_id, nome in cur.fetchall()]
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    return criados
+
+
+def _provisionar_pelo_python(cur, salao):
+    """O caminho antigo (ramo do salao de demonstracao do seed), para comparacao."""
+    cur.execute("INSERT INTO sgsx.saloes (id, nome) VALUES (%s, %s)", (salao['id'], salao['nome']))
+    cur.execute("INSERT INTO sgsx.filiais (salao_id, nome) VALUES (%s, 'Matriz')", (salao['id'],))
+    execute_values(cur, """
+        INSERT INTO sgsx.tipos_recebimento (salao_id, nome, descricao, taxa_percentual, dias_recebimento)
+        VALUES %s
+    """, [(salao['id'],) + t for t in dados_padrao.TIPOS_RECEBIMENTO_PADRAO])
+    execute_values(cur, """
+        INSERT INTO sgsx.servicos (salao_id, nome, preco, duracao_minutos, comissao_percentual)
+        VALUES %s
+    """, [(salao['id'],) + s for s in dados_padrao.SERVICOS_PADRAO])
+
+
+def benchmark(conn, quantidade=1000, tamanho_lote=TAMANHO_LOTE, modelo_id=None):
+    """
+    Saloes/s do caminho antigo (Python, linha a linha), da funcao por salao e
+    da funcao em lotes. Roda em uma transacao desfeita ao final.
+    """
+    conn.autocommit = False
+    resultado = []
+    cur = conn.cursor()
+    try:
+        modelo_id = modelo_id or salao_modelo(cur)
+
+        def saloes(prefixo):
+            return [{'id': str(uuid.uuid4()), 'nome': f"{prefixo} {n}"} for n in range(quantidade)]
+
+        inicio = time.perf_counter()
+        for salao in saloes('Benchmark python'):
+            _provisionar_pelo_python(cur, salao)
+        resultado.append(('python linha a linha', time.perf_counter() - inicio))
+
+        inicio = time.perf_counter()
+        for salao in saloes('Benchmark funcao'):
+            cur.execute("SELECT sgsx.provisionar_salao(%s, %s)", (modelo_id, salao['nome']))
+        resultado.append(('funcao por salao', time.perf_counter() - inicio))
+
+        lista = saloes('Benchmark lote')
+        inicio = time.perf_counter()
+        for i in range(0, quantidade, tamanho_lote):
+            cur.execute("SELECT id FROM sgsx.provisionar_saloes(%s, %s)",
+                        (modelo_id, json.dumps(lista[i:i + tamanho_lote])))
+        resultado.append((f"funcao em lotes de {tamanho_lote}", time.perf_counter() - inicio))
+    finally:
+        conn.rollback()
+        cur.close()
+
+    print(f"\n{'Metodo':<28}{'Saloes':>8}{'Tempo (s)':>12}{'Saloes/s':>12}")
+    for nome, segundos in resultado:
+        print(f"{nome:<28}{quantidade:>8}{segundos:>12.2f}{quantidade / segundos:>12.0f}")
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Provisionamento de saloes a partir de um modelo")
+    parser.add_argument('--modelo', help=f"id do salao modelo (padrao: {NOME_MODELO_PADRAO!r})")
+    parser.add_argument('--arquivo', help="CSV com nome[,cnpj,email,telefone,endereco]")
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help="saloes por chamada/transacao")
+    parser.add_argument('--benchmark', type=int, metavar='SALOES', help="mede saloes/s (nada fica gravado)")
+    parser.add_argument('--backend', choices=['sync', 'async'], default='sync',
+                        help="async: lotes em paralelo via asyncpg (ver assincrono.py)")
+    parser.add_argument('--concorrencia', type=int, help="conexoes do pool no --backend async")
+    args = parser.parse_args()
+
+    conn = conectar()
+    try:
+        if args.benchmark:
+            benchmark(conn, args.benchmark, args.lote, args.modelo)
+        elif args.arquivo:
+            with open(args.arquivo, newline='', encoding='utf-8') as f:
+                saloes = [{k: v.strip() or None for k, v in linha.items()} for linha in csv.DictReader(f)]
+            with conn.cursor() as cur:
+                modelo_id = args.modelo or salao_modelo(cur)
+            inicio = time.perf_counter()
+            if args.backend == 'async':
+                import asyncio
+
+                import assincrono
+
+                async def provisionar_async():
+                    pool = await assincrono.criar_pool(args.concorrencia or assincrono.CONCORRENCIA)
+                    try:
+                        return await assincrono.provisionar(pool, modelo_id, saloes, args.lote)
+                    finally:
+                        await pool.close()
+
+                criados = asyncio.run(provisionar_async())
+            else:
+                criados = provisionar(conn, modelo_id, saloes, args.lote)
+            duracao = time.perf_counter() - inicio
+            for salao_id, nome in criados:
+                print(f"  {salao_id}  {nome}")
+            print(f"\n  {len(criados)} saloes em {duracao:.2f}s ({len(criados) / duracao:.0f} saloes/s)")
+        else:
+            parser.error("informe --arquivo ou --benchmark")
+    finally:
+        conn.close()
@@ -0,0 +1,377 @@
+"""
+Definicao do schema SGSx (tipos, tabelas, indices e triggers base).
+
+Este modulo so descreve o schema; quem aplica e o motor de migracoes
+(migracoes.py), a partir da migracao inicial.
+"""
+from dataclasses import dataclass
+
+
+@dataclass
+class Indice:
+    """Indice do schema sgsx. definicao e tudo o que vem depois do nome da tabela."""
+    nome: str
+    tabela: str
+    definicao: str
+    unico: bool = False
+
+    def sql(self, concorrente=False):
+        unico = "UNIQUE " if self.unico else ""
+        modo = "CONCURRENTLY " if concorrente else ""
+        return f"CREATE {unico}INDEX {modo}IF NOT EXISTS {self.nome} ON sgsx.{self.tabela}{self.definicao}"
+
+
+ENUMS = [
+    ('perfil_tipo', "('super_admin', 'admin', 'gerente', 'atendente', 'caixa')"),
+    ('status_comanda', "('aberta', 'em_atendimento', 'aguardando_pagamento', 'paga', 'cancelada')"),
+    ('tipo_item_comanda', "('servico', 'produto')"),
+    ('status_sessao_whatsapp', "('desconectada', 'conectando', 'conectada', 'erro')"),
+]
+
+TABELAS = [
+    ('saloes', """
+        CREATE TABLE IF NOT EXISTS sgsx.saloes (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            nome VARCHAR(200) NOT NULL,
+            cnpj VARCHAR(20),
+            email VARCHAR(200),
+            telefone VARCHAR(20),
+            endereco TEXT,
+            ativo BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """),
+    ('filiais', """
+        CREATE TABLE IF NOT EXISTS sgsx.filiais (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            salao_id UUID NOT NULL REFERENCES sgsx.saloes(id),
+            nome VARCHAR(200) NOT NULL,
+            endereco TEXT,
+            telefone VARCHAR(20),
+            email VARCHAR(200),
+            ativo BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """),
+    ('perfis', """
+        CREATE TABLE IF NOT EXISTS sgsx.perfis (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            salao_id UUID REFERENCES sgsx.saloes(id) ON DELETE CASCADE,
+            codigo VARCHAR(50) NOT NULL,
+            nome VARCHAR(100) NOT NULL,
+            descricao TEXT,
+            permissoes JSONB DEFAULT '{}',
+            nivel_acesso INTEGER DEFAULT 10,
+            sistema BOOLEAN DEFAULT FALSE,
+            ativo BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        )
+    """),
+    ('usuarios', """
+        CREATE TABLE IF NOT EXISTS sgsx.usuarios (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            salao_id UUID REFERENCES sgsx.saloes(id),
+            filial_id UUID REFERENCES sgsx.filiais(id),
+            perfil_id UUID REFERENCES sgsx.perfis(id),
+            nome VARCHAR(200) NOT NULL,
+            email VARCHAR(200) NOT NULL UNIQUE,
+            senha_hash VARCHAR(255) NOT NULL,
+            perfil sgsx.perfil_tipo DEFAULT 'atendente',
+            ativo BOOLEAN DEFAULT TRUE,
+            ultimo_acesso TIMESTAMP,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """),
+    ('clientes', """
+        CREATE TABLE IF NOT EXISTS sgsx.clientes (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            salao_id UUID NOT NULL REFERENCES sgsx.saloes(id),
+            filial_id UUID REFERENCES sgsx.filiais(id),
+            nome VARCHAR(200) NOT NULL,
+            cpf VARCHAR(14),
+            email VARCHAR(200),
+            telefone VARCHAR(20),
+            whatsapp VARCHAR(20),
+            data_nascimento DATE,
+            genero VARCHAR(20),
+            endereco TEXT,
+            observacoes TEXT,
+            ativo BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """),
+    ('servicos', """
+        CREATE TABLE IF NOT EXISTS sgsx.servicos (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            salao_id UUID NOT NULL REFERENCES sgsx.saloes(id),
+            nome VARCHAR(200) NOT NULL,
+            descricao TEXT,
+            preco DECIMAL(10,2) NOT NULL DEFAULT 0,
+            duracao_minutos INTEGER DEFAULT 30,
+            comissao_percentual DECIMAL(5,2) DEFAULT 0,
+            ativo BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """),
+    ('colaboradores', """
+        CREATE TABLE IF NOT EXISTS sgsx.colaboradores (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            salao_id UUID NOT NULL REFERENCES sgsx.saloes(id),
+            filial_id UUID REFERENCES sgsx.filiais(id),
+            nome VARCHAR(200) NOT NULL,
+            cpf VARCHAR(14),
+            email VARCHAR(200),
+            telefone VARCHAR(20),
+            cargo VARCHAR(100),
+            data_admissao DATE,
+            comissao_padrao DECIMAL(5,2) DEFAULT 0,
+            ativo BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """),
+    # Relacionamento N:N
+    ('colaborador_servicos', """
+        CREATE TABLE IF NOT EXISTS sgsx.colaborador_servicos (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            colaborador_id UUID NOT NULL REFERENCES sgsx.colaboradores(id) ON DELETE CASCADE,
+            servico_id UUID NOT NULL REFERENCES sgsx.servicos(id) ON DELETE CASCADE,
+            comissao_especifica DECIMAL(5,2),
+            created_at TIMESTAMP DEFAULT NOW(),
+            UNIQUE(colaborador_id, servico_id)
+        )
+    """),
+    ('produtos', """
+        CREATE TABLE IF NOT EXISTS sgsx.produtos (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            salao_id UUID NOT NULL REFERENCES sgsx.saloes(id),
+            nome VARCHAR(200) NOT NULL,
+            codigo VARCHAR(50),
+            descricao TEXT,
+            categoria VARCHAR(100),
+            marca VARCHAR(100),
+            preco_custo DECIMAL(10,2) DEFAULT 0,
+            preco_venda DECIMAL(10,2) NOT NULL DEFAULT 0,
+            estoque_atual DECIMAL(10,3) DEFAULT 0,
+            estoque_minimo DECIMAL(10,3) DEFAULT 0,
+            unidade_medida VARCHAR(10) DEFAULT 'UN',
+            ativo BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """),
+    ('tipos_recebimento', """
+        CREATE TABLE IF NOT EXISTS sgsx.tipos_recebimento (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            salao_id UUID NOT NULL REFERENCES sgsx.saloes(id),
+            nome VARCHAR(100) NOT NULL,
+            descricao TEXT,
+            taxa_percentual DECIMAL(5,2) DEFAULT 0,
+            dias_recebimento INTEGER DEFAULT 0,
+            ativo BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """),
+    ('comandas', """
+        CREATE TABLE IF NOT EXISTS sgsx.comandas (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            salao_id UUID NOT NULL REFERENCES sgsx.saloes(id),
+            filial_id UUID REFERENCES sgsx.filiais(id),
+            cliente_id UUID REFERENCES sgsx.clientes(id),
+            usuario_id UUID REFERENCES sgsx.usuarios(id),
+            numero SERIAL,
+            nome_cliente VARCHAR(200),
+            status sgsx.status_comanda DEFAULT 'aberta',
+            subtotal DECIMAL(10,2) DEFAULT 0,
+            desconto DECIMAL(10,2) DEFAULT 0,
+            acrescimo DECIMAL(10,2) DEFAULT 0,
+            total DECIMAL(10,2) DEFAULT 0,
+            observacoes TEXT,
+            data_abertura TIMESTAMP DEFAULT NOW(),
+            data_fechamento TIMESTAMP,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """),
+    ('comanda_itens', """
+        CREATE TABLE IF NOT EXISTS sgsx.comanda_itens (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            comanda_id UUID NOT NULL REFERENCES sgsx.comandas(id) ON DELETE CASCADE,
+            tipo sgsx.tipo_item_comanda NOT NULL,
+            servico_id UUID REFERENCES sgsx.servicos(id),
+            produto_id UUID REFERENCES sgsx.produtos(id),
+            colaborador_id UUID REFERENCES sgsx.colaboradores(id),
+            descricao VARCHAR(200) NOT NULL,
+            quantidade DECIMAL(10,3) DEFAULT 1,
+            valor_unitario DECIMAL(10,2) NOT NULL,
+            valor_total DECIMAL(10,2) NOT NULL,
+            comissao_percentual DECIMAL(5,2) DEFAULT 0,
+            comissao_valor DECIMAL(10,2) DEFAULT 0,
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+    """),
+    ('comanda_pagamentos', """
+        CREATE TABLE IF NOT EXISTS sgsx.comanda_pagamentos (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            comanda_id UUID NOT NULL REFERENCES sgsx.comandas(id) ON DELETE CASCADE,
+            tipo_recebimento_id UUID NOT NULL REFERENCES sgsx.tipos_recebimento(id),
+            valor DECIMAL(10,2) NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+    """),
+    ('sessoes_whatsapp', """
+        CREATE TABLE IF NOT EXISTS sgsx.sessoes_whatsapp (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            salao_id UUID NOT NULL REFERENCES sgsx.saloes(id),
+            nome VARCHAR(100) NOT NULL,
+            descricao TEXT,
+            numero VARCHAR(20),
+            status sgsx.status_sessao_whatsapp DEFAULT 'desconectada',
+            ultima_conexao TIMESTAMP,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """),
+    ('whatsapp_mensagens', """
+        CREATE TABLE IF NOT EXISTS sgsx.whatsapp_mensagens (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            salao_id UUID NOT NULL REFERENCES sgsx.saloes(id) ON DELETE CASCADE,
+            sessao_id UUID REFERENCES sgsx.sessoes_whatsapp(id) ON DELETE SET NULL,
+            remote_jid VARCHAR(100) NOT NULL,
+            message_id VARCHAR(200) NOT NULL,
+            tipo VARCHAR(50) DEFAULT 'chat',
+            conteudo TEXT,
+            from_me BOOLEAN DEFAULT FALSE,
+            timestamp TIMESTAMPTZ DEFAULT NOW(),
+            status VARCHAR(50) DEFAULT 'recebida',
+            cliente_id UUID REFERENCES sgsx.clientes(id) ON DELETE SET NULL,
+            comanda_id UUID REFERENCES sgsx.comandas(id) ON DELETE SET NULL,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        )
+    """),
+]
+
+COMENTARIOS = [
+    "COMMENT ON TABLE sgsx.whatsapp_mensagens IS 'Historico de mensagens enviadas e recebidas via WhatsApp'",
+    "COMMENT ON COLUMN sgsx.whatsapp_mensagens.remote_jid IS 'Identificador do contato no WhatsApp (numero@c.us)'",
+    "COMMENT ON COLUMN sgsx.whatsapp_mensagens.from_me IS 'TRUE se foi enviada por nos, FALSE se foi recebida'",
+]
+
+INDICES = [
+    Indice('idx_filiais_salao', 'filiais', '(salao_id)'),
+    Indice('idx_perfis_salao', 'perfis', '(salao_id)'),
+    Indice('idx_perfis_codigo', 'perfis', '(codigo)'),
+    Indice('idx_usuarios_salao', 'usuarios', '(salao_id)'),
+    Indice('idx_usuarios_email', 'usuarios', '(email)'),
+    Indice('idx_usuarios_perfil', 'usuarios', '(perfil_id)'),
+    Indice('idx_clientes_salao', 'clientes', '(salao_id)'),
+    Indice('idx_clientes_nome', 'clientes', '(nome)'),
+    Indice('idx_clientes_telefone', 'clientes', '(telefone)'),
+    Indice('idx_colaboradores_salao', 'colaboradores', '(salao_id)'),
+    Indice('idx_servicos_salao', 'servicos', '(salao_id)'),
+    Indice('idx_produtos_salao', 'produtos', '(salao_id)'),
+    Indice('idx_comandas_salao', 'comandas', '(salao_id)'),
+    Indice('idx_comandas_status', 'comandas', '(status)'),
+    Indice('idx_comandas_data', 'comandas', '(data_abertura)'),
+    Indice('idx_comanda_itens_comanda', 'comanda_itens', '(comanda_id)'),
+    Indice('idx_comanda_pagamentos_comanda', 'comanda_pagamentos', '(comanda_id)'),
+    Indice('idx_whatsapp_mensagens_salao', 'whatsapp_mensagens', '(salao_id)'),
+    Indice('idx_whatsapp_mensagens_sessao', 'whatsapp_mensagens', '(sessao_id)'),
+    Indice('idx_whatsapp_mensagens_cliente', 'whatsapp_mensagens', '(cliente_id)'),
+    Indice('idx_whatsapp_mensagens_remote_jid', 'whatsapp_mensagens', '(remote_jid)'),
+    Indice('idx_whatsapp_mensagens_timestamp', 'whatsapp_mensagens', '(timestamp DESC)'),
+]
+
+# Indices compostos/parciais guiados pelas consultas mais quentes da API
+# (lista de comandas e relatorio de comissoes). Validados por verificar_planos.py.
+INDICES_CONSULTAS = [
+    # /comandas sem filtro de status: salao + periodo, mais recentes primeiro
+    Indice('idx_comandas_salao_data', 'comandas', '(salao_id, data_abertura DESC)'),
+    # /comandas?status_filter=...
+    Indice('idx_comandas_salao_status_data', 'comandas', '(salao_id, status, data_abertura DESC)'),
+    # Telas de comandas abertas: so as linhas ainda em andamento entram no indice
+    Indice('idx_comandas_abertas', 'comandas',
+           "(salao_id, filial_id, data_abertura DESC) "
+           "WHERE status IN ('aberta', 'em_atendimento', 'aguardando_pagamento')"),
+    # /relatorios/comissoes sem colaborador: comandas pagas do salao no periodo
+    Indice('idx_comandas_pagas_fechamento', 'comandas',
+           "(salao_id, data_fechamento) WHERE status = 'paga'"),
+    # /relatorios/comissoes por colaborador; INCLUDE permite index-only nos totais
+    Indice('idx_comanda_itens_colaborador', 'comanda_itens',
+           '(colaborador_id, comanda_id) INCLUDE (valor_total, comissao_percentual, comissao_valor)'),
+]
+
+FUNCAO_UPDATED_AT = """
+    CREATE OR REPLACE FUNCTION sgsx.update_updated_at()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        NEW.updated_at = NOW();
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+TABELAS_COM_UPDATED_AT = [
+    'saloes', 'filiais', 'perfis', 'usuarios', 'clientes',
+    'colaboradores', 'servicos', 'produtos',
+    'tipos_recebimento', 'comandas', 'sessoes_whatsapp',
+    'whatsapp_mensagens'
+]
+
+
+def montar_plano_ddl():
+    """
+    Monta os comandos DDL do schema base como (descricao, sql), na ordem de execucao.
+    Os indices ficam de fora: sao aplicados pela migracao de indices (ver plano_indices).
+    """
+    plano = [("schema sgsx", "CREATE SCHEMA IF NOT EXISTS sgsx")]
+
+    # ENUMs sem consulta previa ao pg_type: o bloco DO ignora tipos ja existentes
+    for nome, valores in ENUMS:
+        plano.append((f"tipo {nome}", f"""
+            DO $$ BEGIN
+                CREATE TYPE sgsx.{nome} AS ENUM {valores};
+            EXCEPTION WHEN duplicate_object THEN NULL;
+            END $$
+        """))
+
+    for nome, sql in TABELAS:
+        plano.append((f"tabela {nome}", sql))
+
+    for sql in COMENTARIOS:
+        plano.append(("comentario whatsapp_mensagens", sql))
+
+    plano.append(("funcao update_updated_at", FUNCAO_UPDATED_AT))
+
+    # Cria o trigger apenas se faltar: DROP + CREATE a cada execucao pega
+    # ACCESS EXCLUSIVE em todas as tabelas sem necessidade
+    for tabela in TABELAS_COM_UPDATED_AT:
+        plano.append((f"trigger updated_at {tabela}", f"""
+            DO $$ BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_trigger
+                    WHERE tgname = 'trigger_updated_at_{tabela}'
+                    AND tgrelid = 'sgsx.{tabela}'::regclass
+                ) THEN
+                    CREATE TRIGGER trigger_updated_at_{tabela}
+                    BEFORE UPDATE ON sgsx.{tabela}
+                    FOR EACH ROW EXECUTE FUNCTION sgsx.update_updated_at();
+                END IF;
+            END $$
+        """))
+
+    return plano
+
+
+def plano_indices(indices=None):
+    """Comandos de criacao dos indices (padrao: indices base) como (descricao, sql)."""
+    return [(f"indice {ix.nome}", ix.sql()) for ix in (indices or INDICES)]
+
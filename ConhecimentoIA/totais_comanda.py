@@ -0,0 +1,185 @@
+"""
+Totais da comanda mantidos pelo banco.
+
+subtotal, total e o valor pago ficavam a cargo da API, que somava de novo os
+itens e pagamentos a cada addItem/removeItem/addPagamento. A migracao 0018
+passa essas colunas para o banco:
+
+- subtotal: soma de comanda_itens.valor_total, atualizada por trigger por
+  comando (tabelas de transicao) a cada insert/update/delete de itens, um
+  delta por comanda;
+- total: sempre subtotal - desconto + acrescimo, recalculado por um trigger
+  BEFORE quando qualquer um dos tres muda;
+- valor_pago (coluna nova): soma de comanda_pagamentos.valor, mantida como o
+  subtotal;
+- saldo (coluna gerada): total - valor_pago, o que falta pagar.
+
+A API deve parar de gravar subtotal, total e valor_pago e passar a ler os
+valores da propria comanda (inclusive na lista de aguardando_pagamento).
+Cargas em lote gravam so desconto/acrescimo e deixam os itens somarem.
+
+A migracao preenche valor_pago a partir dos pagamentos existentes; subtotal e
+total antigos nao sao reescritos. A reconciliacao mostra as comandas cujos
+valores nao batem com itens e pagamentos e, com --corrigir, regrava.
+
+Execute: python migrations/totais_comanda.py --reconciliar
+         python migrations/totais_comanda.py --reconciliar --corrigir
+"""
+import argparse
+
+from psycopg2.extras import execute_values
+
+from conexao import conectar
+from contadores import ORIGEM_TRANSICAO
+
+
+def _funcao_delta(nome, coluna, origem_valor):
+    """Trigger por comando que soma em sgsx.comandas.<coluna> o delta de origem_valor por comanda."""
+    return (f"funcao {nome}", f"""
+        CREATE OR REPLACE FUNCTION sgsx.{nome}()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            {ORIGEM_TRANSICAO}
+        BEGIN
+            EXECUTE format(
+                'UPDATE sgsx.comandas c SET {coluna} = COALESCE(c.{coluna}, 0) + d.delta FROM ('
+                '  SELECT comanda_id, SUM(sinal * {origem_valor}) AS delta FROM (%s) m GROUP BY comanda_id'
+                ') d WHERE c.id = d.comanda_id AND d.delta <> 0',
+                origem);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+
+def _triggers_delta(tabela, funcao):
+    # Remocoes do arquivamento levam a comanda junto: nada a atualizar
+    return (f"triggers {funcao}", f"""
+        CREATE TRIGGER trigger_{funcao}_insert
+            AFTER INSERT ON sgsx.{tabela} REFERENCING NEW TABLE AS novas
+            FOR EACH STATEMENT EXECUTE FUNCTION sgsx.{funcao}();
+        CREATE TRIGGER trigger_{funcao}_update
+            AFTER UPDATE ON sgsx.{tabela} REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+            FOR EACH STATEMENT EXECUTE FUNCTION sgsx.{funcao}();
+        CREATE TRIGGER trigger_{funcao}_delete
+            AFTER DELETE ON sgsx.{tabela} REFERENCING OLD TABLE AS antigas
+            FOR EACH STATEMENT WHEN (NOT sgsx.arquivando()) EXECUTE FUNCTION sgsx.{funcao}()
+    """)
+
+
+DDL = [
+    # saldo e gerado na tabela quente; no arquivo e uma coluna comum (INSERT ... SELECT * copia o valor)
+    ("colunas valor_pago e saldo", """
+        ALTER TABLE sgsx.comandas
+            ADD COLUMN IF NOT EXISTS valor_pago DECIMAL(10,2) NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS saldo DECIMAL(10,2)
+                GENERATED ALWAYS AS (COALESCE(total, 0) - valor_pago) STORED;
+        ALTER TABLE sgsx.comandas_arquivo
+            ADD COLUMN IF NOT EXISTS valor_pago DECIMAL(10,2) NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS saldo DECIMAL(10,2)
+    """),
+    ("view comandas_todas", """
+        CREATE OR REPLACE VIEW sgsx.comandas_todas AS
+        SELECT * FROM sgsx.comandas UNION ALL SELECT * FROM sgsx.comandas_arquivo
+    """),
+    # Carga sem mexer em updated_at: o valor pago nao foi alterado, so passou a ser guardado
+    ("carga valor_pago", """
+        ALTER TABLE sgsx.comandas DISABLE TRIGGER trigger_updated_at_comandas;
+        UPDATE sgsx.comandas c SET valor_pago = p.valor
+        FROM (SELECT comanda_id, SUM(valor) AS valor FROM sgsx.comanda_pagamentos GROUP BY comanda_id) p
+        WHERE c.id = p.comanda_id;
+        ALTER TABLE sgsx.comandas ENABLE TRIGGER trigger_updated_at_comandas;
+        UPDATE sgsx.comandas_arquivo c SET valor_pago = p.valor, saldo = COALESCE(c.total, 0) - p.valor
+        FROM (
+            SELECT a.id, COALESCE(SUM(p.valor), 0) AS valor
+            FROM sgsx.comandas_arquivo a LEFT JOIN sgsx.comanda_pagamentos_arquivo p ON p.comanda_id = a.id
+            GROUP BY a.id
+        ) p
+        WHERE c.id = p.id
+    """),
+    ("funcao total_comanda", """
+        CREATE OR REPLACE FUNCTION sgsx.total_comanda()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.total := COALESCE(NEW.subtotal, 0) - COALESCE(NEW.desconto, 0) + COALESCE(NEW.acrescimo, 0);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """),
+    ("trigger total_comanda", """
+        CREATE TRIGGER trigger_total_comanda
+        BEFORE INSERT OR UPDATE OF subtotal, desconto, acrescimo, total ON sgsx.comandas
+        FOR EACH ROW EXECUTE FUNCTION sgsx.total_comanda()
+    """),
+    _funcao_delta('subtotal_comanda_itens', 'subtotal', 'COALESCE(valor_total, 0)'),
+    _triggers_delta('comanda_itens', 'subtotal_comanda_itens'),
+    _funcao_delta('valor_pago_comanda_pagamentos', 'valor_pago', 'COALESCE(valor, 0)'),
+    _triggers_delta('comanda_pagamentos', 'valor_pago_comanda_pagamentos'),
+]
+
+DIVERGENCIAS = """
+    SELECT c.id, c.subtotal, COALESCE(i.valor, 0), c.total,
+           COALESCE(i.valor, 0) - COALESCE(c.desconto, 0) + COALESCE(c.acrescimo, 0),
+           c.valor_pago, COALESCE(p.valor, 0)
+    FROM sgsx.comandas c
+    LEFT JOIN (SELECT comanda_id, SUM(valor_total) AS valor FROM sgsx.comanda_itens GROUP BY comanda_id) i
+        ON i.comanda_id = c.id
+    LEFT JOIN (SELECT comanda_id, SUM(valor) AS valor FROM sgsx.comanda_pagamentos GROUP BY comanda_id) p
+        ON p.comanda_id = c.id
+    WHERE c.subtotal IS DISTINCT FROM COALESCE(i.valor, 0)
+    OR c.total IS DISTINCT FROM COALESCE(i.valor, 0) - COALESCE(c.desconto, 0) + COALESCE(c.acrescimo, 0)
+    OR c.valor_pago <> COALESCE(p.valor, 0)
+"""
+
+
+def reconciliar(conn, corrigir=False, limite=20):
+    """
+    Lista as comandas (tabela quente) cujos subtotal, total ou valor pago nao
+    batem com itens e pagamentos e devolve a quantidade. Com corrigir=True
+    regrava os valores em uma transacao.
+    """
+    conn.autocommit = False
+    cur = conn.cursor()
+    try:
+        cur.execute(DIVERGENCIAS)
+        divergencias = cur.fetchall()
+        for comanda_id, subtotal, itens, total, total_real, pago, pago_real in divergencias[:limite]:
+            print(f"  {comanda_id}: subtotal {subtotal} -> {itens}, total {total} -> {total_real}, "
+                  f"pago {pago} -> {pago_real}")
+        if len(divergencias) > limite:
+            print(f"  ... e mais {len(divergencias) - limite}")
+
+        if divergencias and corrigir:
+            # total vem do trigger BEFORE a partir do subtotal
+            execute_values(cur, """
+                UPDATE sgsx.comandas c SET subtotal = d.itens, valor_pago = d.pago
+                FROM (VALUES %s) AS d(id, itens, pago)
+                WHERE c.id = d.id::uuid
+            """, [(str(d[0]), d[2], d[6]) for d in divergencias])
+            print(f"  {len(divergencias)} comandas corrigidas.")
+        elif divergencias:
+            print(f"  {len(divergencias)} comandas divergentes (use --corrigir para regravar).")
+        else:
+            print("  Totais das comandas em dia, nenhuma divergencia.")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return len(divergencias)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Totais das comandas mantidos pelo banco")
+    parser.add_argument('--reconciliar', action='store_true', help="compara os totais com itens e pagamentos")
+    parser.add_argument('--corrigir', action='store_true', help="regrava as comandas divergentes")
+    args = parser.parse_args()
+
+    if not args.reconciliar:
+        parser.error("informe --reconciliar")
+    conn = conectar()
+    try:
+        reconciliar(conn, args.corrigir)
+    finally:
+        conn.close()
@@ -0,0 +1,154 @@
+"""
+Provisionamento de usuarios em lote (ex.: equipe de uma franquia).
+
+O hash bcrypt e proposital: cada senha custa ~0,25s de CPU com o custo padrao
+(12). Para centenas de usuarios o hash vira o gargalo, entao:
+
+- os hashes sao calculados em um pool de processos (um por CPU por padrao);
+- o custo e configuravel (--custo ou BCRYPT_ROUNDS) para fixtures e testes;
+  abaixo de CUSTO_MINIMO_PRODUCAO o script avisa que nao e para producao.
+  O login valida qualquer custo: ele fica gravado no proprio hash;
+- perfis, filiais e e-mails ja cadastrados sao lidos uma vez, antes do lote,
+  e os usuarios entram com INSERT de varias linhas, so os que faltam sao hasheados.
+
+O arquivo CSV tem cabecalho email,nome,senha,perfil[,filial], onde perfil e o
+codigo (admin, gerente, atendente, caixa) e filial o nome da filial do salao.
+
+Execute: python migrations/usuarios_lote.py --salao <uuid> --arquivo equipe.csv
+         python migrations/usuarios_lote.py --salao <uuid> --arquivo fixtures.csv --custo 4
+         python migrations/usuarios_lote.py --benchmark 64 --custo 10
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from passlib.context import CryptContext
+from psycopg2.extras import execute_values
+
+from conexao import conectar
+
+CUSTO_PADRAO = int(os.getenv('BCRYPT_ROUNDS', '12'))
+CUSTO_MINIMO_PRODUCAO = 10
+TAMANHO_LOTE = 500
+
+# Perfis de equipe de salao; super_admin e usuario do sistema e nunca vem de CSV
+PERFIS_VALIDOS = ('admin', 'gerente', 'atendente', 'caixa')
+
+
+def _hash(args):
+    """Hash de uma senha (roda nos processos do pool)."""
+    senha, custo = args
+    return CryptContext(schemes=["bcrypt"], bcrypt__rounds=custo).hash(senha)
+
+
+def hash_senhas(senhas, custo=CUSTO_PADRAO, processos=None):
+    """Hashes bcrypt das senhas, na mesma ordem, calculados em paralelo."""
+    if custo < CUSTO_MINIMO_PRODUCAO:
+        print(f"  Aviso: custo bcrypt {custo} < {CUSTO_MINIMO_PRODUCAO}, use apenas em fixtures/testes.")
+    if len(senhas) <= 1 or processos == 1:
+        return [_hash((senha, custo)) for senha in senhas]
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        return list(pool.map(_hash, [(senha, custo) for senha in senhas], chunksize=4))
+
+
+def carregar_csv(caminho):
+    with open(caminho, newline='', encoding='utf-8') as f:
+        return [{k: (v or '').strip() for k, v in linha.items()} for linha in csv.DictReader(f)]
+
+
+def provisionar_usuarios(conn, salao_id, usuarios, custo=CUSTO_PADRAO, processos=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Cria os usuarios que ainda nao existem (por e-mail) em uma transacao e
+    devolve (criados, ignorados). Cada usuario e um dict com email, nome,
+    senha, perfil e, opcionalmente, filial (nome).
+    """
+    conn.autocommit = False
+    cur = conn.cursor()
+    try:
+        # Perfil do proprio salao tem precedencia sobre o perfil do sistema com o mesmo codigo
+        cur.execute("""
+            SELECT DISTINCT ON (codigo) codigo, id FROM sgsx.perfis
+            WHERE (salao_id = %s OR salao_id IS NULL) AND ativo IS TRUE
+            ORDER BY codigo, salao_id NULLS LAST
+        """, (salao_id,))
+        perfis = {codigo: perfil_id for codigo, perfil_id in cur.fetchall()}
+
+        cur.execute("SELECT nome, id FROM sgsx.filiais WHERE salao_id = %s", (salao_id,))
+        filiais = dict(cur.fetchall())
+
+        cur.execute("SELECT email FROM sgsx.usuarios WHERE email = ANY(%s)", ([u['email'] for u in usuarios],))
+        existentes = {row[0] for row in cur.fetchall()}
+
+        novos, vistos = [], set()
+        for u in usuarios:
+            email = u['email']
+            if email in existentes or email in vistos:
+                continue
+            vistos.add(email)
+            if u['perfil'] not in PERFIS_VALIDOS or u['perfil'] not in perfis:
+                raise ValueError(f"Perfil invalido para {email}: {u['perfil']!r}")
+            if u.get('filial') and u['filial'] not in filiais:
+                raise ValueError(f"Filial desconhecida para {email}: {u['filial']!r}")
+            if not u.get('senha'):
+                raise ValueError(f"Usuario {email} sem senha")
+            novos.append(u)
+
+        inicio = time.perf_counter()
+        hashes = hash_senhas([u['senha'] for u in novos], custo, processos)
+        print(f"  {len(hashes)} senhas com custo {custo} em {time.perf_counter() - inicio:.1f}s")
+
+        linhas = [
+            (salao_id, filiais.get(u.get('filial')), perfis[u['perfil']], u['nome'], u['email'], senha_hash,
+             u['perfil'])
+            for u, senha_hash in zip(novos, hashes)
+        ]
+        for i in range(0, len(linhas), tamanho_lote):
+            execute_values(cur, """
+                INSERT INTO sgsx.usuarios (salao_id, filial_id, perfil_id, nome, email, senha_hash, perfil)
+                VALUES %s
+                ON CONFLICT (email) DO NOTHING
+            """, linhas[i:i + tamanho_lote], page_size=tamanho_lote)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    print(f"  {len(linhas)} usuarios criados, {len(usuarios) - len(linhas)} ja existentes ou repetidos.")
+    return len(linhas), len(usuarios) - len(linhas)
+
+
+def benchmark(quantidade=64, custo=CUSTO_PADRAO):
+    """Hash sequencial x pool de processos, em senhas/s (sem banco)."""
+    senhas = [f"senha-{n}" for n in range(quantidade)]
+    print(f"{'Modo':<22}{'Senhas':>8}{'Tempo (s)':>12}{'Senhas/s':>12}")
+    for nome, processos in (('sequencial', 1), (f"pool ({os.cpu_count()} CPUs)", None)):
+        inicio = time.perf_counter()
+        hash_senhas(senhas, custo, processos)
+        segundos = time.perf_counter() - inicio
+        print(f"{nome:<22}{quantidade:>8}{segundos:>12.2f}{quantidade / segundos:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Provisionamento de usuarios em lote")
+    parser.add_argument('--salao', help="id do salao dos usuarios")
+    parser.add_argument('--arquivo', help="CSV com email,nome,senha,perfil[,filial]")
+    parser.add_argument('--custo', type=int, default=CUSTO_PADRAO,
+                        help="custo (rounds) do bcrypt; padrao BCRYPT_ROUNDS ou 12")
+    parser.add_argument('--processos', type=int, help="processos do pool de hash (padrao: um por CPU)")
+    parser.add_argument('--benchmark', type=int, metavar='SENHAS', help="compara hash sequencial x pool")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.custo)
+    else:
+        if not args.salao or not args.arquivo:
+            parser.error("--salao e --arquivo sao obrigatorios")
+        conn = conectar()
+        try:
+            provisionar_usuarios(conn, args.salao, carregar_csv(args.arquivo), args.custo, args.processos)
+        finally:
+            conn.close()
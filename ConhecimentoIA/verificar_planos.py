@@ -0,0 +1,188 @@
+"""
+Verificacao por EXPLAIN dos indices de consulta (schema.INDICES_CONSULTAS).
+
+Gera um conjunto sintetico multi-salao dentro de uma transacao, roda ANALYZE,
+executa EXPLAIN das consultas no formato usado pela API e confere se cada uma
+usa o indice esperado. Ao final a transacao e desfeita: nada fica no banco.
+
+O relatorio de comissoes considera apenas comandas pagas, filtradas por
+data_fechamento.
+
+Execute: python migrations/verificar_planos.py
+         python migrations/verificar_planos.py --saloes 100 --comandas 3000
+"""
+import argparse
+import json
+import sys
+
+from conexao import conectar
+
+DADOS_SINTETICOS = """
+    SELECT setseed(0.42);
+
+    INSERT INTO sgsx.saloes (id, nome)
+    SELECT md5('sint-salao-' || s)::uuid, 'Salao Sintetico ' || s
+    FROM generate_series(1, %(saloes)s) s;
+
+    INSERT INTO sgsx.filiais (id, salao_id, nome)
+    SELECT md5('sint-filial-' || s || '-' || f)::uuid, md5('sint-salao-' || s)::uuid, 'Filial ' || f
+    FROM generate_series(1, %(saloes)s) s, generate_series(1, 2) f;
+
+    INSERT INTO sgsx.colaboradores (id, salao_id, nome)
+    SELECT md5('sint-colab-' || s || '-' || c)::uuid, md5('sint-salao-' || s)::uuid, 'Colaborador ' || c
+    FROM generate_series(1, %(saloes)s) s, generate_series(1, %(colaboradores)s) c;
+
+    INSERT INTO sgsx.comandas (id, salao_id, filial_id, numero, status, data_abertura, data_fechamento)
+    SELECT md5('sint-comanda-' || s || '-' || n)::uuid,
+           md5('sint-salao-' || s)::uuid,
+           md5('sint-filial-' || s || '-' || (n %% 2 + 1))::uuid,
+           n, status, abertura,
+           CASE WHEN status IN ('paga', 'cancelada') THEN abertura + interval '1 hour' END
+    FROM (
+        SELECT s, n,
+               (CASE
+                   WHEN r < 0.85 THEN 'paga'
+                   WHEN r < 0.90 THEN 'cancelada'
+                   WHEN r < 0.95 THEN 'aberta'
+                   WHEN r < 0.98 THEN 'em_atendimento'
+                   ELSE 'aguardando_pagamento'
+               END)::sgsx.status_comanda AS status,
+               NOW() - d * interval '365 days' AS abertura
+        FROM (
+            SELECT s, n, random() AS r, random() AS d
+            FROM generate_series(1, %(saloes)s) s, generate_series(1, %(comandas)s) n
+        ) sorteio
+    ) c;
+
+    INSERT INTO sgsx.comanda_itens (comanda_id, salao_id, tipo, colaborador_id, descricao,
+                                    valor_unitario, valor_total, comissao_percentual, comissao_valor)
+    SELECT md5('sint-comanda-' || s || '-' || n)::uuid, md5('sint-salao-' || s)::uuid, 'servico',
+           md5('sint-colab-' || s || '-' || ((n + i) %% %(colaboradores)s + 1))::uuid,
+           'Servico ' || i, 50, 50, 30, 15
+    FROM generate_series(1, %(saloes)s) s,
+         generate_series(1, %(comandas)s) n,
+         generate_series(1, 3) i;
+
+    INSERT INTO sgsx.clientes (salao_id, filial_id, nome, data_nascimento)
+    SELECT md5('sint-salao-' || s)::uuid, md5('sint-filial-' || s || '-' || (n %% 2 + 1))::uuid,
+           'Cliente ' || n, date '1950-01-01' + (random() * 25000)::int
+    FROM generate_series(1, %(saloes)s) s, generate_series(1, %(clientes)s) n;
+
+    ANALYZE sgsx.saloes, sgsx.filiais, sgsx.colaboradores, sgsx.clientes, sgsx.comandas, sgsx.comanda_itens;
+"""
+
+# (descricao, indice esperado, sql)
+CONSULTAS = [
+    ("lista de comandas do salao (sem status)", 'idx_comandas_salao_data', """
+        SELECT * FROM sgsx.comandas
+        WHERE salao_id = %(salao)s
+        ORDER BY data_abertura DESC
+        LIMIT 20
+    """),
+    # Filtros por status em andamento ja sao servidos por idx_comandas_abertas
+    ("lista de comandas por status (paga)", 'idx_comandas_salao_status_data', """
+        SELECT * FROM sgsx.comandas
+        WHERE salao_id = %(salao)s AND status = 'paga'
+        ORDER BY data_abertura DESC
+        LIMIT 20
+    """),
+    ("comandas abertas da filial", 'idx_comandas_abertas', """
+        SELECT * FROM sgsx.comandas
+        WHERE salao_id = %(salao)s AND filial_id = %(filial)s
+        AND status IN ('aberta', 'em_atendimento', 'aguardando_pagamento')
+        ORDER BY data_abertura DESC
+        LIMIT 50
+    """),
+    ("comissoes do salao no periodo", 'idx_comandas_pagas_fechamento', """
+        SELECT ci.colaborador_id, SUM(ci.valor_total), SUM(ci.comissao_valor)
+        FROM sgsx.comandas c
+        JOIN sgsx.comanda_itens ci ON ci.comanda_id = c.id
+        WHERE c.salao_id = %(salao)s AND c.status = 'paga'
+        AND c.data_fechamento BETWEEN %(inicio)s AND %(fim)s
+        GROUP BY ci.colaborador_id
+    """),
+    ("comissoes de um colaborador no periodo", 'idx_comanda_itens_colaborador', """
+        SELECT ci.id, ci.valor_total, ci.comissao_percentual, ci.comissao_valor, c.numero, c.data_fechamento
+        FROM sgsx.comanda_itens ci
+        JOIN sgsx.comandas c ON c.id = ci.comanda_id
+        WHERE ci.colaborador_id = %(colaborador)s AND c.status = 'paga'
+        AND c.data_fechamento BETWEEN %(inicio)s AND %(fim)s
+    """),
+    # Job diario de aniversario (ver aniversariantes.py)
+    ("aniversariantes do dia na filial", 'idx_clientes_aniversario', """
+        SELECT id, nome, data_nascimento, telefone, whatsapp
+        FROM sgsx.clientes
+        WHERE salao_id = %(salao)s AND data_nascimento IS NOT NULL AND ativo IS TRUE
+        AND sgsx.mes_dia(data_nascimento) BETWEEN 315 AND 315 AND filial_id = %(filial)s
+    """),
+]
+
+
+def _nos(plano):
+    """Percorre recursivamente os nos de um plano JSON do EXPLAIN."""
+    yield plano
+    for filho in plano.get('Plans', []):
+        yield from _nos(filho)
+
+
+def verificar(conn, saloes=50, comandas=2000, colaboradores=10, consultas=None, clientes=500):
+    """Gera os dados sinteticos, roda os EXPLAIN e devolve [(descricao, esperado, usados, seq_scans, ok)]."""
+    consultas = consultas or CONSULTAS
+
+    conn.autocommit = False
+    cur = conn.cursor()
+    resultado = []
+    try:
+        print(f"Gerando dados sinteticos: {saloes} saloes x {comandas} comandas x 3 itens, {clientes} clientes...")
+        cur.execute(DADOS_SINTETICOS, {'saloes': saloes, 'comandas': comandas, 'colaboradores': colaboradores,
+                                       'clientes': clientes})
+        cur.execute("""
+            SELECT md5('sint-salao-1')::uuid AS salao, md5('sint-filial-1-1')::uuid AS filial,
+                   md5('sint-colab-1-1')::uuid AS colaborador,
+                   NOW() - interval '30 days' AS inicio, NOW() AS fim
+        """)
+        parametros = dict(zip([c.name for c in cur.description], cur.fetchone()))
+
+        for descricao, esperado, sql in consultas:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, parametros)
+            plano = cur.fetchone()[0]
+            if isinstance(plano, str):
+                plano = json.loads(plano)
+            nos = list(_nos(plano[0]['Plan']))
+            usados = sorted({n['Index Name'] for n in nos if 'Index Name' in n})
+            seq_scans = sorted({n['Relation Name'] for n in nos if n['Node Type'] == 'Seq Scan'})
+            ok = esperado in usados
+            resultado.append((descricao, esperado, usados, seq_scans, ok))
+    finally:
+        conn.rollback()
+        cur.close()
+
+    return resultado
+
+
+def imprimir_relatorio(resultado):
+    print(f"\n{'Consulta':<42}{'Indice esperado':<34}Resultado")
+    for descricao, esperado, usados, seq_scans, ok in resultado:
+        print(f"{descricao:<42}{esperado:<34}{'OK' if ok else 'FALHOU'}")
+        if not ok:
+            print(f"    indices usados: {', '.join(usados) or 'nenhum'}")
+        if seq_scans:
+            print(f"    seq scan em: {', '.join(seq_scans)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verifica por EXPLAIN os indices de consulta do SGSx")
+    parser.add_argument('--saloes', type=int, default=50)
+    parser.add_argument('--comandas', type=int, default=2000, help="comandas por salao")
+    parser.add_argument('--colaboradores', type=int, default=10, help="colaboradores por salao")
+    parser.add_argument('--clientes', type=int, default=500, help="clientes por salao")
+    args = parser.parse_args()
+
+    conn = conectar()
+    try:
+        resultado = verificar(conn, args.saloes, args.comandas, args.colaboradores, clientes=args.clientes)
+    finally:
+        conn.close()
+
+    imprimir_relatorio(resultado)
+    sys.exit(0 if all(r[4] for r in resultado) else 1)
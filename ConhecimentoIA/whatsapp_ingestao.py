@@ -0,0 +1,268 @@
+"""
+Ingestao em lote e idempotente de mensagens do WhatsApp.
+
+Reenvios do webhook criavam mensagens duplicadas e cada mensagem custava um
+INSERT (uma ida ao servidor). Aqui:
+
+- a tabela e particionada por timestamp (ver particoes.py) e o PostgreSQL
+  exige a chave de particionamento em todo indice unico: o indice
+  uq_whatsapp_mensagens_message_id (migracao 0007) e em (salao_id,
+  message_id, timestamp) e nao pega um reenvio com outro timestamp. A
+  migracao 0025 cria sgsx.whatsapp_message_ids, tabela comum com chave
+  (salao_id, message_id): a ingestao grava a chave com ON CONFLICT DO NOTHING
+  e so insere as mensagens cujas chaves entraram, no mesmo comando. A
+  migracao remove as duplicatas existentes por (salao_id, message_id); o
+  DEFAULT NOW() de timestamp continua valendo para os INSERTs unitarios da
+  API, ja que o reenvio e barrado pela chave sem timestamp;
+- ingerir_mensagens() recebe lotes e grava com COPY em uma tabela temporaria
+  seguido desse INSERT (ou, com metodo='values', INSERT de varias linhas);
+  duplicatas, dentro do lote ou ja gravadas, sao descartadas sem erro.
+
+A retencao (particoes.py --reter) remove junto as chaves anteriores ao limite.
+
+Execute: python migrations/whatsapp_ingestao.py --benchmark 20000
+"""
+import argparse
+import io
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from psycopg2.extras import execute_values
+
+from conexao import conectar
+from schema import Indice
+
+METODO_COPY = 'copy'
+METODO_VALUES = 'values'
+
+TAMANHO_LOTE = 5000
+
+INDICE_MESSAGE_ID = Indice('uq_whatsapp_mensagens_message_id', 'whatsapp_mensagens',
+                           '(salao_id, message_id, timestamp)', unico=True)
+
+# Colunas aceitas na ingestao, na ordem do COPY; as obrigatorias vem primeiro
+COLUNAS = ['salao_id', 'message_id', 'timestamp', 'remote_jid', 'sessao_id', 'tipo',
+           'conteudo', 'from_me', 'status', 'cliente_id', 'comanda_id']
+OBRIGATORIAS = COLUNAS[:4]
+
+# Valores padrao das colunas opcionais (os mesmos DEFAULT da tabela)
+PADROES = {'tipo': 'chat', 'from_me': False, 'status': 'recebida'}
+
+DDL = [
+    ("remocao de mensagens duplicadas", """
+        DELETE FROM sgsx.whatsapp_mensagens m
+        USING (
+            SELECT id, "timestamp",
+                   ROW_NUMBER() OVER (
+                       PARTITION BY salao_id, message_id, "timestamp" ORDER BY created_at, id
+                   ) AS ordem
+            FROM sgsx.whatsapp_mensagens
+        ) d
+        WHERE d.ordem > 1 AND m.id = d.id AND m."timestamp" = d."timestamp"
+    """),
+    (f"indice {INDICE_MESSAGE_ID.nome}", INDICE_MESSAGE_ID.sql()),
+]
+
+DDL_CHAVES = [
+    ("remocao de mensagens duplicadas por message_id", """
+        DELETE FROM sgsx.whatsapp_mensagens m
+        USING (
+            SELECT id, "timestamp",
+                   ROW_NUMBER() OVER (PARTITION BY salao_id, message_id ORDER BY created_at, id) AS ordem
+            FROM sgsx.whatsapp_mensagens
+        ) d
+        WHERE d.ordem > 1 AND m.id = d.id AND m."timestamp" = d."timestamp"
+    """),
+    ("tabela whatsapp_message_ids", """
+        CREATE TABLE IF NOT EXISTS sgsx.whatsapp_message_ids (
+            salao_id UUID NOT NULL REFERENCES sgsx.saloes(id) ON DELETE CASCADE,
+            message_id VARCHAR(200) NOT NULL,
+            "timestamp" TIMESTAMPTZ NOT NULL,
+            PRIMARY KEY (salao_id, message_id)
+        )
+    """),
+    ("carga whatsapp_message_ids", """
+        INSERT INTO sgsx.whatsapp_message_ids (salao_id, message_id, "timestamp")
+        SELECT salao_id, message_id, "timestamp" FROM sgsx.whatsapp_mensagens
+        ON CONFLICT DO NOTHING
+    """),
+]
+
+_LISTA = ', '.join(f'"{c}"' for c in COLUNAS)
+
+
+def _deduplicar(lote):
+    """
+    INSERT que grava as chaves novas do `lote` (CTE) em whatsapp_message_ids e
+    so as mensagens dessas chaves, uma por chave. O ON CONFLICT final cobre
+    mensagens gravadas fora da ingestao, sem chave.
+    """
+    return f"""
+        WITH {lote},
+        novas AS (
+            INSERT INTO sgsx.whatsapp_message_ids (salao_id, message_id, "timestamp")
+            SELECT salao_id, message_id, "timestamp" FROM lote
+            ON CONFLICT DO NOTHING
+            RETURNING salao_id, message_id
+        )
+        INSERT INTO sgsx.whatsapp_mensagens ({_LISTA})
+        SELECT DISTINCT ON (l.salao_id, l.message_id) {', '.join(f'l."{c}"' for c in COLUNAS)}
+        FROM lote l JOIN novas n ON n.salao_id = l.salao_id AND n.message_id = l.message_id
+        ORDER BY l.salao_id, l.message_id, l."timestamp"
+        ON CONFLICT DO NOTHING
+    """
+
+
+INSERIR_DA_TEMPORARIA = _deduplicar(f"lote AS (SELECT {_LISTA} FROM tmp_whatsapp_ingestao)")
+
+# Os VALUES passam pela temporaria para chegar com os tipos das colunas
+INSERIR_VALORES = _deduplicar(
+    f"lote AS (INSERT INTO tmp_whatsapp_ingestao ({_LISTA}) VALUES %s RETURNING {_LISTA})")
+
+
+def _linhas(mensagens):
+    """Converte dicts de mensagem em tuplas na ordem de COLUNAS, validando as obrigatorias."""
+    linhas = []
+    for m in mensagens:
+        faltando = [c for c in OBRIGATORIAS if not m.get(c)]
+        if faltando:
+            raise ValueError(f"Mensagem {m.get('message_id')!r} sem {', '.join(faltando)}")
+        linhas.append(tuple(m.get(c, PADROES.get(c)) for c in COLUNAS))
+    return linhas
+
+
+def campo_copy(valor):
+    """Valor no formato texto do COPY: \\N para NULL, com escape de barra, tab e quebras de linha."""
+    if valor is None:
+        return '\\N'
+    return (str(valor).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def _temporaria(cur):
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS tmp_whatsapp_ingestao
+        (LIKE sgsx.whatsapp_mensagens INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+    """)
+
+
+def _copiar(cur, linhas):
+    """COPY das linhas para a tabela temporaria e INSERT com deduplicacao."""
+    _temporaria(cur)
+    buffer = io.StringIO(''.join(
+        '\t'.join(campo_copy(v) for v in linha) + '\n' for linha in linhas
+    ))
+    cur.copy_expert(f"COPY tmp_whatsapp_ingestao ({_LISTA}) FROM STDIN", buffer)
+    cur.execute(INSERIR_DA_TEMPORARIA)
+    return cur.rowcount
+
+
+def _inserir_valores(cur, linhas):
+    """INSERT de varias linhas em um unico comando, com deduplicacao."""
+    _temporaria(cur)
+    execute_values(cur, INSERIR_VALORES, linhas, page_size=len(linhas))
+    return cur.rowcount
+
+
+def ingerir_mensagens(conn, mensagens, metodo=METODO_COPY, tamanho_lote=TAMANHO_LOTE):
+    """
+    Grava as mensagens em lotes de `tamanho_lote`, uma transacao por lote, e
+    devolve (recebidas, inseridas). Reenviar o mesmo lote nao duplica nada.
+
+    Cada mensagem e um dict com salao_id, message_id, timestamp (do WhatsApp)
+    e remote_jid, mais as colunas opcionais de COLUNAS.
+    """
+    gravar = _copiar if metodo == METODO_COPY else _inserir_valores
+    linhas = _linhas(mensagens)
+
+    if conn.autocommit:
+        conn.autocommit = False
+    inseridas = 0
+    with conn.cursor() as cur:
+        for i in range(0, len(linhas), tamanho_lote):
+            try:
+                inseridas += gravar(cur, linhas[i:i + tamanho_lote])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    return len(linhas), inseridas
+
+
+def _mensagens_sinteticas(salao_id, quantidade, duplicadas=0.1):
+    """Mensagens de teste; uma fracao `duplicadas` repete message_id e timestamp de outra."""
+    base = datetime.now(timezone.utc).replace(microsecond=0)
+    mensagens = []
+    for n in range(quantidade):
+        origem = n - 1 if n and n % int(1 / duplicadas) == 0 else n
+        mensagens.append({
+            'salao_id': salao_id,
+            'message_id': f"bench-{origem}",
+            'timestamp': base - timedelta(seconds=origem),
+            'remote_jid': f"5511{origem % 1000:08d}@c.us",
+            'conteudo': f"Mensagem {origem}",
+            'from_me': origem % 2 == 0,
+        })
+    return mensagens
+
+
+def benchmark(conn, quantidade=20000, unitarias=500):
+    """
+    Compara INSERT unitario, INSERT de varias linhas e COPY em mensagens/s,
+    sempre em um salao temporario removido ao final.
+    """
+    salao_id = str(uuid.uuid4())
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO sgsx.saloes (id, nome) VALUES (%s, 'Benchmark ingestao')", (salao_id,))
+
+    resultado = []
+    try:
+        mensagens = _mensagens_sinteticas(salao_id, unitarias)
+        inicio = time.perf_counter()
+        with conn.cursor() as cur:
+            _temporaria(cur)
+            for linha in _linhas(mensagens):
+                execute_values(cur, INSERIR_VALORES, [linha])
+        resultado.append(('insert unitario', len(mensagens), time.perf_counter() - inicio))
+
+        for metodo in (METODO_VALUES, METODO_COPY):
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM sgsx.whatsapp_mensagens WHERE salao_id = %s", (salao_id,))
+                cur.execute("DELETE FROM sgsx.whatsapp_message_ids WHERE salao_id = %s", (salao_id,))
+            mensagens = _mensagens_sinteticas(salao_id, quantidade)
+            inicio = time.perf_counter()
+            recebidas, inseridas = ingerir_mensagens(conn, mensagens, metodo)
+            resultado.append((f"lote {metodo}", recebidas, time.perf_counter() - inicio))
+
+            # Reenvio completo (retry do webhook), tambem com outro timestamp: nada pode ser inserido
+            _, reinseridas = ingerir_mensagens(conn, mensagens, metodo)
+            _, deslocadas = ingerir_mensagens(
+                conn, [dict(m, timestamp=m['timestamp'] + timedelta(seconds=1)) for m in mensagens], metodo)
+            print(f"  {metodo}: {recebidas} recebidas, {inseridas} inseridas, reenvio inseriu {reinseridas}, "
+                  f"reenvio com outro timestamp inseriu {deslocadas}")
+    finally:
+        conn.rollback()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM sgsx.saloes WHERE id = %s", (salao_id,))
+
+    print(f"\n{'Metodo':<20}{'Mensagens':>10}{'Tempo (s)':>12}{'Msg/s':>12}")
+    for nome, quantidade, segundos in resultado:
+        print(f"{nome:<20}{quantidade:>10}{segundos:>12.2f}{quantidade / segundos:>12.0f}")
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestao em lote de mensagens do WhatsApp")
+    parser.add_argument('--benchmark', type=int, default=20000, help="mensagens por metodo em lote")
+    parser.add_argument('--unitarias', type=int, default=500, help="mensagens no teste de INSERT unitario")
+    args = parser.parse_args()
+
+    conn = conectar()
+    try:
+        benchmark(conn, args.benchmark, args.unitarias)
+    finally:
+        conn.close()